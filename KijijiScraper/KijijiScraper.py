@@ -11,11 +11,11 @@ import os
 import glob # Added for glob pattern matching
 from datetime import datetime # Added for timestamp
 
-# Import the necessary ASYNC functions, proxy loader, and custom exceptions from KijijiSingleScrape
+# Import the necessary ASYNC functions, pooled proxy clients, and custom exceptions from KijijiSingleScrape
 from KijijiSingleScrape import (
     scrape_kijiji_single_page_async,
     extract_relevant_kijiji_data,
-    get_proxy_from_file, # Need this for httpx client setup
+    AsyncProxyClients, # httpx clients over the shared proxy pool
     ScrapingTimeoutError, # Import the custom timeout exception
     ScrapingConnectionError # Import the custom connection error exception
 )
@@ -524,10 +524,10 @@ async def monitor_and_queue_task(page, queue, scraped_ad_ids, all_listings_data,
 # Removed process_single_listing_sync as worker is now fully async
 
 # Worker task using KijijiSingleScrape async API calls
-async def worker_task(client: httpx.AsyncClient, queue: asyncio.Queue, all_listings_data: list, failed_log_path="failed_links.txt"):
+async def worker_task(client: AsyncProxyClients, queue: asyncio.Queue, all_listings_data: list, failed_log_path="failed_links.txt"):
     """
     Fetches detailed listing data for an ad_id using the async Kijiji API function,
-     extracts relevant details, and adds to list. Uses a shared httpx client.
+     extracts relevant details, and adds to list. Uses the shared pooled httpx clients.
      """
     worker_name = asyncio.current_task().get_name()
     # logger.info(f"Starting worker task {worker_name}...") # Suppressed log
@@ -660,27 +660,8 @@ async def scrape_kijiji_autos_async(search_params, worker_count, max_pages=1): #
 
     # logger.info("Launching Playwright browser (async)...") # Suppressed log
 
-    # --- Load Proxy Configuration ---
-    # Use the imported function to get the proxy dict
-    proxy_config_dict = get_proxy_from_file()
-    # Extract the HTTPS URL string for httpx, default to None
-    httpx_proxy_url = None
-    if isinstance(proxy_config_dict, dict):
-        httpx_proxy_url = proxy_config_dict.get('https') # Or 'http' if needed
-        if httpx_proxy_url:
-            if not FAILED_SCRAPE_DEBUG:
-                logger.info(f"Using httpx proxy: {httpx_proxy_url}")
-        else:
-            if not FAILED_SCRAPE_DEBUG:
-                logger.info("HTTPS proxy URL not found in config dict for httpx.")
-    else:
-        if not FAILED_SCRAPE_DEBUG:
-            logger.info("Proxy config file not found or invalid format, httpx will run without proxy.")
-    # --- End Proxy Configuration ---
-
-    # --- Log the actual proxy being passed to httpx ---
-    if not FAILED_SCRAPE_DEBUG:
-        logger.info(f"Attempting to initialize httpx.AsyncClient with proxy setting: {httpx_proxy_url}")
+    # --- Proxy Configuration ---
+    # API requests are spread over the shared proxy pool (proxyconfig.json, see autoscraper_py/proxy_pool.py)
     # ---
 
     # --- Setup Playwright ---
@@ -690,9 +671,8 @@ async def scrape_kijiji_autos_async(search_params, worker_count, max_pages=1): #
     # ... (existing Playwright proxy setup logic could be added here if needed) ...
 
     browser = None
-    # Create httpx client outside the Playwright context, but within the main async function scope
-    # Pass the extracted URL string (or None) to the 'proxy' argument
-    async with httpx.AsyncClient(proxy=httpx_proxy_url, http2=True, follow_redirects=True, timeout=30.0) as client:
+    # Create the pooled httpx clients outside the Playwright context, but within the main async function scope
+    async with AsyncProxyClients(http2=True, follow_redirects=True, timeout=30.0) as client:
         browser = None # Define browser outside try block to ensure it's available in finally
         try:
             async with async_playwright() as p:
@@ -1,4 +1,4 @@
-import requests, os # Keep requests for the sync version if needed
+import requests, os, sys # Keep requests for the sync version if needed
 import httpx # Import httpx for async requests
 import asyncio # Import asyncio for sleep
 import json
@@ -17,6 +17,13 @@ try:
 except ImportError:
     FAILED_SCRAPE_DEBUG = False # Default if KijijiScraper is not available or var is not there
 
+# Proxies come from the pool shared with the AutoTrader scraper
+try:
+    from autoscraper_py.proxy_pool import get_proxy_pool
+except ImportError: # Run from inside KijijiScraper/
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from autoscraper_py.proxy_pool import get_proxy_pool
+
 # Define custom exception
 class ScrapingTimeoutError(Exception):
     """Custom exception for scraping timeouts after retries."""
@@ -26,23 +33,39 @@ class ScrapingConnectionError(Exception):
     """Custom exception for scraping connection errors after retries."""
     pass
 
-# --- Proxy Loading ---
-def get_proxy_from_file(filename="proxyconfig.json"):
-    """Loads proxy configuration from a JSON file."""
-    try:
-        with open(filename, 'r') as file:
-            data = json.load(file)
-            # Return the whole dict, requests will pick http/https
-            return data
-    except FileNotFoundError:
-        logging.warning(f"Proxy file '{filename}' not found. Proceeding without proxy.")
-        return None
-    except json.JSONDecodeError:
-        logging.error(f"Invalid JSON format in proxy file '{filename}'. Proceeding without proxy.")
-        return None
-    except Exception as e:
-        logging.error(f"Error loading proxy file '{filename}': {e}. Proceeding without proxy.")
-        return None
+# --- Proxies ---
+class AsyncProxyClients:
+    """
+    Async stand-in for a single httpx.AsyncClient that spreads requests over the proxy pool.
+    Keeps one AsyncClient (and its connections) per proxy; each get() leases a proxy and
+    reports the response to the pool. Use as `async with AsyncProxyClients(...) as client`.
+    """
+
+    def __init__(self, pool=None, **client_kwargs):
+        self.pool = pool or get_proxy_pool()
+        self._client_kwargs = client_kwargs # Passed to every httpx.AsyncClient
+        self._clients = {}
+
+    def _client_for(self, proxy):
+        client = self._clients.get(proxy.url)
+        if client is None:
+            client = httpx.AsyncClient(proxy=proxy.url, **self._client_kwargs)
+            self._clients[proxy.url] = client
+        return client
+
+    async def get(self, url, **kwargs):
+        async with self.pool.async_lease() as lease:
+            response = await self._client_for(lease.proxy).get(url, **kwargs)
+            lease.record(response.status_code)
+            return response
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
 
 # --- Synchronous Scraper (Keep for potential direct use/testing) ---
 def scrape_kijiji_single_page(partial_url: str, output_filename: Optional[str] = None) -> Optional[Dict[str, Any]]:
@@ -76,8 +99,7 @@ def scrape_kijiji_single_page(partial_url: str, output_filename: Optional[str] =
         'Sec-Fetch-Site': 'same-origin',
         # 'Connection': 'keep-alive', # requests handles connection
     }
-    # Load proxies before making the request
-    proxies = get_proxy_from_file()
+    proxy_pool = get_proxy_pool()
 
     max_retries = 3 # Number of retries for 403 errors
     initial_retry_delay = 1.0 # Initial delay in seconds
@@ -89,7 +111,9 @@ def scrape_kijiji_single_page(partial_url: str, output_filename: Optional[str] =
             # --- Make the request ---
             if not FAILED_SCRAPE_DEBUG:
                 logger.info(f"Attempting to fetch data from: {url} (Attempt {attempt + 1}/{max_retries + 1})")
-            response = requests.get(url, headers=headers, proxies=proxies, timeout=request_timeout)
+            with proxy_pool.lease() as lease: # Each attempt may go out through a different proxy
+                response = requests.get(url, headers=headers, proxies=lease.proxies, timeout=request_timeout)
+                lease.record(response.status_code)
 
             # --- Handle 403 Forbidden ---
             if response.status_code == 403:
@@ -153,14 +177,14 @@ def scrape_kijiji_single_page(partial_url: str, output_filename: Optional[str] =
 
 
 # --- Asynchronous Scraper using httpx ---
-async def scrape_kijiji_single_page_async(partial_url: str, client: httpx.AsyncClient, output_filename: Optional[str] = None) -> Optional[Dict[str, Any]]:
+async def scrape_kijiji_single_page_async(partial_url: str, client: "AsyncProxyClients", output_filename: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
     Fetches JSON data from a Kijiji Autos API URL asynchronously using httpx.
-    Optionally saves it to a file. Uses a shared httpx.AsyncClient.
+    Optionally saves it to a file. Uses shared clients over the proxy pool.
 
     Args:
         partial_url (str): The listing ID part of the Kijiji URL (e.g., "34992435").
-        client (httpx.AsyncClient): An active httpx AsyncClient instance (potentially with proxy config).
+        client (AsyncProxyClients): Active clients for the proxy pool (a plain httpx.AsyncClient also works).
         output_filename (Optional[str]): If provided, the name of the file to save
                                          the JSON data to. Defaults to None (no saving).
 
@@ -422,9 +446,8 @@ async def _test_async_scrape():
     """Helper async function to test the async scraper."""
     logging.info("--- Testing Async Scraper ---")
     test_partial_url = "34992435"
-    proxies = get_proxy_from_file() # Load proxies once
-    # Create an httpx client (consider reusing this in the main scraper)
-    async with httpx.AsyncClient(proxies=proxies, http2=True, follow_redirects=True) as client: # Enable HTTP/2 if supported
+    # Clients over the shared proxy pool (consider reusing this in the main scraper)
+    async with AsyncProxyClients(http2=True, follow_redirects=True) as client: # Enable HTTP/2 if supported
         # Save the file during this test run
         raw_data = await scrape_kijiji_single_page_async(test_partial_url, client, output_filename="test_single_page_kijiji_async.json")
         if raw_data:
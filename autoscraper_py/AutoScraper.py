@@ -9,9 +9,16 @@ import os
 import logging
 import csv # Added for CSV cache handling
 import datetime # Added for date caching
-from functools import lru_cache # Will be removed later, but keep import for now if used elsewhere
+from functools import lru_cache, partial # Will be removed later, but keep import for now if used elsewhere
 
 from .AutoScraperUtil import *
+from .metrics import (
+    instrumented_request, record_retry, record_rate_limited, record_response_bytes, record_cache_lookups,
+    PARSE_SECONDS, CACHE_IO_SECONDS
+)
+from .profiling import timed_phase
+from .proxy_pool import get_proxy_pool
+from .http_transport import mount_http_transport, is_buffered
 
 # Configure logging
 logging.basicConfig(
@@ -84,68 +91,11 @@ logger = logging.getLogger("AutoScraper")
 # --- End Schema ---
 
 
-# Global variables
-start_time = None
 # Cache for vehicle info to avoid duplicate requests (lru_cache will be removed)
-# vehicle_info_cache = {} # Removed, using CSV cache now
-
-# --- CSV Cache Configuration ---
-CACHE_FILE = "autoscraper_cache.csv"
-CACHE_HEADERS = [
-    "Link", "Make", "Model", "Year", "Trim", "Price", "Drivetrain",
-    "Kilometres", "Status", "Body Type", "Engine", "Cylinder",
-    "Transmission", "Exterior Colour", "Doors", "Fuel Type",
-    "City Fuel Economy", "Hwy Fuel Economy", "date_cached" # Added date column
-]
-
-def load_cache(filepath=CACHE_FILE):
-    """Loads the CSV cache file into a dictionary."""
-    cache = {}
-    try:
-        with open(filepath, mode='r', newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            if reader.fieldnames != CACHE_HEADERS:
-                 logger.warning(f"Cache file '{filepath}' headers mismatch expected headers. Rebuilding cache might be necessary.")
-                 # Decide if you want to return {} or try to proceed
-                 # return {}
-            for row in reader:
-                link = row.get("Link")
-                if link:
-                    cache[link] = row
-        logger.info(f"Loaded {len(cache)} items from cache file '{filepath}'.")
-    except FileNotFoundError:
-        logger.info(f"Cache file '{filepath}' not found. A new one will be created.")
-    except Exception as e:
-        logger.error(f"Error loading cache file '{filepath}': {e}")
-    return cache
+# vehicle_info_cache = {} # Removed, using the listing cache now
 
-def append_to_cache(data_rows, filepath=CACHE_FILE, headers=CACHE_HEADERS):
-    """Appends new data rows (list of dicts) to the CSV cache file."""
-    if not data_rows:
-        return
-
-    file_exists = os.path.isfile(filepath)
-    try:
-        with open(filepath, mode='a', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=headers)
-            if not file_exists or os.path.getsize(filepath) == 0:
-                writer.writeheader()
-                logger.info(f"Created or wrote headers to cache file '{filepath}'.")
-            writer.writerows(data_rows)
-        logger.info(f"Appended {len(data_rows)} new items to cache file '{filepath}'.")
-    except Exception as e:
-        logger.error(f"Error appending to cache file '{filepath}': {e}")
-
-def write_cache(cache_dict, filepath=CACHE_FILE, headers=CACHE_HEADERS):
-    """Writes the entire cache dictionary to the CSV file, overwriting existing content."""
-    try:
-        with open(filepath, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=headers)
-            writer.writeheader()
-            writer.writerows(cache_dict.values()) # Write all values from the cache dict
-        logger.info(f"Wrote {len(cache_dict)} items to cache file '{filepath}'.")
-    except Exception as e:
-        logger.error(f"Error writing cache file '{filepath}': {e}")
+# --- Listing Cache (listing_cache.py; CSV helpers re-exported for existing callers) ---
+from .listing_cache import CACHE_FILE, CACHE_HEADERS, load_cache, append_to_cache, write_cache, listing_cache
 
 
 def get_proxy_from_file(filename = "proxyconfig.json"):
@@ -161,7 +111,7 @@ def get_proxy_from_file(filename = "proxyconfig.json"):
 # Reduced default max_workers significantly
 def fetch_autotrader_data(params, max_retries=5, initial_retry_delay=0.5, max_workers=1000,
                           initial_fetch_only=False, start_page=1, initial_results_html=None, max_page_override=None,
-                          task_instance=None): # Added task_instance
+                          task_instance=None, checkpoint=None, phase_timer=None): # Added task_instance
     call_specific_start_time = time.time() # For timing this specific call
     """
     Fetch data from AutoTrader.ca API. Can perform an initial fetch for count or fetch all pages.
@@ -175,15 +125,12 @@ def fetch_autotrader_data(params, max_retries=5, initial_retry_delay=0.5, max_wo
         start_page (int): Page number to start fetching from (used when initial_fetch_only=False).
         initial_results_html (list, optional): Parsed HTML results from page 0 (passed in second stage).
         max_page_override (int, optional): Known max page number (passed in second stage).
+        checkpoint (ScrapeCheckpoint, optional): Skips pages already recorded in it and records newly fetched ones.
+        phase_timer (PhaseTimer, optional): Records the 'search_pages' and 'parse' phases of the calling task.
 
     Returns:
         dict or list: If initial_fetch_only=True, returns dict with estimate. Otherwise, list of results.
     """
-    global start_time
-    # Only reset timer on the first call (or when not continuing a fetch)
-    if start_page <= 1 and initial_results_html is None:
-        start_time = time.time()
-
     # Set default values for parameters
     default_params = {
         "Make": "",
@@ -255,8 +202,8 @@ def fetch_autotrader_data(params, max_retries=5, initial_retry_delay=0.5, max_wo
     logger.info(f"Using raw exclusions for initial parsing: {raw_exclusions}")
     logger.info(f"Transformed exclusions for later steps: {transformed_exclusions}")
 
-    url = "https://www.autotrader.ca/Refinement/Search"
-    proxy = get_proxy_from_file()
+    url = f"{AUTOTRADER_BASE_URL}/Refinement/Search"
+    proxy_pool = get_proxy_pool()
     logger.info(f"Search parameters: {params}")
 
     # Create a session object with a larger connection pool
@@ -274,6 +221,7 @@ def fetch_autotrader_data(params, max_retries=5, initial_retry_delay=0.5, max_wo
     # adapter = HTTPAdapter(pool_connections=100, pool_maxsize=100, max_retries=retry_strategy)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
+    mount_http_transport(session) # Replaces the adapter when AUTOTRADER_HTTP_TRANSPORT selects HTTP/2
 
     session.headers.update({
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36",
@@ -281,7 +229,6 @@ def fetch_autotrader_data(params, max_retries=5, initial_retry_delay=0.5, max_wo
         "Accept": "application/json",
         "Accept-Language": "en-US,en;q=0.9",
     })
-    session.proxies.update(proxy) # Add proxies to the session
 
     def fetch_page(page, session):
         """
@@ -339,8 +286,9 @@ def fetch_autotrader_data(params, max_retries=5, initial_retry_delay=0.5, max_wo
 
             try:
                 # Use the session object for the request
-                # Use the session object for the request
-                response = session.post(url=url, json=payload, timeout=30) # Headers and proxies are now part of the session
+                with proxy_pool.lease() as lease: # Each request goes out through a proxy from the shared pool
+                    response = instrumented_request("search", session.post, url, json=payload, timeout=30, proxies=lease.proxies)
+                    lease.record(response.status_code)
                 time.sleep(0.25) # Add a small delay after each request
                 response.raise_for_status()
                 json_response = response.json()
@@ -361,6 +309,7 @@ def fetch_autotrader_data(params, max_retries=5, initial_retry_delay=0.5, max_wo
                          return parsed_html_page, 1, {} # Cannot determine max_page accurately
                     else:
                         logger.warning(f"No results (neither SearchResultsDataJson nor AdsHtml) for page {page} (Attempt {attempt + 1}/{max_retries}). Retrying...")
+                        record_retry("search", "empty")
                         time.sleep(retry_delay)
                         retry_delay = min(retry_delay * 2, 30) # Exponential backoff
                         continue
@@ -368,16 +317,24 @@ def fetch_autotrader_data(params, max_retries=5, initial_retry_delay=0.5, max_wo
                 # If we have SearchResultsDataJson, parse it
                 search_results_dict = json.loads(search_results_json_str)
                  # Pass RAW exclusions to parse_html_content (filtering removed there later)
-                parsed_html_page = parse_html_content(ad_results_json, raw_exclusions) # Parse HTML ads as well
+                with PARSE_SECONDS.labels("parse_html_content").time(), timed_phase(phase_timer, "parse", time.thread_time):
+                    parsed_html_page = parse_html_content(ad_results_json, raw_exclusions) # Parse HTML ads as well
                 max_page_from_json = search_results_dict.get("maxPage", 1)
                 return parsed_html_page, max_page_from_json, search_results_dict
 
+            except TimeoutError as e: # No proxy slot within LEASE_TIMEOUT
+                logger.error(f"No proxy available for page {page}: {e}. Retrying...")
+                record_retry("search", "no_proxy")
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 30) # Exponential backoff
             except requests.exceptions.RequestException as e:
                 logger.error(f"Request failed for page {page}: {e}. Retrying...")
+                record_retry("search", "rate_limited" if getattr(e.response, "status_code", None) == 429 else "error")
                 time.sleep(retry_delay)
                 retry_delay = min(retry_delay * 2, 30) # Exponential backoff
             except json.JSONDecodeError as e:
                 logger.error(f"JSON decode error on page {page} for SearchResultsDataJson: {e}. Content: '{search_results_json_str[:200]}...' Retrying...")
+                record_retry("search", "invalid_json")
                 time.sleep(retry_delay)
                 retry_delay = min(retry_delay * 2, 30) # Exponential backoff
 
@@ -433,7 +390,8 @@ def fetch_autotrader_data(params, max_retries=5, initial_retry_delay=0.5, max_wo
     else:
         # This is a direct full fetch call (or first stage if initial_fetch_only was False)
         logger.info("Performing full fetch...")
-        page_0_results_html, max_page, _ = fetch_page(0, session)
+        with timed_phase(phase_timer, "search_pages"):
+            page_0_results_html, max_page, _ = fetch_page(0, session)
         all_results = page_0_results_html
         pages_completed = 1 # Page 0 is done
         logger.info(f"Full fetch: Found {max_page} pages. Starting from page {start_page}.")
@@ -441,13 +399,21 @@ def fetch_autotrader_data(params, max_retries=5, initial_retry_delay=0.5, max_wo
 
     # Determine pages to fetch in this stage
     pages_to_fetch = list(range(start_page, max_page))
+    if checkpoint:
+        # Resume: reuse pages fetched before a retry/redelivery
+        completed_pages = checkpoint.completed_pages()
+        for page in pages_to_fetch:
+            if page in completed_pages:
+                all_results.extend(completed_pages[page])
+                pages_completed += 1
+        pages_to_fetch = [page for page in pages_to_fetch if page not in completed_pages]
 
     if not pages_to_fetch:
          logger.info("No further pages to fetch (or only page 0 existed).")
     else:
         logger.info(f"Fetching pages {start_page} to {max_page - 1}...")
         # Process remaining pages concurrently using the session
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        with timed_phase(phase_timer, "search_pages"), concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
             # Submit all page fetch tasks, passing the session
             future_to_page = {executor.submit(fetch_page, page, session): page for page in pages_to_fetch}
 
@@ -459,6 +425,8 @@ def fetch_autotrader_data(params, max_retries=5, initial_retry_delay=0.5, max_wo
                     page_results_html, _, _ = future.result()
                     all_results.extend(page_results_html)
                     pages_completed += 1
+                    if checkpoint and page_results_html: # Empty means the fetch failed; retry it on resume
+                        checkpoint.record_page(page, page_results_html)
 
                     # Update progress via Celery task if available
                     if task_instance:
@@ -470,15 +438,13 @@ def fetch_autotrader_data(params, max_retries=5, initial_retry_delay=0.5, max_wo
                 except Exception as e:
                     logger.error(f"Error processing page {page}: {e}")
 
+    if checkpoint:
+        checkpoint.flush()
+
     # Remove duplicates (pass transformed exclusions, though function ignores them now for filtering)
     unique_link_results = remove_duplicates_exclusions(all_results, transformed_exclusions)
     logger.info(f"Found {len(unique_link_results)} unique listings after duplicate removal.") # Renamed variable
 
-    # Avoid logging negative time if start_time wasn't set (e.g., only second stage ran)
-    if start_time: # This refers to the global start_time for the whole operation
-        elapsed = time.time() - start_time
-        logger.info(f"Total fetch time for operation: {elapsed:.2f} seconds")
-
     current_call_duration = time.time() - call_specific_start_time
     logger.info(f"fetch_autotrader_data (full fetch part) call took: {current_call_duration:.2f} seconds")
 
@@ -489,13 +455,35 @@ def fetch_autotrader_data(params, max_retries=5, initial_retry_delay=0.5, max_wo
 # Removed @lru_cache and the wrapper function extract_vehicle_info_cached
 # The CSV cache handles persistence now.
 
-def extract_vehicle_info(url):
+DETAIL_CHUNK_SIZE = 16 * 1024 # Bytes per read while streaming a detail page
+
+def read_detail_page(response):
+    """
+    Text of a streamed detail page response, read only up to the end of its embedded vehicle JSON.
+    The connection is closed there, so the rest of the page is never downloaded (with the requests
+    transport; HTTP/2 responses arrive complete). Pages without a complete JSON object (e.g.
+    rate-limit pages) are read in full.
+    """
+    if response.status_code != 200:
+        response.close() # Only the status is needed
+        return ""
+    streamed = not is_buffered(response) # The HTTP/2 transport has already read the whole body
+    try:
+        body, json_end = read_until_json_object(response.iter_content(DETAIL_CHUNK_SIZE))
+    finally:
+        response.close()
+    if streamed:
+        record_response_bytes("detail", len(body)) # Counted by instrumented_request otherwise
+    return body[:json_end].decode(response.encoding or "utf-8", errors="replace")
+
+def extract_vehicle_info(url, phase_timer=None):
     """
     Extracts vehicle info from the provided URL with improved error handling
     and exponential backoff for rate limiting.
 
     Args:
         url (str): The URL to fetch data from.
+        phase_timer (PhaseTimer, optional): Records the time spent parsing as the 'parse' phase.
 
     Returns:
         dict: Vehicle information extracted from the URL.
@@ -512,8 +500,8 @@ def extract_vehicle_info(url):
         "Connection": "keep-alive",
         "Upgrade-Insecure-Requests": "1",
     })
-    proxy = get_proxy_from_file()
-    session.proxies.update(proxy) # Add proxies to the session
+    mount_http_transport(session) # Shares multiplexed connections across calls when HTTP/2 is selected
+    proxy_pool = get_proxy_pool()
 
     initial_delay = .25  # Seconds to wait initially
     max_retries = 12   # Maximum retry attempts for rate limiting
@@ -522,12 +510,26 @@ def extract_vehicle_info(url):
     try:
         for attempt in range(max_retries):
             # Use the session object for the request
-            response = session.get(url, timeout=30) # Headers and proxies are now part of the session
+            try:
+                with proxy_pool.lease() as lease: # Each attempt may go out through a different proxy
+                    response = instrumented_request("detail", session.get, url, timeout=30, proxies=lease.proxies, stream=True)
+                    page = read_detail_page(response) # Stops downloading once the vehicle JSON is complete
+                    rate_limit_page = "Request unsuccessful." in page or "Too Many Requests" in page
+                    lease.record(response.status_code, blocked=rate_limit_page)
+            except TimeoutError as e: # No proxy slot within LEASE_TIMEOUT
+                if attempt < max_retries - 1:
+                    logger.warning(f"No proxy available for {url}: {e}. Retrying in {retry_delay} seconds... (Attempt {attempt + 1}/{max_retries})")
+                    record_retry("detail", "no_proxy")
+                    time.sleep(retry_delay)
+                    retry_delay = min(retry_delay * 2, 10)
+                    continue
+                raise
 
             # Check for rate limiting via HTTP status code
             if response.status_code == 429:
                 if attempt < max_retries - 1:
                     logger.warning(f"Rate limited (HTTP 429). Retrying in {retry_delay} seconds... (Attempt {attempt + 1}/{max_retries})")
+                    record_retry("detail", "rate_limited")
                     time.sleep(retry_delay)
                     # Exponential backoff with max of 60 seconds
                     retry_delay = min(retry_delay * 2, 10)
@@ -538,9 +540,11 @@ def extract_vehicle_info(url):
             response.raise_for_status()  # Raise for other HTTP errors
 
             # Check for rate limiting patterns in the response text
-            if "Request unsuccessful." in response.text or "Too Many Requests" in response.text:
+            if rate_limit_page:
+                record_rate_limited("detail")
                 if attempt < max_retries - 1:
                     logger.warning(f"Rate limited (Response Text). Retrying in {retry_delay} seconds... (Attempt {attempt + 1}/{max_retries})")
+                    record_retry("detail", "rate_limited")
                     time.sleep(retry_delay)
                     # Exponential backoff with max of 60 seconds
                     retry_delay = min(retry_delay * 2, 10)
@@ -552,8 +556,11 @@ def extract_vehicle_info(url):
             # time.sleep(1)  # Brief pause to be nice to the server
 
             # Parse the response JSON or HTML content
-            respjson = parse_html_content_to_json(response.text)
-            car_info = extract_vehicle_info_from_json(respjson)
+            with timed_phase(phase_timer, "parse", time.thread_time):
+                with PARSE_SECONDS.labels("parse_html_content_to_json").time():
+                    respjson = parse_html_content_to_json(page)
+                with PARSE_SECONDS.labels("extract_vehicle_info_from_json").time():
+                    car_info = extract_vehicle_info_from_json(respjson)
 
             # Caching is handled by @lru_cache on extract_vehicle_info_cached
 
@@ -640,26 +647,28 @@ def extract_vehicle_info_from_json(json_content):
 
 # Add transformed_exclusions and task_instance parameters
 # Reduced default max_workers significantly
-def process_links_and_update_cache(data, transformed_exclusions, max_workers=1000, task_instance=None):
+def process_links_and_update_cache(data, transformed_exclusions, max_workers=1000, task_instance=None, checkpoint=None,
+                                   result_sink=None, phase_timer=None):
     """
-    Processes links, using and updating a persistent CSV cache.
-    Fetches data for new links, filters based on exclusions, and updates the cache file.
+    Processes links, using and updating the shared listing cache (listing_cache.py).
+    Fetches data for new links, filters based on exclusions, and upserts the fetched rows.
     Returns the data for all links relevant to the current search (cached or newly fetched).
 
     Args:
         data (list): List of link dictionaries (e.g., [{'link': 'url1'}, {'link': 'url2'}]).
         max_workers (int): Maximum number of concurrent workers for fetching new data.
+        checkpoint (ScrapeCheckpoint, optional): Reuses detail rows recorded in it and records newly fetched ones.
+        result_sink (ResultStreamSink, optional): Receives each accepted row as soon as it passes the exclusion filter.
+        phase_timer (PhaseTimer, optional): Records the 'cache_load', 'detail_fetch', 'parse', 'filter' and 'cache_write' phases.
 
     Returns:
         list: A list of dictionaries, where each dictionary represents a car's data
               corresponding to the input links.
     """
-    global start_time # Keep track of overall time if needed
-    if not start_time: # Ensure start_time is set if this is the first major step
-        start_time = time.time()
-
     logger.info(f"Processing {len(data)} links with exclusions. Loading cache...")
-    persistent_cache = load_cache() # Load the main cache
+    with CACHE_IO_SECONDS.labels("load").time(), timed_phase(phase_timer, "cache_load"):
+        persistent_cache = listing_cache.get_many(item["link"] for item in data if item.get("link")) # Cached rows for these links
+    updated_rows = {} # Rows to upsert into the listing cache
     results_for_current_search = [] # Holds results (dict) for this specific run
     links_to_fetch = [] # Links not found in cache or stale
     # Prepare lowercase exclusions for efficient filtering
@@ -683,9 +692,12 @@ def process_links_and_update_cache(data, transformed_exclusions, max_workers=100
             # Cache Hit: Check if it's fresh (cached today)
             if cached_item.get('date_cached') == today_date:
                 # Apply exclusion filter to fresh cache hit
-                is_excluded = any(excl_lower in str(value).lower() for value in cached_item.values() for excl_lower in lower_exclusion_strings)
+                with timed_phase(phase_timer, "filter", time.thread_time):
+                    is_excluded = any(excl_lower in str(value).lower() for value in cached_item.values() for excl_lower in lower_exclusion_strings)
                 if not is_excluded:
                     results_for_current_search.append(cached_item)
+                    if result_sink:
+                        result_sink.add(cached_item)
                     cache_hits_fresh += 1
                     logger.debug(f"Cache hit (fresh, kept) for: {link}")
                 else:
@@ -704,17 +716,39 @@ def process_links_and_update_cache(data, transformed_exclusions, max_workers=100
 
     # Log cache statistics
     logger.info(f"Cache Stats: {cache_hits_fresh} fresh hits, {cache_hits_stale} stale hits, {cache_misses} misses.")
-    logger.info(f"Found {len(persistent_cache)} total items currently in cache.")
+    record_cache_lookups(cache_hits_fresh, cache_hits_stale, cache_misses)
+    logger.info(f"Found {len(persistent_cache)} of these links in cache.")
     logger.info(f"Need to fetch/refresh {len(links_to_fetch)} links (stale + misses).")
 
+    # Resume: rows fetched before a retry/redelivery don't need another request
+    if checkpoint:
+        remaining_links = []
+        for item in links_to_fetch:
+            fetched = checkpoint.fetched_row(item["link"])
+            if fetched is None:
+                remaining_links.append(item)
+                continue
+            row_dict, kept = fetched
+            if kept:
+                results_for_current_search.append(row_dict)
+                if result_sink:
+                    result_sink.add(row_dict)
+                persistent_cache[item["link"]] = updated_rows[item["link"]] = row_dict
+            elif item["link"] in persistent_cache:
+                persistent_cache[item["link"]] = updated_rows[item["link"]] = row_dict
+        if len(remaining_links) < len(links_to_fetch):
+            logger.info(f"Reused {len(links_to_fetch) - len(remaining_links)} rows from checkpoint.")
+        links_to_fetch = remaining_links
+
     # 2. Fetch data for new links concurrently
     if links_to_fetch:
         processed_new = 0
         total_to_fetch = len(links_to_fetch)
         logger.info(f"Starting concurrent fetch for {total_to_fetch} links with {max_workers} workers...")
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_link_item = {executor.submit(extract_vehicle_info, item["link"]): item for item in links_to_fetch}
+        with timed_phase(phase_timer, "detail_fetch"), concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            fetch_detail = partial(extract_vehicle_info, phase_timer=phase_timer) if phase_timer else extract_vehicle_info
+            future_to_link_item = {executor.submit(fetch_detail, item["link"]): item for item in links_to_fetch}
 
             for future in concurrent.futures.as_completed(future_to_link_item):
                 link_item = future_to_link_item[future]
@@ -729,18 +763,24 @@ def process_links_and_update_cache(data, transformed_exclusions, max_workers=100
                         row_dict = {header: car_info_with_link.get(header, "") for header in CACHE_HEADERS}
 
                         # Apply exclusion filter *before* adding to results or cache
-                        is_excluded = any(excl_lower in str(value).lower() for value in row_dict.values() for excl_lower in lower_exclusion_strings)
+                        with timed_phase(phase_timer, "filter", time.thread_time):
+                            is_excluded = any(excl_lower in str(value).lower() for value in row_dict.values() for excl_lower in lower_exclusion_strings)
+
+                        if checkpoint:
+                            checkpoint.record_row(link, row_dict, not is_excluded)
 
                         if not is_excluded:
                             results_for_current_search.append(row_dict) # Add to current search results
-                            persistent_cache[link] = row_dict # Update in-memory cache (overwrites stale if existed)
+                            if result_sink:
+                                result_sink.add(row_dict)
+                            persistent_cache[link] = updated_rows[link] = row_dict # Update cache (overwrites stale if existed)
                             logger.debug(f"Successfully fetched/refreshed and kept: {link}")
                         else:
                             # If excluded, don't add to results, but DO update cache if it was stale
                             # to prevent re-fetching an excluded item repeatedly.
                             # However, if it was a *new* miss, don't add the excluded item to cache.
                             if link in persistent_cache: # Only update cache if it was stale
-                                persistent_cache[link] = row_dict # Update cache with excluded item to mark as 'fetched today'
+                                persistent_cache[link] = updated_rows[link] = row_dict # Update cache with excluded item to mark as 'fetched today'
                                 logger.debug(f"Successfully fetched/refreshed but excluded: {link}. Cache updated.")
                             else: # It was a new miss and excluded
                                 logger.debug(f"Successfully fetched new item but excluded: {link}. Not added to cache.")
@@ -760,10 +800,16 @@ def process_links_and_update_cache(data, transformed_exclusions, max_workers=100
                 except Exception as e:
                     logger.error(f"Error processing future for {link}: {e}")
 
-    # 3. Write the potentially updated cache back to the file
-    # Cache now contains non-excluded new items, updated non-excluded stale items,
-    # and potentially updated but excluded stale items (to prevent re-fetch).
-    write_cache(persistent_cache)
+    if checkpoint:
+        checkpoint.flush()
+    if result_sink:
+        result_sink.flush()
+
+    # 3. Upsert the fetched rows into the listing cache
+    # These are non-excluded new items, updated non-excluded stale items,
+    # and updated but excluded stale items (to prevent re-fetch).
+    with CACHE_IO_SECONDS.labels("write").time(), timed_phase(phase_timer, "cache_write"):
+        listing_cache.put_many(updated_rows.values())
 
     # Filtering was applied as items were processed.
     logger.info(f"Finished processing links and updated cache. Returning {len(results_for_current_search)} filtered results for this search.")
@@ -2,12 +2,17 @@ import ast
 import csv
 import json
 import os
+import hashlib
 import re # Import re for the cleaning function
 
 from bs4 import BeautifulSoup
 import webbrowser
 import requests
 
+# Base URL of the AutoTrader site. Set AUTOTRADER_BASE_URL to point the scraper somewhere else,
+# e.g. the local stub server in benchmarks/stub_autotrader.py.
+AUTOTRADER_BASE_URL = os.environ.get("AUTOTRADER_BASE_URL", "https://www.autotrader.ca").rstrip("/")
+
 def clean_model_name(model_name):
     """Removes the trailing ' (number)' suffix from a model name."""
     if not isinstance(model_name, str):
@@ -166,6 +171,54 @@ def parse_html_content_to_json(html_content):
     except Exception as e:
         print(f"An error occurred while parsing HTML to JSON: {e}")
 
+# Characters that can change the brace depth: braces and quotes outside strings, quotes and escapes inside them
+_JSON_OUTSIDE_STRING = re.compile(rb'[{}"]')
+_JSON_INSIDE_STRING = re.compile(rb'["\\]')
+
+def read_until_json_object(chunks):
+    """
+    Reads byte chunks (e.g. response.iter_content()) only until the first JSON object in them is
+    complete, tracking brace depth outside of string literals. The scan works on the raw bytes, which
+    is safe for UTF-8 and other ASCII-compatible encodings.
+
+    Args:
+        chunks (iterable): Byte chunks of the document. Iteration stops as soon as the object closes.
+
+    Returns:
+        tuple: (bytes read, end offset of the object in them), or (bytes read, None) if the chunks
+            ran out before an object was complete.
+    """
+    buffer = bytearray()
+    pos = 0 # Next byte to scan; may point past the buffer after an escape at a chunk boundary
+    depth = 0
+    in_string = False
+    for chunk in chunks:
+        buffer += chunk
+        if depth == 0:
+            start = buffer.find(b"{", pos)
+            if start == -1:
+                pos = len(buffer)
+                continue
+            pos, depth = start + 1, 1
+        while True:
+            match = (_JSON_INSIDE_STRING if in_string else _JSON_OUTSIDE_STRING).search(buffer, pos)
+            if match is None:
+                pos = max(pos, len(buffer))
+                break
+            char = buffer[match.start()]
+            pos = match.end()
+            if char == 0x5C: # Backslash: skip the escaped character
+                pos += 1
+            elif char == 0x22: # Quote
+                in_string = not in_string
+            elif char == 0x7B: # {
+                depth += 1
+            else: # }
+                depth -= 1
+                if depth == 0:
+                    return bytes(buffer), pos
+    return bytes(buffer), None
+
 def save_json_to_file(json_content, file_name="output.json"):
     """
     Saves the provided JSON content to a file.
@@ -300,7 +353,7 @@ def get_html_from_url(url):
 
 #USED
 def get_all_makes(popular=True):
-    url = "https://www.autotrader.ca/"
+    url = AUTOTRADER_BASE_URL + "/"
     html_content = get_html_from_url(url)
 
     if html_content:  # Proceed only if HTML content was fetched successfully
@@ -324,7 +377,7 @@ def get_models_for_make(make):
         dict: A dictionary of models and their respective counts, or an empty dictionary if none found.
     """
     try:
-        url = "https://www.autotrader.ca/Home/Refine"
+        url = f"{AUTOTRADER_BASE_URL}/Home/Refine"
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36',
             'Content-Type': 'application/json',
@@ -391,7 +444,7 @@ def get_colors(make, model, trim=None):
         return {}
 
     try:
-        url = "https://www.autotrader.ca/Refinement/Refine" # Using the Refinement endpoint
+        url = f"{AUTOTRADER_BASE_URL}/Refinement/Refine" # Using the Refinement endpoint
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36',
             'Content-Type': 'application/json',
@@ -462,7 +515,7 @@ def get_trims_for_model(make, model):
         return {}
 
     try:
-        url = "https://www.autotrader.ca/Refinement/Refine" # Using the Refinement endpoint
+        url = f"{AUTOTRADER_BASE_URL}/Refinement/Refine" # Using the Refinement endpoint
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36',
             'Content-Type': 'application/json',
@@ -588,7 +641,7 @@ def remove_duplicates_exclusions(arr, excl=[]):
     result = []
     for item in arr:
         if item["link"][:4] != "http":
-            full_link =  "https://www.autotrader.ca" +item["link"] 
+            full_link = AUTOTRADER_BASE_URL + item["link"]
         else:
             full_link = item["link"]
         # Only check for duplicate links (seen)
@@ -622,6 +675,43 @@ def print_response_size(response):
     except Exception as e:
         print(f"An error occurred: {e}")
 
+# Saved-payload fields that don't change what a search returns upstream. Exclusions are
+# applied after fetching, so searches differing only in exclusions share one scrape.
+PAYLOAD_NON_SEARCH_FIELDS = {"Exclusions", "custom_name", "created_at", "updated_at", "auto_refresh", "last_refreshed_at",
+                             "Profile"}
+
+def normalize_payload(payload):
+    """
+    Returns the search-relevant part of a payload in canonical form, so equivalent
+    searches compare equal: non-search fields and empty/"Any" values are dropped,
+    strings are stripped and lowercased, and numbers/booleans are stored as strings.
+
+    Args:
+        payload (dict): A search payload (as saved/sent by the frontend).
+
+    Returns:
+        dict: The normalized payload.
+    """
+    normalized = {}
+    for key, value in payload.items():
+        if key in PAYLOAD_NON_SEARCH_FIELDS or value is None:
+            continue
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        elif isinstance(value, (int, float)):
+            value = str(int(value)) if float(value).is_integer() else str(value)
+        else:
+            value = str(value).strip().lower()
+        if value in ("", "any"):
+            continue
+        normalized[key] = value
+    return normalized
+
+def payload_key(payload):
+    """Stable hash of normalize_payload(payload), for grouping/caching identical searches."""
+    canonical = json.dumps(normalize_payload(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
 #USED
 def filter_dicts(data, exclusion_strings): 
     """
@@ -2,22 +2,14 @@ import os
 import json
 import secrets
 import logging
-import requests # Keep for get_exchange_rates if moved back or to util
-import google.generativeai as genai
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 import time
 from datetime import timedelta
 from functools import wraps # Keep wraps if needed by login_required here
 from flask import Flask, session, redirect, url_for, g, current_app, jsonify # Keep necessary Flask imports
 
 # Import Firebase config functions needed for initialization and potentially direct use
-from .firebase_config import (
-    initialize_firebase,
-    get_firestore_db,
-    get_user_settings # Needed by the decorator logic
-    # Add other direct use functions if any remain after refactoring
-)
+from .firebase_config import ensure_firebase_initialized
+from .services import get_gemini_model, get_search_service
 
 # Decorator is imported directly by blueprints now
 # from .auth_decorator import login_required
@@ -40,78 +32,10 @@ logging.basicConfig(level=logging.INFO)
 # app.logger.addHandler(handler)
 app.logger.info("Flask App Initializing...")
 
-# --- Firebase Initialization ---
-try:
-    firebase_initialized = initialize_firebase()
-    if firebase_initialized:
-        app.logger.info("Firebase initialized successfully.")
-        # Make DB accessible globally if needed, or rely on get_firestore_db()
-        # app.db = get_firestore_db() # Example if attaching DB to app
-    else:
-        app.logger.error("Firebase initialization failed.")
-except Exception as e:
-    app.logger.error(f"Firebase initialization failed: {e}", exc_info=True)
-    firebase_initialized = False
-
-
-# --- AI & External Services Initialization ---
-# Load API Keys from config.json
-try:
-    with open('config.json', 'r') as f:
-        config = json.load(f)
-    GEMINI_API_KEY = config.get('GEMINI_API_KEY')
-    SEARCH_API_KEY = config.get('SEARCH_API_KEY')
-    SEARCH_ENGINE_ID = config.get('SEARCH_ENGINE_ID')
-    EXCHANGE_RATE_API_KEY = config.get('EXCHANGE_RATE_API_KEY')
-except FileNotFoundError:
-    app.logger.error("config.json not found. AI/Search/Exchange features may be limited.")
-    GEMINI_API_KEY = None
-    SEARCH_API_KEY = None
-    SEARCH_ENGINE_ID = None
-    EXCHANGE_RATE_API_KEY = None
-except json.JSONDecodeError:
-    app.logger.error("Error decoding config.json.")
-    GEMINI_API_KEY = None
-    SEARCH_API_KEY = None
-    SEARCH_ENGINE_ID = None
-    EXCHANGE_RATE_API_KEY = None
-except Exception as e:
-    app.logger.error(f"An unexpected error occurred loading config.json: {e}", exc_info=True)
-    GEMINI_API_KEY = None
-    SEARCH_API_KEY = None
-    SEARCH_ENGINE_ID = None
-    EXCHANGE_RATE_API_KEY = None
-
-# Configure Gemini
-app.gemini_model = None # Initialize attribute on app
-if GEMINI_API_KEY:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        # Attach the model to the app context for blueprints
-        app.gemini_model = genai.GenerativeModel('gemini-2.0-flash-thinking-exp-01-21') # Or your chosen model
-        app.logger.info("Gemini AI Model configured and attached to app.")
-    except Exception as e:
-        app.logger.error(f"Failed to configure Gemini AI Model: {e}", exc_info=True)
-else:
-    app.logger.warning("GEMINI_API_KEY not found. AI analysis will be disabled.")
-
-# Configure Google Search
-app.search_service = None # Initialize attribute on app
-app.SEARCH_ENGINE_ID = SEARCH_ENGINE_ID # Attach ID to app
-if SEARCH_API_KEY and SEARCH_ENGINE_ID:
-    try:
-        # Attach the service to the app context
-        app.search_service = build("customsearch", "v1", developerKey=SEARCH_API_KEY)
-        app.logger.info("Google Custom Search service configured and attached to app.")
-    except Exception as e:
-        app.logger.error(f"Failed to configure Google Custom Search service: {e}", exc_info=True)
-else:
-    app.logger.warning("SEARCH_API_KEY or SEARCH_ENGINE_ID not found. Web search will be disabled.")
-
-# Attach Exchange Rate Key to app
-app.EXCHANGE_RATE_API_KEY = EXCHANGE_RATE_API_KEY
-if not EXCHANGE_RATE_API_KEY:
-     app.logger.warning("EXCHANGE_RATE_API_KEY not found. Exchange rate features may be limited.")
+# --- Firebase & External Services ---
+# Firebase, Gemini and Custom Search clients are created lazily on first use
+# (firebase_config.get_firestore_db(), services.get_gemini_model(), services.get_search_service())
+# so importing the app stays cheap for autoscaled web containers.
 
 
 # --- Define Actual Login Decorator ---
@@ -130,6 +54,7 @@ from .routes.api_results import api_results_bp
 from .routes.api_settings import api_settings_bp
 from .routes.api_ai import api_ai_bp
 from .tasks import tasks_bp # Import the tasks blueprint
+from .metrics import metrics_bp
 
 # Register blueprints with the app
 app.register_blueprint(views_bp)
@@ -140,6 +65,7 @@ app.register_blueprint(api_results_bp) # Prefix '/api' defined in blueprint
 app.register_blueprint(api_settings_bp) # Prefix '/api' defined in blueprint
 app.register_blueprint(api_ai_bp) # Prefix '/api' defined in blueprint
 app.register_blueprint(tasks_bp) # Register tasks blueprint (prefix '/api/tasks' defined in blueprint)
+app.register_blueprint(metrics_bp) # Prometheus metrics at /metrics
 
 app.logger.info("Blueprints registered.")
 
@@ -154,9 +80,9 @@ if __name__ == '__main__':
         os.makedirs("Results")
         app.logger.info("Created 'Results' directory.")
 
-    print(f"Firebase initialization: {'Successful' if firebase_initialized else 'Failed'}")
-    print(f"Gemini Model: {'Configured' if app.gemini_model else 'Not Configured'}")
-    print(f"Search Service: {'Configured' if app.search_service else 'Not Configured'}")
+    print(f"Firebase initialization: {'Successful' if ensure_firebase_initialized() else 'Failed'}")
+    print(f"Gemini Model: {'Configured' if get_gemini_model() else 'Not Configured'}")
+    print(f"Search Service: {'Configured' if get_search_service() else 'Not Configured'}")
     print("---")
     print("Server running at http://localhost:5000")
     print("Access the app via landing page: http://localhost:5000/")
@@ -0,0 +1,239 @@
+"""
+Records parser fixtures (sanitized responses) for the replay harness in parser_replay.py.
+
+Captured bodies go under benchmarks/fixtures/ by parser input:
+    autotrader_ads/      AdsHtml of Refinement/Search pages   -> parse_html_content
+    autotrader_detail/   listing detail responses             -> parse_html_content_to_json, extract_vehicle_info_from_json
+    kijiji/              Kijiji Autos listing API JSON        -> extract_relevant_kijiji_data
+
+Contact details, seller/dealer identity, locations and session tokens are redacted before
+anything is written. New fixtures are added to golden.json with their current parser output,
+so review the captured files (and the golden diff) before committing them.
+
+Usage (from the repository root):
+    python -m autoscraper_py.benchmarks.capture_fixtures autotrader --payload payload.json [--pages 2] [--details 10] [--name civic]
+    python -m autoscraper_py.benchmarks.capture_fixtures kijiji 34992435 [34992436 ...]
+    python -m autoscraper_py.benchmarks.capture_fixtures seed    # synthetic corpus from the local stub server
+"""
+import os
+import re
+import json
+import hashlib
+import argparse
+from urllib.parse import urljoin
+
+import requests
+
+from .stub_autotrader import StubConfig, start_stub_server
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+ADS_DIR = "autotrader_ads"
+DETAIL_DIR = "autotrader_detail"
+KIJIJI_DIR = "kijiji"
+
+REDACTED = "REDACTED"
+# JSON keys whose values are redacted, including everything nested under them
+_SENSITIVE_KEY_RE = re.compile(
+    r"phone|e-?mail|contact|seller|dealer|owner|user_?(id|name)|customer|token|session|cookie|auth|"
+    r"ip_?address|latitude|longitude|^lat$|^lng$|^lon$|address|postal|zip|street|website|^vin$",
+    re.IGNORECASE,
+)
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE_RE = re.compile(r"(?<!\d)(?:\+?1[\s.-]?)?\(?\d{3}\)?[\s.-]\d{3}[\s.-]\d{4}(?!\d)")
+_AD_ID_RE = re.compile(r"/(\d+_\d+(?:_[a-z0-9]+)?)/?(?:[?#]|$)", re.IGNORECASE)
+
+_BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+def scrub_text(text):
+    """Replaces e-mail addresses and phone numbers in free text."""
+    return _PHONE_RE.sub(REDACTED, _EMAIL_RE.sub(REDACTED, text))
+
+def sanitize_json(value, redact=False):
+    """
+    Copy of a decoded JSON value with sensitive fields redacted. Scalars under a sensitive key
+    become REDACTED (structure is kept so parsers see the same shape); other strings are scrubbed.
+    """
+    if isinstance(value, dict):
+        return {key: sanitize_json(item, redact or bool(_SENSITIVE_KEY_RE.search(str(key)))) for key, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize_json(item, redact) for item in value]
+    if redact and value is not None and not isinstance(value, bool):
+        return REDACTED
+    return scrub_text(value) if isinstance(value, str) else value
+
+def sanitize_body(text):
+    """
+    Sanitizes a response body: a JSON body, or the JSON embedded between the first '{' and
+    last '}' (what parse_html_content_to_json reads), is sanitized structurally; the rest is scrubbed.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        try:
+            embedded = json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            pass
+        else:
+            return scrub_text(text[:start]) + json.dumps(sanitize_json(embedded)) + scrub_text(text[end + 1:])
+    return scrub_text(text)
+
+def _fixture_name(link):
+    match = _AD_ID_RE.search(link)
+    return match.group(1) if match else hashlib.sha1(link.encode("utf-8")).hexdigest()[:12]
+
+def _write(fixtures_dir, subdir, name, content):
+    path = os.path.join(fixtures_dir, subdir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(content)
+    return os.path.relpath(path, fixtures_dir).replace(os.sep, "/")
+
+def _session(proxies=None, trust_env=True):
+    session = requests.Session()
+    session.headers.update(_BROWSER_HEADERS)
+    session.trust_env = trust_env
+    if isinstance(proxies, dict):
+        session.proxies.update(proxies)
+    return session
+
+def capture_autotrader(payload, base_url, fixtures_dir=FIXTURES_DIR, name="search", pages=1, details=10, session=None):
+    """
+    Records `pages` search pages (AdsHtml) and the detail responses of up to `details` listings on them.
+
+    Returns:
+        list: Paths of the written fixtures, relative to fixtures_dir.
+    """
+    from ..AutoScraperUtil import parse_html_content
+
+    session = session or _session()
+    written, links = [], []
+    top = int(payload.get("Top") or 15)
+    for page in range(pages):
+        body = {**payload, "Skip": page * top, "Top": top, "micrositeType": 1}
+        body.pop("Exclusions", None)
+        response = session.post(f"{base_url}/Refinement/Search", json=body, timeout=30,
+                                headers={"Content-Type": "application/json", "Accept": "application/json"})
+        response.raise_for_status()
+        ads_html = response.json().get("AdsHtml", "")
+        if not ads_html:
+            break
+        ads_html = sanitize_body(ads_html)
+        written.append(_write(fixtures_dir, ADS_DIR, f"{name}_p{page}.html", ads_html))
+        links.extend(item["link"] for item in parse_html_content(ads_html) if item.get("link"))
+
+    for link in list(dict.fromkeys(links))[:details]:
+        url = urljoin(base_url + "/", link)
+        response = session.get(url, timeout=30, headers={"Accept": "application/json, text/javascript, */*; q=0.01"})
+        if response.status_code != 200:
+            print(f"Skipping {url}: HTTP {response.status_code}")
+            continue
+        written.append(_write(fixtures_dir, DETAIL_DIR, f"{_fixture_name(link)}.html", sanitize_body(response.text)))
+    return written
+
+def capture_kijiji(listing_ids, fixtures_dir=FIXTURES_DIR):
+    """Records the Kijiji Autos API JSON of each listing ID. Returns the written fixture paths."""
+    from KijijiScraper.KijijiSingleScrape import scrape_kijiji_single_page
+
+    written = []
+    for listing_id in listing_ids:
+        data = scrape_kijiji_single_page(str(listing_id))
+        if not data:
+            print(f"Skipping Kijiji listing {listing_id}: no data")
+            continue
+        written.append(_write(fixtures_dir, KIJIJI_DIR, f"{listing_id}.json", json.dumps(sanitize_json(data), indent=2)))
+    return written
+
+def synthetic_kijiji_listing(index):
+    """A listing in the Kijiji Autos API shape extract_relevant_kijiji_data reads, for the seed corpus."""
+    makes = [("Honda", "Civic"), ("Toyota", "RAV4"), ("BMW", "3 Series"), ("Ford", "Escape"), ("Mazda", "CX-5")]
+    make, model = makes[index % len(makes)]
+    km = 12000 + index * 17011
+    return {
+        "id": str(40000000 + index),
+        "make": make,
+        "model": model,
+        "year": 2012 + index % 12,
+        "trim": ["LX", "EX", "Sport", "Touring"][index % 4],
+        "prices": {"consumerPrice": {"amount": 9000 + index * 1234, "currency": "CAD"}},
+        "driveTrain": ["Front-wheel drive (FWD)", "All-wheel drive (AWD)"][index % 2],
+        "fuelType": "Gasoline",
+        "transmission": "Automatic",
+        "bodyType": "SUV",
+        "quickFacts": {"attributes": [{"attributes": [
+            {"key": "Kilometres", "value": f"{km:,} km"},
+            {"key": "Condition", "value": "Used"},
+            {"key": "Transmission", "value": "Automatic"},
+        ]}]},
+        "vehicleDetails": [
+            {"title": "Mechanical", "attributes": [
+                {"values": ["Power", f"{150 + index} hp"]},
+                {"values": ["Cylinders", "4"]},
+            ]},
+            {"title": "Dimensions", "attributes": [
+                {"values": ["Door count", "4 doors"]},
+                {"values": ["Body type", "SUV"]},
+            ]},
+        ],
+        "contact": {"name": REDACTED, "phone": REDACTED},
+        "description": f"Well kept {make} {model}. Call {REDACTED}.",
+    }
+
+def seed_corpus(fixtures_dir=FIXTURES_DIR, listings=45, details=10, kijiji=5):
+    """Fills the corpus with synthetic fixtures: AutoTrader pages from the stub server plus Kijiji listings."""
+    server = start_stub_server(StubConfig(listings=listings, search_latency=0, detail_latency=0))
+    try:
+        session = _session(trust_env=False) # Talk to the stub directly, never through a proxy
+        pages = -(-listings // 15)
+        written = capture_autotrader({"Make": "Toyota", "Top": 15}, server.base_url, fixtures_dir,
+                                     name="stub", pages=pages, details=details, session=session)
+    finally:
+        server.shutdown()
+        server.server_close()
+    for index in range(kijiji):
+        written.append(_write(fixtures_dir, KIJIJI_DIR, f"synthetic_{index}.json",
+                              json.dumps(synthetic_kijiji_listing(index), indent=2)))
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record sanitized parser fixtures for parser_replay.py.")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Corpus directory (default: benchmarks/fixtures)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    autotrader = commands.add_parser("autotrader", help="Search pages and listing details from AutoTrader")
+    autotrader.add_argument("--payload", required=True, help="JSON file with the search payload (as saved by the app)")
+    autotrader.add_argument("--name", default="search", help="Prefix of the search page fixtures")
+    autotrader.add_argument("--pages", type=int, default=1, help="Search pages to record (default: 1)")
+    autotrader.add_argument("--details", type=int, default=10, help="Detail pages to record (default: 10)")
+    autotrader.add_argument("--base-url", help="Defaults to AUTOTRADER_BASE_URL")
+
+    kijiji = commands.add_parser("kijiji", help="Kijiji Autos listing API responses")
+    kijiji.add_argument("listing_ids", nargs="+")
+
+    seed = commands.add_parser("seed", help="Synthetic corpus from the local stub server")
+    seed.add_argument("--listings", type=int, default=45)
+    seed.add_argument("--details", type=int, default=10)
+    seed.add_argument("--kijiji", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "autotrader":
+        from ..AutoScraper import get_proxy_from_file
+        from ..AutoScraperUtil import AUTOTRADER_BASE_URL
+        with open(args.payload, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        written = capture_autotrader(payload, (args.base_url or AUTOTRADER_BASE_URL).rstrip("/"), args.fixtures,
+                                     args.name, args.pages, args.details, _session(get_proxy_from_file()))
+    elif args.command == "kijiji":
+        written = capture_kijiji(args.listing_ids, args.fixtures)
+    else:
+        written = seed_corpus(args.fixtures, args.listings, args.details, args.kijiji)
+
+    from .parser_replay import record_golden
+    record_golden(args.fixtures, written)
+    print(f"Recorded {len(written)} fixture(s) in {args.fixtures} and added them to golden.json:")
+    for path in written:
+        print(f"  {path}")
+
+if __name__ == "__main__":
+    main()
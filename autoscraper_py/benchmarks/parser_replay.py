@@ -0,0 +1,213 @@
+"""
+Parser replay harness: runs the parsers over the recorded fixture corpus (capture_fixtures.py),
+checks their output against golden.json and measures their throughput.
+
+    parse_html_content              <- fixtures/autotrader_ads/*.html
+    parse_html_content_to_json      <- fixtures/autotrader_detail/*.html
+    extract_vehicle_info_from_json  <- the JSON parse_html_content_to_json extracts from the detail fixtures
+    extract_relevant_kijiji_data    <- fixtures/kijiji/*.json
+
+Outputs are compared by digest of their canonical JSON. Throughput (calls/s, best of --repeat passes)
+is compared with a baseline recorded on the same machine; a parser slower than the baseline by more
+than --threshold fails the check, as does any output mismatch (exit status 1).
+
+Usage (from the repository root):
+    python -m autoscraper_py.benchmarks.parser_replay [--repeat 5] [--threshold 0.2] [--output replay.json]
+    python -m autoscraper_py.benchmarks.parser_replay --update-baseline   # record this machine's baseline
+    python -m autoscraper_py.benchmarks.parser_replay --update-golden     # accept intentional output changes
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+from tabulate import tabulate
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+GOLDEN_FILE = "golden.json"
+BASELINE_FILE = "parser_baseline.json" # Machine-specific; not committed
+DEFAULT_THRESHOLD = 0.2
+MIN_PASS_SECONDS = 0.1 # Small corpora are looped so each timed pass lasts at least this long
+
+def _read_text(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def _read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _parsers():
+    """(name, fixture subdirectory, input loader, function). Imported lazily: AutoScraper sets up logging on import."""
+    from ..AutoScraperUtil import parse_html_content, parse_html_content_to_json
+    from ..AutoScraper import extract_vehicle_info_from_json
+    from KijijiScraper.KijijiSingleScrape import extract_relevant_kijiji_data
+
+    return [
+        ("parse_html_content", "autotrader_ads", _read_text, parse_html_content),
+        ("parse_html_content_to_json", "autotrader_detail", _read_text, parse_html_content_to_json),
+        ("extract_vehicle_info_from_json", "autotrader_detail",
+         lambda path: parse_html_content_to_json(_read_text(path)), extract_vehicle_info_from_json),
+        ("extract_relevant_kijiji_data", "kijiji", _read_json, extract_relevant_kijiji_data),
+    ]
+
+def load_corpus(fixtures_dir=FIXTURES_DIR):
+    """
+    Returns:
+        dict: parser name -> (function, [(fixture path relative to fixtures_dir, input, input size in bytes)])
+    """
+    corpus = {}
+    for name, subdir, loader, func in _parsers():
+        directory = os.path.join(fixtures_dir, subdir)
+        entries = []
+        if os.path.isdir(directory):
+            for file_name in sorted(os.listdir(directory)):
+                path = os.path.join(directory, file_name)
+                if os.path.isfile(path):
+                    entries.append((f"{subdir}/{file_name}", loader(path), os.path.getsize(path)))
+        corpus[name] = (func, entries)
+    return corpus
+
+def has_fixtures(fixtures_dir=FIXTURES_DIR):
+    return any(entries for _, entries in load_corpus(fixtures_dir).values())
+
+def output_digest(output):
+    return hashlib.sha256(json.dumps(output, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def compute_outputs(corpus):
+    """Returns {fixture path: {parser name: output digest}}."""
+    outputs = {}
+    for name, (func, entries) in corpus.items():
+        for path, value, _ in entries:
+            outputs.setdefault(path, {})[name] = output_digest(func(value))
+    return outputs
+
+def compare_outputs(outputs, golden):
+    """Returns [(fixture path, parser name, problem)] for outputs that differ from or are missing in golden."""
+    mismatches = []
+    for path, digests in sorted(outputs.items()):
+        for name, digest in sorted(digests.items()):
+            expected = golden.get(path, {}).get(name)
+            if expected is None:
+                mismatches.append((path, name, "not in golden.json"))
+            elif expected != digest:
+                mismatches.append((path, name, "output changed"))
+    return mismatches
+
+def load_golden(fixtures_dir=FIXTURES_DIR):
+    path = os.path.join(fixtures_dir, GOLDEN_FILE)
+    return _read_json(path) if os.path.exists(path) else {}
+
+def save_golden(golden, fixtures_dir=FIXTURES_DIR):
+    with open(os.path.join(fixtures_dir, GOLDEN_FILE), "w", encoding="utf-8") as f:
+        json.dump(golden, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def record_golden(fixtures_dir=FIXTURES_DIR, paths=None):
+    """Stores the current outputs in golden.json, for all fixtures or only the given paths."""
+    outputs = compute_outputs(load_corpus(fixtures_dir))
+    golden = load_golden(fixtures_dir) if paths is not None else {}
+    for path, digests in outputs.items():
+        if paths is None or path in paths:
+            golden[path] = digests
+    save_golden(golden, fixtures_dir)
+    return golden
+
+def time_parsers(corpus, repeat=5):
+    """
+    Times each parser over its corpus; the best of `repeat` passes counts.
+
+    Returns:
+        dict: parser name -> {'fixtures', 'calls', 'best_s', 'calls_per_s', 'mb_per_s'}
+    """
+    timings = {}
+    for name, (func, entries) in corpus.items():
+        if not entries:
+            continue
+        inputs = [value for _, value, _ in entries]
+        corpus_bytes = sum(size for _, _, size in entries)
+        start = time.perf_counter()
+        for value in inputs:
+            func(value)
+        loops = max(1, int(MIN_PASS_SECONDS / max(time.perf_counter() - start, 1e-6)) + 1)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(loops):
+                for value in inputs:
+                    func(value)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        calls = loops * len(inputs)
+        timings[name] = {
+            "fixtures": len(inputs),
+            "calls": calls,
+            "best_s": best,
+            "calls_per_s": calls / best,
+            "mb_per_s": loops * corpus_bytes / best / (1024 * 1024),
+        }
+    return timings
+
+def load_baseline(path):
+    return _read_json(path) if os.path.exists(path) else None
+
+def find_regressions(timings, baseline, threshold=DEFAULT_THRESHOLD):
+    """Returns [(parser name, baseline calls/s, current calls/s)] for parsers slower than baseline * (1 - threshold)."""
+    regressions = []
+    for name, timing in timings.items():
+        reference = (baseline or {}).get("parsers", {}).get(name)
+        if reference and timing["calls_per_s"] < reference["calls_per_s"] * (1 - threshold):
+            regressions.append((name, reference["calls_per_s"], timing["calls_per_s"]))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the parser fixture corpus: check outputs and throughput.")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Corpus directory (default: benchmarks/fixtures)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed passes per parser; the best counts (default: 5)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown against the baseline as a fraction (default: 0.2)")
+    parser.add_argument("--baseline", help="Baseline file (default: <fixtures>/parser_baseline.json)")
+    parser.add_argument("--update-baseline", action="store_true", help="Record this run's throughput as the baseline")
+    parser.add_argument("--update-golden", action="store_true", help="Accept the current outputs as golden")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    baseline_path = args.baseline or os.path.join(args.fixtures, BASELINE_FILE)
+    corpus = load_corpus(args.fixtures)
+    if not any(entries for _, entries in corpus.values()):
+        print(f"No fixtures in {args.fixtures}; record some with capture_fixtures.py.")
+        return 0
+
+    if args.update_golden:
+        record_golden(args.fixtures)
+    mismatches = compare_outputs(compute_outputs(corpus), load_golden(args.fixtures))
+    timings = time_parsers(corpus, args.repeat)
+    baseline = load_baseline(baseline_path)
+    regressions = [] if args.update_baseline else find_regressions(timings, baseline, args.threshold)
+
+    rows = []
+    for name, timing in timings.items():
+        reference = (baseline or {}).get("parsers", {}).get(name)
+        change = f"{timing['calls_per_s'] / reference['calls_per_s'] - 1:+.1%}" if reference else "-"
+        rows.append([name, timing["fixtures"], f"{timing['calls_per_s']:.0f}", f"{timing['mb_per_s']:.2f}", change])
+    print(tabulate(rows, headers=["Parser", "Fixtures", "Calls/s", "MB/s", "vs baseline"]))
+
+    for path, name, problem in mismatches:
+        print(f"MISMATCH {name} on {path}: {problem}")
+    for name, reference, current in regressions:
+        print(f"REGRESSION {name}: {current:.0f} calls/s vs baseline {reference:.0f} (threshold {args.threshold:.0%})")
+
+    if args.update_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "parsers": timings}, f, indent=2)
+        print(f"\nBaseline written to {baseline_path}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"timings": timings, "mismatches": mismatches, "regressions": regressions}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 1 if mismatches or regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+End-to-end scrape throughput benchmark against the local stub site (stub_autotrader.py).
+
+Runs fetch_autotrader_data followed by process_links_and_update_cache for every engine and
+concurrency (max_workers) setting. Each setting runs in a fresh interpreter from a scratch working
+directory, so the listing cache starts cold, the log file stays out of the repo and peak RSS
+is per setting.
+
+Reports pages/s (search phase), listings/s (detail phase), p50/p95 request latency per
+phase, detail KB downloaded per listing, peak RSS, peak thread count and the connections the
+stub accepted.
+
+Engines:
+    requests   the default transport (HTTP/1.1, one connection per in-flight request)
+    http2      AUTOTRADER_HTTP_TRANSPORT=h2c: HTTP/2 multiplexed over a few connections (http_transport.py)
+
+Usage (from the repository root):
+    python -m autoscraper_py.benchmarks.scrape_bench [--engines requests,http2] [--workers 10,50,200]
+                                                     [--listings 1500] [--search-latency 0.05] [--detail-latency 0.05]
+                                                     [--connect-latency 0.1] [--detail-padding 200000]
+                                                     [--base-url http://host:port] [--output scrape.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from urllib.parse import urlparse
+
+from tabulate import tabulate
+
+from .stub_autotrader import add_stub_arguments, config_from_args, start_stub_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SEARCH_PARAMS = {"Make": "Toyota", "Model": "Corolla", "Address": "Kanata, ON", "Proximity": "-1", "Top": 15}
+
+_RUN_SNIPPET = "from autoscraper_py.benchmarks.scrape_bench import run_setting; run_setting({engine!r}, {workers})"
+_SAMPLE_INTERVAL = 0.05
+
+class RequestTimer:
+    """Collects per-request durations, split into the search and detail phases by URL."""
+
+    def __init__(self):
+        self.search = []
+        self.detail = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, url, seconds, ok=True):
+        with self._lock:
+            (self.search if "/Refinement/" in url else self.detail).append(seconds)
+            if not ok:
+                self.errors += 1
+
+def _install_requests_engine(timer):
+    """The current transport: requests sessions driven by thread pools. Times every Session.send."""
+    import requests
+    original_send = requests.Session.send
+
+    def timed_send(session, request, **kwargs):
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = original_send(session, request, **kwargs)
+            ok = response.status_code < 400
+            return response
+        finally:
+            timer.record(request.url, time.perf_counter() - start, ok)
+
+    requests.Session.send = timed_send
+
+def _install_http2_engine(timer):
+    """HTTP/2 with prior knowledge (the stub serves h2c). The adapter runs under Session.send, so timing is the same."""
+    os.environ["AUTOTRADER_HTTP_TRANSPORT"] = "h2c" # Read when http_transport is imported, i.e. after this
+    _install_requests_engine(timer)
+
+# Engine name -> function installing it (and its request timing) in the benchmark interpreter
+ENGINES = {
+    "requests": _install_requests_engine,
+    "http2": _install_http2_engine,
+}
+
+class _ResourceSampler(threading.Thread):
+    """Samples the thread count while a setting runs; RSS peak comes from the OS afterwards."""
+
+    def __init__(self):
+        super().__init__(name="bench-sampler", daemon=True)
+        self.peak_threads = threading.active_count()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(_SAMPLE_INTERVAL):
+            self.peak_threads = max(self.peak_threads, threading.active_count() - 1) # Minus the sampler
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where it can't be read (e.g. Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # Bytes on macOS, KB on Linux
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+def _ms(seconds):
+    return seconds * 1000 if seconds is not None else None
+
+class _NoProgress:
+    """Stands in for the Celery task so the scraper doesn't clear the console on every update."""
+
+    def update_progress(self, current, total, step=""):
+        pass
+
+def _detail_bytes():
+    """Detail page bytes this process downloaded, as counted by the scraper's metrics."""
+    from prometheus_client import REGISTRY
+    return REGISTRY.get_sample_value("autoscraper_http_response_bytes_total", {"endpoint": "detail"}) or 0
+
+def run_setting(engine, workers):
+    """
+    Runs one scrape against AUTOTRADER_BASE_URL and prints its measurements as JSON (last line).
+    Called in a fresh interpreter by main(); expects a scratch working directory.
+    """
+    timer = RequestTimer()
+    ENGINES[engine](timer)
+    from autoscraper_py.AutoScraper import fetch_autotrader_data, process_links_and_update_cache
+
+    sampler = _ResourceSampler()
+    sampler.start()
+    start = time.perf_counter()
+    links = fetch_autotrader_data(dict(SEARCH_PARAMS), max_workers=workers, task_instance=_NoProgress())
+    search_done = time.perf_counter()
+    rows = process_links_and_update_cache(links, [], max_workers=workers, task_instance=_NoProgress())
+    detail_done = time.perf_counter()
+    sampler.stop()
+
+    search_s, detail_s = search_done - start, detail_done - search_done
+    pages = len(timer.search)
+    result = {
+        "engine": engine,
+        "workers": workers,
+        "pages": pages,
+        "links": len(links),
+        "listings": len(rows),
+        "errors": timer.errors,
+        "search_s": search_s,
+        "detail_s": detail_s,
+        "total_s": detail_done - start,
+        "pages_per_s": pages / search_s if search_s else None,
+        "listings_per_s": len(rows) / detail_s if detail_s else None,
+        "search_p50_ms": _ms(_percentile(timer.search, 50)),
+        "search_p95_ms": _ms(_percentile(timer.search, 95)),
+        "detail_p50_ms": _ms(_percentile(timer.detail, 50)),
+        "detail_p95_ms": _ms(_percentile(timer.detail, 95)),
+        "detail_kb_per_listing": _detail_bytes() / 1024 / len(rows) if rows else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_threads": sampler.peak_threads,
+    }
+    print(json.dumps(result))
+    return result
+
+def measure_setting(engine, workers, base_url, server=None):
+    """
+    Runs run_setting in a fresh interpreter from a scratch directory and returns its result dict.
+    With the stub server passed in, the result also has the number of connections it accepted.
+    """
+    connections_before = server.connections if server else None
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        with open(os.path.join(scratch_dir, "proxyconfig.json"), "w", encoding="utf-8") as f:
+            json.dump({}, f) # No proxy: talk to the stub directly
+        host = urlparse(base_url).hostname
+        env = {
+            **os.environ,
+            "PYTHONPATH": REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+            "AUTOTRADER_BASE_URL": base_url,
+            # Cold listing cache: the scratch CSV, and no shared Redis tier (nothing listens on port 1)
+            "AUTOSCRAPER_LISTING_CACHE_FILE": os.path.join(scratch_dir, "autoscraper_cache.csv"),
+            "REDIS_URL": "redis://127.0.0.1:1/0",
+            "NO_PROXY": ",".join(filter(None, [host, os.environ.get("NO_PROXY")])),
+            "no_proxy": ",".join(filter(None, [host, os.environ.get("no_proxy")])),
+        }
+        proc = subprocess.run([sys.executable, "-c", _RUN_SNIPPET.format(engine=engine, workers=workers)],
+                              cwd=scratch_dir, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Benchmark run ({engine}, {workers} workers) failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["connections"] = server.connections - connections_before if server else None
+    return result
+
+def _fmt(value, digits=1):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure end-to-end scrape throughput against the local stub site.")
+    parser.add_argument("--engines", default=",".join(ENGINES), help=f"Comma-separated engines (available: {', '.join(ENGINES)})")
+    parser.add_argument("--workers", default="10,50,200", help="Comma-separated max_workers settings (default: 10,50,200)")
+    parser.add_argument("--base-url", help="Use an already running stub (or other server) instead of starting one")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    add_stub_arguments(parser)
+    args = parser.parse_args(argv)
+
+    engines = [name.strip() for name in args.engines.split(",") if name.strip()]
+    unknown = [name for name in engines if name not in ENGINES]
+    if unknown:
+        parser.error(f"Unknown engine(s): {', '.join(unknown)}")
+    worker_settings = [int(value) for value in args.workers.split(",") if value.strip()]
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server = start_stub_server(config_from_args(args))
+        base_url = server.base_url
+    stub = {"base_url": base_url, "listings": args.listings, "pages": args.pages,
+            "search_latency_s": args.search_latency, "detail_latency_s": args.detail_latency, "jitter": args.jitter,
+            "connect_latency_s": args.connect_latency, "detail_padding": args.detail_padding}
+    results = {"python": sys.version.split()[0], "stub": stub, "runs": []}
+    try:
+        for engine in engines:
+            for workers in worker_settings:
+                results["runs"].append(measure_setting(engine, workers, base_url, server))
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+
+    rows = [[r["engine"], r["workers"], r["pages"], r["listings"], r["errors"],
+             _fmt(r["pages_per_s"]), _fmt(r["listings_per_s"]),
+             f"{_fmt(r['search_p50_ms'], 0)} / {_fmt(r['search_p95_ms'], 0)}",
+             f"{_fmt(r['detail_p50_ms'], 0)} / {_fmt(r['detail_p95_ms'], 0)}", _fmt(r["detail_kb_per_listing"]),
+             _fmt(r["peak_rss_mb"]), r["peak_threads"], "-" if r["connections"] is None else r["connections"]]
+            for r in results["runs"]]
+    print(tabulate(rows, headers=["Engine", "Workers", "Pages", "Listings", "Errors", "Pages/s", "Listings/s",
+                                  "Search p50/p95 (ms)", "Detail p50/p95 (ms)", "Detail KB/listing", "Peak RSS (MB)", "Peak threads", "Connections"]))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Startup-time benchmark: import time of the web app, the Celery task module and the scraper.
+
+Each import is measured in a fresh interpreter (so nothing is already in sys.modules),
+from a scratch working directory (so import-time side effects like log files stay out of the repo).
+
+Usage (from the repository root):
+    python -m autoscraper_py.benchmarks.startup_bench [--runs 5] [--top 10] [--output startup.json]
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from tabulate import tabulate
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODULES = {
+    "app": "autoscraper_py.app",
+    "tasks": "autoscraper_py.tasks",
+    "AutoScraper": "autoscraper_py.AutoScraper",
+}
+
+_IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(.+)$")
+
+def _run_python(args, cwd):
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True)
+
+def measure_import(module, runs, cwd):
+    """Returns the list of import durations (seconds) over `runs` fresh interpreters."""
+    timings = []
+    for _ in range(runs):
+        proc = _run_python(["-c", _IMPORT_SNIPPET.format(module=module)], cwd)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+        timings.append(float(proc.stdout.strip().splitlines()[-1]))
+    return timings
+
+def slowest_imports(module, top, cwd):
+    """Uses `python -X importtime` to list the submodules with the largest cumulative import time."""
+    proc = _run_python(["-X", "importtime", "-c", f"import {module}"], cwd)
+    entries = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_RE.search(line)
+        if match:
+            self_us, cumulative_us, name = match.groups()
+            entries.append((int(cumulative_us), int(self_us), name.strip()))
+    entries.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": cum / 1000, "self_ms": self_ / 1000} for cum, self_, name in entries[:top]]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of the app, tasks and AutoScraper modules.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module (default: 5)")
+    parser.add_argument("--top", type=int, default=0, help="Also list the N slowest submodule imports per module")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = {"python": sys.version.split()[0], "runs": args.runs, "modules": {}}
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        for label, module in MODULES.items():
+            timings = measure_import(module, args.runs, scratch_dir)
+            results["modules"][label] = {
+                "module": module,
+                "min_s": min(timings),
+                "median_s": statistics.median(timings),
+                "max_s": max(timings),
+                "timings_s": timings,
+            }
+            if args.top:
+                results["modules"][label]["slowest_imports"] = slowest_imports(module, args.top, scratch_dir)
+
+    rows = [[label, r["module"], f"{r['min_s']:.3f}", f"{r['median_s']:.3f}", f"{r['max_s']:.3f}"]
+            for label, r in results["modules"].items()]
+    print(tabulate(rows, headers=["Name", "Module", "Min (s)", "Median (s)", "Max (s)"]))
+    for label, r in results["modules"].items():
+        if r.get("slowest_imports"):
+            print(f"\nSlowest imports for {label}:")
+            print(tabulate([[e["module"], f"{e['cumulative_ms']:.1f}", f"{e['self_ms']:.1f}"] for e in r["slowest_imports"]],
+                           headers=["Module", "Cumulative (ms)", "Self (ms)"]))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+Local stand-in for the parts of autotrader.ca the scraper talks to, for benchmarks and
+end-to-end runs that must not hit the live site.
+
+Endpoints:
+    POST /Refinement/Search   -> {"SearchResultsDataJson": "...", "AdsHtml": "..."} honouring Skip/Top
+    GET  /a/<make>/<model>/<city>/<province>/<ad id>/   -> detail page with the embedded vehicle JSON
+    POST /Refinement/Refine, /Home/Refine   -> Models / Trims / ExteriorColour counts
+    GET  /                    -> home page with the make <optgroup>s
+
+Listings are generated deterministically from their index, so every run sees the same data.
+Point the scraper at the stub with AUTOTRADER_BASE_URL (read when AutoScraperUtil is imported).
+The same port also serves HTTP/2 with prior knowledge (h2c, needs the h2 package), and the server
+counts the connections it accepts, so transports can be compared on sockets as well as speed.
+
+Usage (from the repository root):
+    python -m autoscraper_py.benchmarks.stub_autotrader [--port 8765] [--listings 1500] [--pages N]
+                                                        [--search-latency 0.05] [--detail-latency 0.05] [--connect-latency 0.1]
+                                                        [--detail-padding 200000]
+"""
+import re
+import json
+import math
+import time
+import random
+import socket
+import sys
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAKES = [
+    ("Toyota", ["Corolla", "Camry", "RAV4"]),
+    ("Honda", ["Civic", "Accord", "CR-V"]),
+    ("Ford", ["F-150", "Escape", "Mustang"]),
+    ("Mazda", ["Mazda3", "CX-5"]),
+]
+TRIMS = ["Base", "Sport", "Touring", "Limited"]
+COLOURS = ["Black", "White", "Silver", "Blue", "Red"]
+DRIVETRAINS = ["FWD", "AWD", "4x4"]
+CITIES = [("ottawa", "on"), ("kanata", "on"), ("gatineau", "qc"), ("kingston", "on")]
+
+_DETAIL_RE = re.compile(r"^/a/[^/]+/[^/]+/[^/]+/[^/]+/19_(\d+)/?$")
+_AD_ID_OFFSET = 10000000
+_H2_PREFACE = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+H2_MAX_CONCURRENT_STREAMS = 100 # What CDNs typically advertise; clients open more connections beyond it
+
+class StubConfig:
+    """
+    Size and speed of the simulated site.
+
+    Args:
+        listings (int): Total listings the search returns.
+        pages (int, optional): maxPage reported to the client. Defaults to ceil(listings / Top).
+        search_latency (float): Seconds each search request takes.
+        detail_latency (float): Seconds each detail page takes.
+        connect_latency (float): Seconds added once per new connection, standing in for the TLS and
+            proxy handshakes a local plain-http server doesn't have.
+        detail_padding (int): Bytes of markup after the vehicle JSON on detail pages (the rest of
+            a real listing page: related listings, footer, scripts).
+        jitter (float): Latencies vary uniformly by +/- this fraction.
+        seed (int): Seed for the jitter.
+    """
+
+    def __init__(self, listings=1500, pages=None, search_latency=0.05, detail_latency=0.05, jitter=0.0, seed=0,
+                 connect_latency=0.0, detail_padding=0):
+        self.listings = listings
+        self.pages = pages
+        self.search_latency = search_latency
+        self.detail_latency = detail_latency
+        self.connect_latency = connect_latency
+        self.detail_padding = detail_padding
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def delay(self, base):
+        if base <= 0:
+            return
+        if self.jitter:
+            with self._random_lock:
+                base *= 1 + self._random.uniform(-self.jitter, self.jitter)
+        time.sleep(base)
+
+def listing(index):
+    """The generated listing with the given index (0-based)."""
+    make, models = MAKES[index % len(MAKES)]
+    model = models[(index // len(MAKES)) % len(models)]
+    city, province = CITIES[index % len(CITIES)]
+    return {
+        "ad_id": f"19_{_AD_ID_OFFSET + index}",
+        "make": make,
+        "model": model,
+        "year": 2010 + index % 15,
+        "trim": TRIMS[index % len(TRIMS)],
+        "price": 8000 + (index * 137) % 42000,
+        "km": 5000 + (index * 7919) % 240000,
+        "colour": COLOURS[index % len(COLOURS)],
+        "drivetrain": DRIVETRAINS[index % len(DRIVETRAINS)],
+        "city": city,
+        "province": province,
+    }
+
+def listing_path(item):
+    return f"/a/{item['make'].lower()}/{item['model'].lower()}/{item['city']}/{item['province']}/{item['ad_id']}/"
+
+def search_response(config, skip, top):
+    """Body of a Refinement/Search response for the page starting at listing `skip`."""
+    top = max(int(top or 15), 1)
+    max_page = config.pages or max(math.ceil(config.listings / top), 1)
+    ads = []
+    for index in range(max(int(skip or 0), 0), min(int(skip or 0) + top, config.listings)):
+        item = listing(index)
+        ads.append(
+            '<div class="result-item">'
+            f'<a class="inner-link" href="{listing_path(item)}">'
+            f'<span class="title-with-trim">{item["year"]} {item["make"]} {item["model"]} {item["trim"]}</span></a>'
+            f'<span class="price-amount">${item["price"]:,}</span>'
+            f'<span class="odometer-proximity">{item["km"]:,} km</span>'
+            f'<span class="proximity-text">{item["city"].title()}, {item["province"].upper()}</span>'
+            '</div>'
+        )
+    search_data = {"maxPage": max_page, "totalResultCount": config.listings}
+    return {"SearchResultsDataJson": json.dumps(search_data), "AdsHtml": "".join(ads)}
+
+def detail_page(item, padding=0):
+    """HTML detail page embedding the vehicle JSON the way extract_vehicle_info expects it, then padding bytes of markup."""
+    model = {
+        "HeroViewModel": {
+            "Make": item["make"],
+            "Model": item["model"],
+            "Trim": item["trim"],
+            "Price": str(item["price"]),
+            "mileage": f"{item['km']:,} km",
+            "drivetrain": item["drivetrain"],
+            "Year": str(item["year"]),
+        },
+        "Specifications": {
+            "Specs": [
+                {"Key": "Kilometres", "Value": f"{item['km']:,} km"},
+                {"Key": "Status", "Value": "Used"},
+                {"Key": "Trim", "Value": item["trim"]},
+                {"Key": "Body Type", "Value": "Sedan"},
+                {"Key": "Engine", "Value": "2.0L 4cyl"},
+                {"Key": "Cylinder", "Value": "4"},
+                {"Key": "Transmission", "Value": "Automatic"},
+                {"Key": "Drivetrain", "Value": item["drivetrain"]},
+                {"Key": "Exterior Colour", "Value": item["colour"]},
+                {"Key": "Doors", "Value": "4"},
+                {"Key": "Fuel Type", "Value": "Gasoline"},
+                {"Key": "City Fuel Economy", "Value": "8.1L/100km"},
+                {"Key": "Hwy Fuel Economy", "Value": "6.2L/100km"},
+            ]
+        },
+    }
+    return (f"<!DOCTYPE html><html><head><title>{item['year']} {item['make']} {item['model']}</title></head>"
+            f"<body><script>window['ngVdpModel'] = {json.dumps(model)};</script>"
+            f"{_padding_markup(padding)}</body></html>")
+
+def _padding_markup(size):
+    """size bytes of filler markup, brace-free so that parse_html_content_to_json still reads the whole page."""
+    block = '<div class="related-listing"><a href="/a/">Similar vehicles near you</a></div>\n'
+    return (block * (size // len(block) + 1))[:size]
+
+def refine_response(payload):
+    """Body of a Refinement/Refine or Home/Refine response (counts per model, trim and colour)."""
+    make = payload.get("Make")
+    models = next((names for name, names in MAKES if name == make), [])
+    return {
+        "Models": {model: 10 for model in models},
+        "Trims": {"Status": 0, **{trim: 5 for trim in TRIMS}},
+        "ExteriorColour": {"Status": 0, **{colour: 3 for colour in COLOURS}},
+    }
+
+def home_page():
+    options = "".join(f"<option value=\"{name}\">{name}</option>" for name, _ in MAKES)
+    return (f"<html><body><select><optgroup label=\"Popular Makes\">{options}</optgroup>"
+            f"<optgroup label=\"All Makes\">{options}</optgroup></select></body></html>")
+
+def route(config, method, path, body):
+    """
+    Response to one request, for either protocol.
+
+    Returns:
+        tuple: (status, content type, body text, latency in seconds to simulate)
+    """
+    path = path.split("?")[0]
+    if method == "POST":
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            payload = {}
+        if path == "/Refinement/Search":
+            return 200, "application/json", json.dumps(search_response(config, payload.get("Skip"), payload.get("Top"))), config.search_latency
+        if path in ("/Refinement/Refine", "/Home/Refine"):
+            return 200, "application/json", json.dumps(refine_response(payload)), config.search_latency
+        return 404, "application/json", "{}", 0
+    match = _DETAIL_RE.match(path)
+    if match and int(match.group(1)) - _AD_ID_OFFSET < config.listings:
+        return 200, "text/html", detail_page(listing(int(match.group(1)) - _AD_ID_OFFSET), config.detail_padding), config.detail_latency
+    if path == "/":
+        return 200, "text/html", home_page(), 0
+    return 404, "text/html", "Not found", 0
+
+class _H2Connection:
+    """Serves one HTTP/2 connection; every stream is answered on its own thread, like HTTP/1.1 requests are."""
+
+    def __init__(self, sock, config):
+        import h2.config
+        import h2.connection
+        self.sock = sock
+        self.config = config
+        self.conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding="utf-8"))
+        self.lock = threading.Condition() # Guards conn and the socket's write side; notified on window updates
+        self.requests = {}
+
+    def serve(self):
+        import h2.events
+        import h2.settings
+        with self.lock:
+            self.conn.local_settings = h2.settings.Settings(
+                client=False, initial_values={h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: H2_MAX_CONCURRENT_STREAMS})
+            self.conn.initiate_connection()
+            self._flush()
+        while True:
+            try:
+                data = self.sock.recv(65535)
+            except OSError:
+                return
+            if not data:
+                return
+            with self.lock:
+                for event in self.conn.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        self.requests[event.stream_id] = (dict(event.headers), bytearray())
+                    elif isinstance(event, h2.events.DataReceived):
+                        self.requests[event.stream_id][1].extend(event.data)
+                        self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2.events.StreamEnded):
+                        headers, body = self.requests.pop(event.stream_id)
+                        threading.Thread(target=self._respond, args=(event.stream_id, headers, bytes(body)), daemon=True).start()
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        self._flush()
+                        return
+                self._flush()
+                self.lock.notify_all()
+
+    def _respond(self, stream_id, headers, body):
+        import h2.exceptions
+        status, content_type, text, latency = route(self.config, headers[":method"], headers[":path"], body)
+        self.config.delay(latency)
+        data = text.encode("utf-8")
+        with self.lock:
+            try:
+                self.conn.send_headers(stream_id, [(":status", str(status)), ("content-type", content_type),
+                                                   ("content-length", str(len(data)))], end_stream=not data)
+                while data:
+                    size = min(self.conn.local_flow_control_window(stream_id), self.conn.max_outbound_frame_size)
+                    if size <= 0:
+                        self._flush() # The client only opens the window once it has the data sent so far
+                        self.lock.wait() # For the client's WINDOW_UPDATE
+                        continue
+                    chunk, data = data[:size], data[size:]
+                    self.conn.send_data(stream_id, chunk, end_stream=not data)
+                self._flush()
+            except (h2.exceptions.StreamClosedError, h2.exceptions.ProtocolError, OSError):
+                pass # Client reset the stream or went away
+
+    def _flush(self):
+        self.sock.sendall(self.conn.data_to_send())
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, like the real site; the scraper reuses pooled connections
+
+    def log_message(self, format, *args):
+        pass # One line per request would dominate a benchmark's output
+
+    def handle(self):
+        self.server.config.delay(self.server.config.connect_latency)
+        if self._starts_with_h2_preface():
+            _H2Connection(self.connection, self.server.config).serve()
+        else:
+            super().handle()
+
+    def _starts_with_h2_preface(self):
+        """Peeks at the first bytes: an HTTP/2 client opens with the connection preface."""
+        while True:
+            try:
+                data = self.connection.recv(len(_H2_PREFACE), socket.MSG_PEEK)
+            except OSError:
+                return False
+            if not data or not _H2_PREFACE.startswith(data):
+                return False
+            if len(data) == len(_H2_PREFACE):
+                return True
+            time.sleep(0.001) # Only part of the preface has arrived
+
+    def _send(self, status, body, content_type):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _respond(self, method):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)) if method == "POST" else b""
+        status, content_type, text, latency = route(self.server.config, method, self.path, body)
+        self.server.config.delay(latency)
+        self._send(status, text, content_type)
+
+    def do_POST(self):
+        self._respond("POST")
+
+    def do_GET(self):
+        self._respond("GET")
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 # Benchmarks open hundreds of connections at once
+
+    def __init__(self, address, config):
+        super().__init__(address, StubHandler)
+        self.config = config
+        self.connections = 0 # Accepted so far, HTTP/1.1 and HTTP/2
+        self._connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._connections_lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return # The client stopped reading, e.g. the scraper closing a detail page after its JSON
+        super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+def start_stub_server(config=None, host="127.0.0.1", port=0):
+    """
+    Starts the stub in a background thread.
+
+    Args:
+        config (StubConfig, optional): Defaults to StubConfig().
+        host (str): Interface to bind.
+        port (int): Port to bind; 0 picks a free one.
+
+    Returns:
+        StubServer: Running server; use .base_url as AUTOTRADER_BASE_URL and .shutdown() to stop it.
+    """
+    server = StubServer((host, port), config or StubConfig())
+    threading.Thread(target=server.serve_forever, name="stub-autotrader", daemon=True).start()
+    return server
+
+def add_stub_arguments(parser):
+    """Adds the StubConfig options to an argparse parser (shared with the benchmark runner)."""
+    parser.add_argument("--listings", type=int, default=1500, help="Total listings the search returns (default: 1500)")
+    parser.add_argument("--pages", type=int, help="maxPage reported to the client (default: listings / Top)")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Seconds per search request (default: 0.05)")
+    parser.add_argument("--detail-latency", type=float, default=0.05, help="Seconds per detail page (default: 0.05)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Vary latencies by +/- this fraction (default: 0)")
+    parser.add_argument("--connect-latency", type=float, default=0.0,
+                        help="Seconds per new connection, like a TLS/proxy handshake (default: 0)")
+    parser.add_argument("--detail-padding", type=int, default=0,
+                        help="Bytes of markup after the vehicle JSON on detail pages (default: 0)")
+
+def config_from_args(args):
+    return StubConfig(listings=args.listings, pages=args.pages, search_latency=args.search_latency,
+                      detail_latency=args.detail_latency, jitter=args.jitter, connect_latency=args.connect_latency,
+                      detail_padding=args.detail_padding)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the AutoTrader search and detail pages.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_stub_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = StubServer((args.host, args.port), config_from_args(args))
+    print(f"Stub AutoTrader listening on {server.base_url} (set AUTOTRADER_BASE_URL={server.base_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Listing cache maintenance: evicts listings that searches no longer see and caps the cache size.
+
+Eviction policy, per tier:
+    1. Listings not seen for LISTING_CACHE_MAX_AGE_DAYS are removed (mostly sold or delisted cars).
+    2. If the cache is still over LISTING_CACHE_MAX_ROWS rows or LISTING_CACHE_MAX_BYTES bytes, the
+       least recently seen listings are removed until it fits.
+"Seen" is the last time a search wrote or read the listing (the Redis sorted set
+REDIS_SEEN_KEY). The CSV fallback has no access log, so it goes by date_cached (the last fetch);
+it is also compacted, dropping the superseded rows that appends leave behind.
+
+Runs daily from Celery beat (tasks.maintain_listing_cache_task), or by hand:
+    python -m autoscraper_py.cache_maintenance [--max-rows 300000] [--max-bytes 0] [--max-age-days 30]
+"""
+import os
+import csv
+import json
+import time
+import logging
+import argparse
+import datetime
+
+from .redis_client import get_redis_client, reset_redis_client
+from .listing_cache import (CACHE_FILE, CACHE_HEADERS, REDIS_HASH_KEY, REDIS_SEEN_KEY, REDIS_BATCH_SIZE,
+                            CompactRows, cache_file_lock)
+
+MAX_ROWS = int(os.environ.get("LISTING_CACHE_MAX_ROWS", "300000")) # 0: no row cap
+MAX_BYTES = int(os.environ.get("LISTING_CACHE_MAX_BYTES", "0")) # 0: no size cap
+MAX_AGE_DAYS = int(os.environ.get("LISTING_CACHE_MAX_AGE_DAYS", "30")) # 0: keep unseen listings
+
+logger = logging.getLogger("AutoScraper")
+
+def rows_allowed(rows, size, max_rows, max_bytes):
+    """How many of rows (taking size bytes in total) fit under the caps; a cap of 0 is no cap."""
+    allowed = rows
+    if max_rows:
+        allowed = min(allowed, max_rows)
+    if max_bytes and size and rows:
+        allowed = min(allowed, int(max_bytes * rows / size)) # Rows are assumed to be of average size
+    return allowed
+
+def _date_timestamp(date_cached, default):
+    try:
+        return time.mktime(datetime.date.fromisoformat(date_cached).timetuple())
+    except (TypeError, ValueError):
+        return default
+
+def _redis_bytes(client):
+    try:
+        return sum(client.memory_usage(key, samples=0) or 0 for key in (REDIS_HASH_KEY, REDIS_SEEN_KEY))
+    except Exception as e: # MEMORY USAGE may be disabled on managed Redis
+        logger.warning(f"Could not measure listing cache memory: {e}")
+        return None
+
+def _redis_delete(client, links):
+    removed = 0
+    for start in range(0, len(links), REDIS_BATCH_SIZE):
+        batch = links[start:start + REDIS_BATCH_SIZE]
+        pipe = client.pipeline(transaction=False)
+        pipe.hdel(REDIS_HASH_KEY, *batch)
+        pipe.zrem(REDIS_SEEN_KEY, *batch)
+        removed += pipe.execute()[0]
+    return removed
+
+def maintain_redis_tier(client, max_rows=MAX_ROWS, max_bytes=MAX_BYTES, max_age_days=MAX_AGE_DAYS):
+    """
+    Evicts from the shared Redis tier.
+
+    Returns:
+        dict: {'tier', 'rows_before', 'rows_after', 'evicted_unseen', 'evicted_over_cap',
+               'bytes_before', 'bytes_after', 'reclaimed_bytes'} (bytes are None if unmeasurable)
+    """
+    now = time.time()
+    rows_before = client.hlen(REDIS_HASH_KEY)
+    bytes_before = _redis_bytes(client)
+
+    # Listings cached before last-seen tracking count as seen when they were fetched
+    if client.zcard(REDIS_SEEN_KEY) < rows_before:
+        cursor = 0
+        while True:
+            cursor, fields = client.hscan(REDIS_HASH_KEY, cursor, count=REDIS_BATCH_SIZE)
+            if fields:
+                client.zadd(REDIS_SEEN_KEY, {link: _date_timestamp(json.loads(value).get("date_cached"), now)
+                                             for link, value in fields.items()}, nx=True)
+            if cursor == 0:
+                break
+
+    evicted_unseen = 0
+    if max_age_days:
+        evicted_unseen = _redis_delete(client, client.zrangebyscore(REDIS_SEEN_KEY, "-inf", now - max_age_days * 86400))
+
+    rows = client.hlen(REDIS_HASH_KEY)
+    allowed = rows_allowed(rows, _redis_bytes(client) if max_bytes else None, max_rows, max_bytes)
+    evicted_over_cap = _redis_delete(client, client.zrange(REDIS_SEEN_KEY, 0, rows - allowed - 1)) if rows > allowed else 0
+
+    bytes_after = _redis_bytes(client)
+    return {
+        'tier': 'redis',
+        'rows_before': rows_before,
+        'rows_after': client.hlen(REDIS_HASH_KEY),
+        'evicted_unseen': evicted_unseen,
+        'evicted_over_cap': evicted_over_cap,
+        'bytes_before': bytes_before,
+        'bytes_after': bytes_after,
+        'reclaimed_bytes': bytes_before - bytes_after if bytes_before is not None and bytes_after is not None else None,
+    }
+
+def maintain_csv_tier(filepath=CACHE_FILE, max_rows=MAX_ROWS, max_bytes=MAX_BYTES, max_age_days=MAX_AGE_DAYS):
+    """
+    Compacts and evicts the CSV fallback file, rewriting it in place. Rows appended by running
+    scrapes while it works are carried over to the new file: the tail copy and the swap happen under
+    cache_file_lock, which appenders also hold, so nothing can be appended in between.
+
+    Returns:
+        dict: As maintain_redis_tier, plus 'superseded_rows' (older duplicates dropped by compaction),
+              or None if there is no file or it couldn't be replaced (the lock stayed busy, or on
+              Windows a reader has the file open; the next run tries again).
+    """
+    try:
+        bytes_before = os.path.getsize(filepath)
+    except FileNotFoundError:
+        return None
+    rows = CompactRows() # Last row per link, in file order
+    lines = 0
+    with open(filepath, mode='r', newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            lines += 1
+            if row.get("Link"):
+                rows.put(row)
+    rows_before = len(rows)
+
+    dates = {link: rows.get(link, touch=False).get("date_cached") or "" for link in rows.links()}
+    evicted_unseen = 0
+    if max_age_days:
+        cutoff = (datetime.date.today() - datetime.timedelta(days=max_age_days)).isoformat()
+        for link, date_cached in list(dates.items()):
+            if date_cached < cutoff:
+                rows.pop(link)
+                del dates[link]
+                evicted_unseen += 1
+    allowed = rows_allowed(len(dates), bytes_before * len(dates) / lines if lines else 0, max_rows, max_bytes)
+    evicted_over_cap = len(dates) - allowed
+    for link in sorted(dates, key=dates.get)[:evicted_over_cap]:
+        rows.pop(link)
+
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=CACHE_HEADERS)
+        writer.writeheader()
+        writer.writerows(rows.get(link, touch=False) for link in rows.links())
+    try:
+        with cache_file_lock(filepath):
+            with open(filepath, mode='rb') as source, open(tmp_path, mode='ab') as target:
+                source.seek(bytes_before)
+                target.write(source.read()) # Appended since we started; a duplicate row is harmless
+            os.replace(tmp_path, filepath)
+            bytes_after = os.path.getsize(filepath)
+    except (PermissionError, TimeoutError) as e:
+        logger.warning(f"Could not replace cache file '{filepath}', leaving it as it is: {e}")
+        os.remove(tmp_path)
+        return None
+    return {
+        'tier': 'csv',
+        'rows_before': rows_before,
+        'rows_after': len(rows),
+        'superseded_rows': lines - rows_before,
+        'evicted_unseen': evicted_unseen,
+        'evicted_over_cap': evicted_over_cap,
+        'bytes_before': bytes_before,
+        'bytes_after': bytes_after,
+        'reclaimed_bytes': bytes_before - bytes_after,
+    }
+
+def _fmt_bytes(size):
+    return "-" if size is None else f"{size / (1024 * 1024):.2f} MB"
+
+def maintain_listing_cache(max_rows=MAX_ROWS, max_bytes=MAX_BYTES, max_age_days=MAX_AGE_DAYS, filepath=CACHE_FILE):
+    """
+    Maintains both tiers: Redis when reachable, and the CSV file if one exists (it collects rows
+    while Redis is down).
+
+    Returns:
+        list: One report dict per tier maintained.
+    """
+    reports = []
+    client = get_redis_client()
+    if client is not None:
+        try:
+            reports.append(maintain_redis_tier(client, max_rows, max_bytes, max_age_days))
+        except Exception as e:
+            logger.error(f"Listing cache maintenance failed for Redis: {e}")
+            reset_redis_client()
+    try:
+        report = maintain_csv_tier(filepath, max_rows, max_bytes, max_age_days)
+        if report:
+            reports.append(report)
+    except Exception as e:
+        logger.error(f"Listing cache maintenance failed for '{filepath}': {e}")
+    for report in reports:
+        logger.info(f"Listing cache maintenance ({report['tier']}): {report['rows_before']} -> {report['rows_after']} rows, "
+                    f"{report['evicted_unseen']} unseen and {report['evicted_over_cap']} over the cap evicted, "
+                    f"{_fmt_bytes(report['reclaimed_bytes'])} reclaimed.")
+    return reports
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evict and compact the listing cache, and report reclaimed space.")
+    parser.add_argument("--max-rows", type=int, default=MAX_ROWS, help="Row cap (0: none)")
+    parser.add_argument("--max-bytes", type=int, default=MAX_BYTES, help="Size cap in bytes (0: none)")
+    parser.add_argument("--max-age-days", type=int, default=MAX_AGE_DAYS, help="Evict listings unseen this long (0: never)")
+    parser.add_argument("--file", default=CACHE_FILE, help="CSV fallback file")
+    args = parser.parse_args(argv)
+
+    reports = maintain_listing_cache(args.max_rows, args.max_bytes, args.max_age_days, args.file)
+    if not reports:
+        print("Nothing to maintain: Redis is unreachable and there is no cache file.")
+    for report in reports:
+        print(f"{report['tier']}: {report['rows_before']} -> {report['rows_after']} rows "
+              f"({report['evicted_unseen']} unseen, {report['evicted_over_cap']} over cap"
+              + (f", {report['superseded_rows']} superseded" if 'superseded_rows' in report else "")
+              + f"), {_fmt_bytes(report['bytes_before'])} -> {_fmt_bytes(report['bytes_after'])}, "
+              f"reclaimed {_fmt_bytes(report['reclaimed_bytes'])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import logging
+
+from .AutoScraper import fetch_autotrader_data, process_links_and_update_cache
+from .AutoScraperUtil import payload_key, PAYLOAD_NON_SEARCH_FIELDS
+from .proxy_pool import get_proxy_pool
+from .redis_client import get_redis_client, reset_redis_client
+
+# Off-peak cache warming (tasks.warm_listing_cache_task, nightly from beat): the most popular
+# searches are crawled ahead of the day so daytime searches for them are mostly listing cache hits.
+# Popularity is the number of saved payloads for a search (payload_key) plus a decayed count of
+# launched searches (record_search), halved on every warming run.
+# The crawl is held to WARM_REQUESTS_PER_SECOND for every AutoTrader request of the worker process
+# (ProxyPool.rate_limit), stops starting searches after WARM_MAX_SECONDS, and fetches at most
+# WARM_MAX_LISTINGS_PER_SEARCH detail pages per search.
+WARM_TOP_N = int(os.environ.get("CACHE_WARM_TOP_N", "20"))
+WARM_REQUESTS_PER_SECOND = float(os.environ.get("CACHE_WARM_REQUESTS_PER_SECOND", "2"))
+WARM_MAX_SECONDS = int(os.environ.get("CACHE_WARM_MAX_SECONDS", str(3 * 3600)))
+WARM_MAX_LISTINGS_PER_SEARCH = int(os.environ.get("CACHE_WARM_MAX_LISTINGS_PER_SEARCH", "1000"))
+WARM_WORKERS = 4 # Concurrency only hides latency; the rate limit bounds the load
+SAVED_PAYLOAD_WEIGHT = 1.0 # Popularity of one saved payload, relative to one launched search
+
+SEARCH_FREQUENCY_KEY = "autoscraper:search_frequency" # payload_key -> decayed count of launched searches
+SEARCH_PAYLOADS_KEY = "autoscraper:search_frequency:payloads" # payload_key -> search payload (JSON)
+FREQUENCY_DECAY = 0.5 # Per warming run, so a launched search counts half as much a day later
+FREQUENCY_MIN_SCORE = 0.05 # Searches that decayed below this are forgotten
+FREQUENCY_MAX_SEARCHES = 1000
+
+def search_fields(payload):
+    """The payload without its non-search fields (exclusions, name, timestamps)."""
+    return {key: value for key, value in payload.items() if key not in PAYLOAD_NON_SEARCH_FIELDS}
+
+def record_search(payload):
+    """Counts a launched search towards the warming popularity stats (skipped without Redis)."""
+    client = get_redis_client()
+    if client is None:
+        return
+    key = payload_key(payload)
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.zincrby(SEARCH_FREQUENCY_KEY, 1, key)
+        pipe.hset(SEARCH_PAYLOADS_KEY, key, json.dumps(search_fields(payload)))
+        pipe.execute()
+    except Exception as e:
+        logging.warning(f"Could not record search frequency: {e}")
+        reset_redis_client()
+
+def recent_searches():
+    """
+    Reads the launched-search counts, then decays them for the next run and drops the searches
+    that decayed away.
+
+    Returns:
+        dict: payload_key -> (count, search payload)
+    """
+    client = get_redis_client()
+    if client is None:
+        return {}
+    try:
+        counts = dict(client.zrange(SEARCH_FREQUENCY_KEY, 0, -1, withscores=True))
+        payloads = client.hgetall(SEARCH_PAYLOADS_KEY)
+        kept = sorted((key for key, count in counts.items() if count * FREQUENCY_DECAY >= FREQUENCY_MIN_SCORE),
+                      key=counts.get, reverse=True)[:FREQUENCY_MAX_SEARCHES]
+        pipe = client.pipeline(transaction=False)
+        pipe.zunionstore(SEARCH_FREQUENCY_KEY, {SEARCH_FREQUENCY_KEY: FREQUENCY_DECAY})
+        forgotten = (set(counts) | set(payloads)) - set(kept)
+        if forgotten:
+            pipe.zrem(SEARCH_FREQUENCY_KEY, *forgotten)
+            pipe.hdel(SEARCH_PAYLOADS_KEY, *forgotten)
+        pipe.execute()
+    except Exception as e:
+        logging.warning(f"Could not read search frequency: {e}")
+        reset_redis_client()
+        return {}
+    return {key: (counts[key], json.loads(payloads[key])) for key in counts if key in payloads}
+
+def pick_warm_searches(saved_payloads, recent, top_n=WARM_TOP_N):
+    """
+    Ranks searches by popularity.
+
+    Args:
+        saved_payloads (list): [{'payload': {...}, ...}] as returned by get_all_saved_payloads.
+        recent (dict): payload_key -> (count, search payload), from recent_searches.
+        top_n (int): How many searches to return.
+
+    Returns:
+        list: [(payload_key, search payload, score)], most popular first.
+    """
+    scores = {key: count for key, (count, _) in recent.items()}
+    payloads = {key: payload for key, (_, payload) in recent.items()}
+    for saved in saved_payloads:
+        key = payload_key(saved['payload'])
+        scores[key] = scores.get(key, 0) + SAVED_PAYLOAD_WEIGHT
+        payloads.setdefault(key, search_fields(saved['payload']))
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top_n]
+    return [(key, payloads[key], scores[key]) for key in ranked]
+
+def warm_listing_cache(searches, task_instance=None, requests_per_second=WARM_REQUESTS_PER_SECOND,
+                       max_seconds=WARM_MAX_SECONDS, max_listings=WARM_MAX_LISTINGS_PER_SEARCH):
+    """
+    Crawls the search and detail pages of each search into the listing cache, under the rate budget.
+    Listings already cached today are not fetched again.
+
+    Args:
+        searches (list): [(payload_key, search payload, score)] from pick_warm_searches.
+        task_instance (ProgressTask, optional): Receives progress updates.
+
+    Returns:
+        dict: {'searches', 'warmed', 'listings', 'stopped_early', 'seconds'}
+    """
+    started = time.monotonic()
+    report = {'searches': len(searches), 'warmed': 0, 'listings': 0, 'stopped_early': False}
+    with get_proxy_pool().rate_limit(requests_per_second):
+        for key, payload, score in searches:
+            if time.monotonic() - started >= max_seconds:
+                report['stopped_early'] = True
+                break
+            try:
+                links = fetch_autotrader_data({**payload, 'Exclusions': []}, max_workers=WARM_WORKERS, task_instance=task_instance)
+                links = links[:max_listings] if isinstance(links, list) else []
+                process_links_and_update_cache(links, [], max_workers=WARM_WORKERS, task_instance=task_instance)
+            except Exception as e:
+                logging.error(f"Cache warming failed for search {key}: {e}")
+                continue
+            report['warmed'] += 1
+            report['listings'] += len(links)
+            logging.info(f"Warmed search {key} (score {score:.2f}): {len(links)} listings.")
+    report['seconds'] = round(time.monotonic() - started, 1)
+    return report
@@ -2,13 +2,22 @@ import firebase_admin
 from firebase_admin import credentials, firestore, auth
 import json
 import os
+import threading
+
+from .metrics import track_firestore
+
+_firebase_initialized = None # None until the first initialization attempt
+_firebase_init_lock = threading.Lock()
 
 # Initialize Firebase Admin SDK
 def initialize_firebase():
     """
     Initialize the Firebase Admin SDK with credentials from the firebase_credentials.json file.
     If running in production, the credentials may be stored as environment variables.
+    Safe to call more than once; returns True if the default app is already initialized.
     """
+    if firebase_admin._apps:
+        return True
     try:
         # First try to load from a credentials file
         if os.path.exists('firebase_credentials.json'):
@@ -32,6 +41,22 @@ def initialize_firebase():
         print(f"Error initializing Firebase: {e}")
         return False
 
+def ensure_firebase_initialized():
+    """
+    Initialize Firebase on first use instead of at import time, so the web app and
+    Celery workers start without waiting on credentials and client setup.
+
+    Returns:
+        bool: Whether Firebase is initialized. A failed attempt is not retried.
+    """
+    global _firebase_initialized
+    if _firebase_initialized is None:
+        with _firebase_init_lock:
+            if _firebase_initialized is None:
+                _firebase_initialized = initialize_firebase()
+                print(f"Firebase initialization: {'Successful' if _firebase_initialized else 'Failed'}")
+    return _firebase_initialized
+
 def get_firestore_db():
     """
     Get the Firestore database instance.
@@ -40,6 +65,8 @@ def get_firestore_db():
         firestore.Client: The Firestore database client
     """
     try:
+        if not ensure_firebase_initialized():
+            return None
         return firestore.client()
     except Exception as e:
         print(f"Error getting Firestore client: {e}")
@@ -59,6 +86,7 @@ def create_user(email, password, display_name=None):
         dict: User information including UID
     """
     try:
+        ensure_firebase_initialized()
         user = auth.create_user(
             email=email,
             password=password,
@@ -79,6 +107,7 @@ def verify_id_token(id_token):
         dict: The decoded token information
     """
     try:
+        ensure_firebase_initialized()
         decoded_token = auth.verify_id_token(id_token,clock_skew_seconds=3)
         return {'success': True, 'user': decoded_token}
     except Exception as e:
@@ -95,6 +124,7 @@ def get_user(uid):
         UserRecord: The user record
     """
     try:
+        ensure_firebase_initialized()
         return auth.get_user(uid)
     except Exception as e:
         print(f"Error retrieving user: {e}")
@@ -246,6 +276,54 @@ def delete_payload(user_id, payload_id):
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
+def get_auto_refresh_payloads():
+    """
+    Get every saved payload, across all users, that has opted in to scheduled refresh.
+    Uses a collection group query on 'payloads' (needs a single-field index on
+    auto_refresh with collection group scope).
+
+    Returns:
+        list: [{'user_id': ..., 'id': ..., 'payload': {...}}, ...]
+    """
+    try:
+        db = get_firestore_db()
+        if not db:
+            return []
+
+        docs = db.collection_group('payloads').where('auto_refresh', '==', True).stream()
+        result = []
+        for payload_doc in docs:
+            result.append({
+                'user_id': payload_doc.reference.parent.parent.id, # users/{uid}/payloads/{id}
+                'id': payload_doc.id,
+                'payload': payload_doc.to_dict()
+            })
+        return result
+    except Exception as e:
+        print(f"Error retrieving auto-refresh payloads: {e}")
+        return []
+
+def get_all_saved_payloads():
+    """
+    Get every saved payload across all users (collection group query on 'payloads').
+
+    Returns:
+        list: [{'user_id': ..., 'id': ..., 'payload': {...}}, ...]
+    """
+    try:
+        db = get_firestore_db()
+        if not db:
+            return []
+
+        return [{
+            'user_id': payload_doc.reference.parent.parent.id, # users/{uid}/payloads/{id}
+            'id': payload_doc.id,
+            'payload': payload_doc.to_dict()
+        } for payload_doc in db.collection_group('payloads').stream()]
+    except Exception as e:
+        print(f"Error retrieving saved payloads: {e}")
+        return []
+
 
 # --- User Settings Functions ---
 
@@ -414,7 +492,8 @@ def save_results(user_id, results_list, metadata):
             'result_count': len(results_list) # Store the count here
         }
         # Add the metadata document first to get its ID
-        update_time, main_doc_ref = main_results_coll_ref.add(metadata_doc)
+        with track_firestore("save_results_metadata"):
+            update_time, main_doc_ref = main_results_coll_ref.add(metadata_doc)
         main_doc_id = main_doc_ref.id
         print(f"Created metadata document: {main_doc_id}")
 
@@ -436,7 +515,8 @@ def save_results(user_id, results_list, metadata):
             # Commit the batch when it reaches the size limit
             if batch_count >= max_batch_size:
                 print(f"Committing batch {commit_count + 1} with {batch_count} listings...")
-                batch.commit()
+                with track_firestore("save_results_batch"):
+                    batch.commit()
                 print("Batch committed.")
                 commit_count += 1
                 # Start a new batch
@@ -446,7 +526,8 @@ def save_results(user_id, results_list, metadata):
         # Commit any remaining listings in the last batch
         if batch_count > 0:
             print(f"Committing final batch {commit_count + 1} with {batch_count} listings...")
-            batch.commit()
+            with track_firestore("save_results_batch"):
+                batch.commit()
             print("Final batch committed.")
 
         return {'success': True, 'doc_id': main_doc_id}
@@ -569,6 +650,8 @@ def delete_result(user_id, result_id):
         print(f"Deleting listings subcollection for result {result_id}...")
         _delete_collection(listings_coll_ref, batch_size=100) # Adjust batch size as needed
         print(f"Finished deleting listings subcollection.")
+        # Derived documents (cached stats etc.) live in the 'analytics' subcollection
+        _delete_collection(main_doc_ref.collection('analytics'), batch_size=100)
 
         # 2. Delete the main metadata document
         print(f"Deleting main result document {result_id}...")
@@ -580,4 +663,168 @@ def delete_result(user_id, result_id):
         print(f"Error deleting result {result_id}: {e}")
         return {'success': False, 'error': str(e)}
 
+def get_result_stats(user_id, result_id):
+    """
+    Get the cached market stats for a result.
+
+    Args:
+        user_id (str): The user's ID
+        result_id (str): The result document ID
+
+    Returns:
+        dict: The cached stats, or None if not cached yet.
+    """
+    try:
+        db = get_firestore_db()
+        if not db:
+            return None
+
+        stats_ref = db.collection('users').document(user_id).collection('results').document(result_id) \
+            .collection('analytics').document('stats')
+        stats_doc = stats_ref.get()
+        if not stats_doc.exists:
+            return None
+        return stats_doc.to_dict()
+    except Exception as e:
+        print(f"Error retrieving stats for result {result_id}: {e}")
+        return None
+
+def save_result_stats(user_id, result_id, stats):
+    """
+    Cache computed market stats alongside a result (in its 'analytics' subcollection,
+    so listing the user's results does not pull the stats payload).
+
+    Args:
+        user_id (str): The user's ID
+        result_id (str): The result document ID
+        stats (dict): Output of result_stats.compute_result_stats
+
+    Returns:
+        dict: Success status
+    """
+    try:
+        db = get_firestore_db()
+        if not db:
+            return {'success': False, 'error': 'Database connection failed'}
+
+        stats_ref = db.collection('users').document(user_id).collection('results').document(result_id) \
+            .collection('analytics').document('stats')
+        stats_ref.set({**stats, 'computed_at': firestore.SERVER_TIMESTAMP})
+        return {'success': True}
+    except Exception as e:
+        print(f"Error saving stats for result {result_id}: {e}")
+        return {'success': False, 'error': str(e)}
+
+def delete_result_stats(user_id, result_id):
+    """
+    Invalidate the cached market stats for a result (e.g. after a listing is removed).
+
+    Args:
+        user_id (str): The user's ID
+        result_id (str): The result document ID
+
+    Returns:
+        dict: Success status
+    """
+    try:
+        db = get_firestore_db()
+        if not db:
+            return {'success': False, 'error': 'Database connection failed'}
+
+        db.collection('users').document(user_id).collection('results').document(result_id) \
+            .collection('analytics').document('stats').delete()
+        return {'success': True}
+    except Exception as e:
+        print(f"Error deleting stats for result {result_id}: {e}")
+        return {'success': False, 'error': str(e)}
+
+def get_result_analytics(user_id, result_id, name):
+    """
+    Get a document from a result's 'analytics' subcollection (e.g. 'listing_index', 'diff').
+
+    Returns:
+        dict: The document data, or None if it doesn't exist.
+    """
+    try:
+        db = get_firestore_db()
+        if not db:
+            return None
+
+        doc = db.collection('users').document(user_id).collection('results').document(result_id) \
+            .collection('analytics').document(name).get()
+        return doc.to_dict() if doc.exists else None
+    except Exception as e:
+        print(f"Error retrieving {name} for result {result_id}: {e}")
+        return None
+
+def save_result_analytics(user_id, result_id, name, data):
+    """
+    Save a document in a result's 'analytics' subcollection.
+
+    Returns:
+        dict: Success status
+    """
+    try:
+        db = get_firestore_db()
+        if not db:
+            return {'success': False, 'error': 'Database connection failed'}
+
+        db.collection('users').document(user_id).collection('results').document(result_id) \
+            .collection('analytics').document(name).set({**data, 'computed_at': firestore.SERVER_TIMESTAMP})
+        return {'success': True}
+    except Exception as e:
+        print(f"Error saving {name} for result {result_id}: {e}")
+        return {'success': False, 'error': str(e)}
+
+def update_result_metadata(user_id, result_id, fields):
+    """
+    Merge fields into a result's metadata map.
+
+    Returns:
+        dict: Success status
+    """
+    try:
+        db = get_firestore_db()
+        if not db:
+            return {'success': False, 'error': 'Database connection failed'}
+
+        db.collection('users').document(user_id).collection('results').document(result_id) \
+            .update({f'metadata.{key}': value for key, value in fields.items()})
+        return {'success': True}
+    except Exception as e:
+        print(f"Error updating metadata for result {result_id}: {e}")
+        return {'success': False, 'error': str(e)}
+
+def find_previous_result_for_payload(user_id, payload_key, result_id):
+    """
+    Find the most recent result, other than result_id and not newer than it, saved for
+    the same search (metadata.payload_key).
+
+    Returns:
+        str: The previous result's ID, or None.
+    """
+    try:
+        db = get_firestore_db()
+        if not db or not payload_key:
+            return None
+
+        results_ref = db.collection('users').document(user_id).collection('results')
+        current = results_ref.document(result_id).get()
+        current_created = current.to_dict().get('created_at') if current.exists else None
+
+        # Equality filter only (no composite index needed); users have few runs per search
+        previous_id, previous_created = None, None
+        for result_doc in results_ref.where('metadata.payload_key', '==', payload_key).stream():
+            created = result_doc.to_dict().get('created_at')
+            if result_doc.id == result_id or created is None:
+                continue
+            if current_created is not None and created > current_created:
+                continue
+            if previous_created is None or created > previous_created:
+                previous_id, previous_created = result_doc.id, created
+        return previous_id
+    except Exception as e:
+        print(f"Error finding previous result for payload {payload_key}: {e}")
+        return None
+
 # --- End Firestore Results Functions ---
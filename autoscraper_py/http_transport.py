@@ -0,0 +1,154 @@
+import os
+import asyncio
+import logging
+import threading
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, select_proxy
+
+# Transport for AutoTrader requests (fetch_page and extract_vehicle_info), set with AUTOTRADER_HTTP_TRANSPORT:
+#   requests  (default) HTTP/1.1 through urllib3: one connection per in-flight request
+#   http2     httpx with HTTP/2 negotiated over TLS, so concurrent requests share a few multiplexed
+#             connections per proxy; falls back to HTTP/1.1 where the server or plain http needs it
+#   h2c       HTTP/2 only (prior knowledge over plain http), e.g. for the local stub in benchmarks
+# The HTTP/2 transports plug into the requests sessions as an adapter, so retries, metrics and
+# proxy leases work unchanged. They need httpx with its http2 extra (the h2 package).
+HTTP_TRANSPORT = os.environ.get("AUTOTRADER_HTTP_TRANSPORT", "requests").strip().lower()
+HTTP2_TRANSPORTS = ("http2", "h2c")
+
+# Set on responses whose body the transport has read in full, also with stream=True (see is_buffered)
+BUFFERED_ATTRIBUTE = "body_buffered"
+
+# Connection-specific headers are not allowed in HTTP/2 (RFC 9113 8.2.2)
+_HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade"}
+
+class Http2Adapter(BaseAdapter):
+    """
+    requests adapter that sends through httpx clients with HTTP/2 enabled. Clients are shared by
+    all sessions in the process, one per proxy, so their multiplexed connections are reused.
+
+    The clients are httpx.AsyncClients on a dedicated event loop thread; the scraper's worker
+    threads wait for their request's future. (httpcore's sync HTTP/2 connection can interleave
+    stream IDs when several threads share it, which the server rejects.)
+
+    Args:
+        prior_knowledge (bool): Speak HTTP/2 without negotiation (disables HTTP/1.1).
+    """
+
+    def __init__(self, prior_knowledge=False):
+        super().__init__()
+        import httpx # Optional dependency, only needed when an HTTP/2 transport is selected
+        self._httpx = httpx
+        self.prior_knowledge = prior_knowledge
+        self._clients = {} # Only touched on the loop thread
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="http2-transport", daemon=True).start()
+
+    def _client(self, proxy, verify):
+        key = (proxy, verify if isinstance(verify, (bool, str)) else True)
+        client = self._clients.get(key)
+        if client is None:
+            client = self._httpx.AsyncClient(
+                http2=True,
+                http1=not self.prior_knowledge,
+                proxy=proxy,
+                verify=key[1],
+                # No caps: the proxy pool bounds concurrency, and HTTP/2 requests queue onto open connections
+                limits=self._httpx.Limits(max_connections=None, max_keepalive_connections=None),
+            )
+            self._clients[key] = client
+        return client
+
+    async def _request(self, proxy, verify, method, url, headers, body, timeout):
+        return await self._client(proxy, verify).request(method, url, headers=headers, content=body, timeout=timeout)
+
+    def _timeout(self, timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+        else:
+            connect = read = timeout
+        return self._httpx.Timeout(connect=connect, read=read, write=read, pool=None)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        # Bodies are always read in full, also with stream=True: httpcore doesn't reset an HTTP/2 stream
+        # closed early, and the data it then drops unacknowledged would shrink the shared connection's window
+        httpx = self._httpx
+        headers = [(name, value) for name, value in request.headers.items() if name.lower() not in _HOP_BY_HOP_HEADERS]
+        future = asyncio.run_coroutine_threadsafe(
+            self._request(select_proxy(request.url, proxies or {}), verify, request.method, request.url,
+                          headers, request.body, self._timeout(timeout)),
+            self._loop)
+        try:
+            response = future.result()
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(e, request=request)
+        except httpx.ProxyError as e:
+            raise requests.exceptions.ProxyError(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+        return self.build_response(request, response)
+
+    def build_response(self, request, httpx_response):
+        """A requests.Response carrying the (already decoded) body of an httpx response."""
+        response = requests.Response()
+        response.status_code = httpx_response.status_code
+        response.headers = CaseInsensitiveDict(httpx_response.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.reason = httpx_response.reason_phrase
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response._content = httpx_response.content
+        response._content_consumed = True # So iter_content replays the body read here instead of the raw stream
+        setattr(response, BUFFERED_ATTRIBUTE, True)
+        return response
+
+    def close(self):
+        pass # Sessions close their adapters; the shared clients live as long as the process
+
+    def close_clients(self):
+        async def close_all():
+            for client in self._clients.values():
+                await client.aclose()
+            self._clients.clear()
+        asyncio.run_coroutine_threadsafe(close_all(), self._loop).result()
+
+def is_buffered(response):
+    """Whether the transport has already read response's whole body (stream=True notwithstanding)."""
+    return getattr(response, BUFFERED_ATTRIBUTE, False) is True
+
+_adapter = None
+_adapter_lock = threading.Lock()
+
+def _http2_adapter():
+    """The process-wide Http2Adapter, or None if httpx/h2 are missing (logged once)."""
+    global _adapter
+    if _adapter is None:
+        with _adapter_lock:
+            if _adapter is None:
+                try:
+                    import h2 # noqa: F401 - httpx needs it for HTTP/2
+                    _adapter = Http2Adapter(prior_knowledge=HTTP_TRANSPORT == "h2c")
+                    logging.info(f"AutoTrader requests use the '{HTTP_TRANSPORT}' transport (httpx).")
+                except ImportError as e:
+                    logging.warning(f"AUTOTRADER_HTTP_TRANSPORT={HTTP_TRANSPORT} needs httpx[http2] ({e}); using requests.")
+                    _adapter = False
+    return _adapter or None
+
+def mount_http_transport(session):
+    """
+    Mounts the configured transport on a requests session (nothing to do for the default).
+
+    Returns:
+        str: The transport the session uses.
+    """
+    if HTTP_TRANSPORT not in HTTP2_TRANSPORTS:
+        return "requests"
+    adapter = _http2_adapter()
+    if adapter is None:
+        return "requests"
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return HTTP_TRANSPORT
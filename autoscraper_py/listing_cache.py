@@ -0,0 +1,332 @@
+import os
+import io
+import csv
+import json
+import time
+import logging
+import datetime
+import threading
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .redis_client import get_redis_client, reset_redis_client
+
+# Listing detail rows (one per AutoTrader link) shared by every search. Two tiers:
+#   local   a bounded in-process LRU (LISTING_CACHE_LOCAL_SIZE rows), so repeated lookups within
+#           a worker process don't go to Redis
+#   shared  a Redis hash (field per link) that every worker node reads and writes, so a listing
+#           fetched anywhere in the fleet is a hit everywhere. Each row is its own field, so
+#           concurrent tasks upsert listings without overwriting each other's updates.
+# Without Redis the shared tier is the CSV file instead. Rows are appended to it and the last row
+# for a link wins when it is read, so concurrent writers don't clobber each other either.
+# A sorted set records when each listing was last written or read by a search; cache_maintenance.py
+# evicts by it.
+CACHE_FILE = os.environ.get("AUTOSCRAPER_LISTING_CACHE_FILE",
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), "autoscraper_cache.csv"))
+CACHE_HEADERS = [
+    "Link", "Make", "Model", "Year", "Trim", "Price", "Drivetrain",
+    "Kilometres", "Status", "Body Type", "Engine", "Cylinder",
+    "Transmission", "Exterior Colour", "Doors", "Fuel Type",
+    "City Fuel Economy", "Hwy Fuel Economy", "date_cached" # Added date column
+]
+# Columns with a small set of repeated values, stored once per distinct value (CompactRows)
+INTERNED_COLUMNS = [
+    "Make", "Model", "Year", "Trim", "Drivetrain", "Status", "Body Type", "Engine", "Cylinder",
+    "Transmission", "Exterior Colour", "Doors", "Fuel Type", "City Fuel Economy", "Hwy Fuel Economy", "date_cached"
+]
+LOCAL_CACHE_SIZE = int(os.environ.get("LISTING_CACHE_LOCAL_SIZE", "20000"))
+REDIS_HASH_KEY = "autoscraper:listing_cache"
+REDIS_SEEN_KEY = "autoscraper:listing_cache:seen" # link -> unix time last written or read
+REDIS_BATCH_SIZE = 1000 # Fields per HMGET/HSET
+FILE_LOCK_TIMEOUT = 10 # Seconds to wait for the CSV file lock
+FILE_LOCK_STALE_AFTER = 60 # Seconds after which a lock file is assumed left behind by a killed process
+
+logger = logging.getLogger("AutoScraper")
+
+def load_cache(filepath=CACHE_FILE, links=None):
+    """
+    Loads the CSV cache file into a dictionary (the last row for a link wins).
+    With links given, only those rows are kept, so memory doesn't grow with the file.
+    """
+    cache = {}
+    wanted = set(links) if links is not None else None
+    try:
+        with open(filepath, mode='r', newline='', encoding='utf-8') as file:
+            reader = csv.DictReader(file)
+            if reader.fieldnames != CACHE_HEADERS:
+                 logger.warning(f"Cache file '{filepath}' headers mismatch expected headers. Rebuilding cache might be necessary.")
+            for row in reader:
+                link = row.get("Link")
+                if link and (wanted is None or link in wanted):
+                    cache[link] = row
+        logger.info(f"Loaded {len(cache)} items from cache file '{filepath}'.")
+    except FileNotFoundError:
+        logger.info(f"Cache file '{filepath}' not found. A new one will be created.")
+    except Exception as e:
+        logger.error(f"Error loading cache file '{filepath}': {e}")
+    return cache
+
+@contextmanager
+def cache_file_lock(filepath=CACHE_FILE, timeout=FILE_LOCK_TIMEOUT):
+    """
+    Cross-process lock on the CSV cache file, held by writers and by cache maintenance while it
+    swaps in the compacted file. It is a '<file>.lock' file created with O_EXCL, so it works the same
+    on Windows and POSIX.
+
+    Raises:
+        TimeoutError: If the lock isn't free within timeout seconds.
+    """
+    lock_path = f"{filepath}.lock"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > FILE_LOCK_STALE_AFTER:
+                    os.remove(lock_path)
+                    logger.warning(f"Removed stale lock file '{lock_path}'.")
+                    continue
+            except OSError:
+                continue # Released meanwhile
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Cache file '{filepath}' is locked")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+def append_to_cache(data_rows, filepath=CACHE_FILE, headers=CACHE_HEADERS):
+    """
+    Appends data rows (list of dicts) to the CSV cache file. The rows go out in a single
+    append-mode write under cache_file_lock, so rows from concurrent writers don't interleave and
+    maintenance can't swap the file out from under the write.
+    """
+    if not data_rows:
+        return
+    try:
+        buffer = io.StringIO(newline='')
+        csv.DictWriter(buffer, fieldnames=headers, extrasaction='ignore').writerows(data_rows)
+        with cache_file_lock(filepath):
+            try:
+                # Only the process that creates the file writes the header
+                fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+                with os.fdopen(fd, "w", newline='', encoding='utf-8') as file:
+                    csv.DictWriter(file, fieldnames=headers).writeheader()
+                logger.info(f"Created cache file '{filepath}'.")
+            except FileExistsError:
+                pass
+            with open(filepath, mode='a', newline='', encoding='utf-8') as file:
+                file.write(buffer.getvalue())
+        logger.info(f"Appended {len(data_rows)} items to cache file '{filepath}'.")
+    except Exception as e:
+        logger.error(f"Error appending to cache file '{filepath}': {e}")
+
+def write_cache(cache_dict, filepath=CACHE_FILE, headers=CACHE_HEADERS):
+    """Writes the entire cache dictionary to the CSV file, overwriting existing content."""
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=headers)
+            writer.writeheader()
+            writer.writerows(cache_dict.values()) # Write all values from the cache dict
+        with cache_file_lock(filepath):
+            os.replace(tmp_path, filepath) # Readers never see a half-written file
+        logger.info(f"Wrote {len(cache_dict)} items to cache file '{filepath}'.")
+    except Exception as e:
+        logger.error(f"Error writing cache file '{filepath}': {e}")
+
+class CompactRows:
+    """
+    Memory-compact link -> row store with least-recently-used eviction.
+
+    Rows are kept column-wise in slots: each INTERNED_COLUMNS value is stored once and referenced
+    by a 32-bit code in an array per column; the other columns are plain lists. A row costs a few
+    hundred bytes instead of a dict with 19 string objects. get() rebuilds the row dict.
+
+    Args:
+        max_rows (int, optional): Least recently used rows are evicted beyond this many.
+        headers (list): Columns of a row; missing columns read back as "".
+    """
+
+    def __init__(self, max_rows=None, headers=CACHE_HEADERS):
+        self.max_rows = max_rows
+        self.headers = headers
+        self._interned = [column for column in headers if column in INTERNED_COLUMNS]
+        self._plain = [column for column in headers if column not in INTERNED_COLUMNS and column != "Link"]
+        self._codes = {column: array("I") for column in self._interned} # slot -> value code
+        self._values = {column: [] for column in self._interned} # code -> value
+        self._value_codes = {column: {} for column in self._interned} # value -> code
+        self._columns = {column: [] for column in self._plain} # slot -> value
+        self._index = OrderedDict() # link -> slot, least recently used first
+        self._free = [] # Slots of evicted rows, reused by put()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, link):
+        return link in self._index
+
+    def _code(self, column, value):
+        code = self._value_codes[column].get(value)
+        if code is None:
+            code = self._value_codes[column][value] = len(self._values[column])
+            self._values[column].append(value)
+        return code
+
+    def put(self, row):
+        """Stores row (a dict with 'Link'), replacing any earlier row for its link."""
+        link = row["Link"]
+        slot = self._index.get(link)
+        if slot is None and self.max_rows is not None:
+            while self._index and len(self._index) >= self.max_rows:
+                self.pop(next(iter(self._index))) # Frees a slot for this row
+        if slot is not None:
+            self._index.move_to_end(link)
+        elif self._free:
+            slot = self._index[link] = self._free.pop()
+        else:
+            slot = self._index[link] = len(self._index) + len(self._free)
+            for column in self._interned:
+                self._codes[column].append(0)
+            for column in self._plain:
+                self._columns[column].append("")
+        for column in self._interned:
+            self._codes[column][slot] = self._code(column, row.get(column, ""))
+        for column in self._plain:
+            self._columns[column][slot] = row.get(column, "")
+
+    def get(self, link, touch=True):
+        """The row for link as a dict, or None. touch marks it as recently used."""
+        slot = self._index.get(link)
+        if slot is None:
+            return None
+        if touch:
+            self._index.move_to_end(link)
+        row = {"Link": link}
+        for column in self.headers:
+            if column in self._codes:
+                row[column] = self._values[column][self._codes[column][slot]]
+            elif column in self._columns:
+                row[column] = self._columns[column][slot]
+        return row
+
+    def pop(self, link):
+        """Removes the row for link, if present."""
+        slot = self._index.pop(link, None)
+        if slot is not None:
+            for column in self._plain:
+                self._columns[column][slot] = "" # Release the strings
+            self._free.append(slot)
+
+    def links(self):
+        """Stored links, least recently used first."""
+        return list(self._index)
+
+    def clear(self):
+        self.__init__(self.max_rows, self.headers)
+
+class ListingCache:
+    """
+    Two-tier listing cache: in-process LRU in front of the shared Redis hash (or the CSV file).
+
+    Args:
+        local_size (int): Rows kept in the in-process LRU.
+        filepath (str): CSV file used when Redis is unavailable.
+    """
+
+    def __init__(self, local_size=LOCAL_CACHE_SIZE, filepath=CACHE_FILE):
+        self.local_size = local_size
+        self.filepath = filepath
+        self._local = CompactRows(max_rows=local_size)
+        self._lock = threading.Lock()
+
+    def _remember(self, rows):
+        with self._lock:
+            for row in rows.values():
+                self._local.put(row)
+
+    def get_many(self, links):
+        """
+        Looks up listings. Rows cached today come from the LRU; older or missing ones are read from
+        the shared tier, which may hold a newer row written by another worker.
+
+        Args:
+            links (iterable): Listing links.
+
+        Returns:
+            dict: link -> row for the links found in either tier.
+        """
+        today = datetime.date.today().isoformat()
+        found = {}
+        missing = []
+        with self._lock:
+            for link in dict.fromkeys(links):
+                row = self._local.get(link)
+                if row is not None and row.get("date_cached") == today:
+                    found[link] = row
+                else:
+                    missing.append(link)
+        if missing:
+            shared = self._get_shared(missing)
+            self._remember(shared)
+            found.update(shared)
+        return found
+
+    def put_many(self, rows):
+        """
+        Upserts listing rows (dicts with 'Link') in both tiers, each row on its own.
+
+        Args:
+            rows (iterable): Rows to store; a row replaces any earlier row for its link.
+        """
+        rows = {row["Link"]: row for row in rows if row.get("Link")}
+        if not rows:
+            return
+        self._remember(rows)
+        client = get_redis_client()
+        if client is not None:
+            try:
+                items = list(rows.items())
+                now = time.time()
+                pipe = client.pipeline(transaction=False)
+                for start in range(0, len(items), REDIS_BATCH_SIZE):
+                    batch = items[start:start + REDIS_BATCH_SIZE]
+                    pipe.hset(REDIS_HASH_KEY, mapping={link: json.dumps(row) for link, row in batch})
+                    pipe.zadd(REDIS_SEEN_KEY, {link: now for link, _ in batch})
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Redis write failed for the listing cache, appending to '{self.filepath}': {e}")
+                reset_redis_client()
+        append_to_cache(list(rows.values()), self.filepath)
+
+    def _get_shared(self, links):
+        client = get_redis_client()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for start in range(0, len(links), REDIS_BATCH_SIZE):
+                    pipe.hmget(REDIS_HASH_KEY, links[start:start + REDIS_BATCH_SIZE])
+                values = [value for batch in pipe.execute() for value in batch]
+                found = {link: json.loads(value) for link, value in zip(links, values) if value is not None}
+                if found:
+                    client.zadd(REDIS_SEEN_KEY, dict.fromkeys(found, time.time()))
+                return found
+            except Exception as e:
+                logger.warning(f"Redis read failed for the listing cache, reading '{self.filepath}': {e}")
+                reset_redis_client()
+        return load_cache(self.filepath, links)
+
+    def clear_local(self):
+        """Empties this process's LRU (the shared tier is untouched)."""
+        with self._lock:
+            self._local.clear()
+
+listing_cache = ListingCache()
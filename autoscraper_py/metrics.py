@@ -0,0 +1,133 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+
+from flask import Blueprint, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+
+from .http_transport import is_buffered
+
+# Prometheus metrics for the scraping hot paths. The web app serves them on /metrics (metrics_bp);
+# Celery workers serve them on WORKER_METRICS_PORT (start_worker_exporter, hooked up in tasks.py).
+#
+# With a multi-process setup (Celery prefork pool, several web processes) set PROMETHEUS_MULTIPROC_DIR
+# to an empty directory shared by the processes; the exporters then aggregate all of them.
+WORKER_METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", "9808"))
+
+# Latency buckets (seconds): HTTP requests range from ~50 ms to the 30 s timeout
+_REQUEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+_PARSE_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+_IO_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# endpoint: 'search' (Refinement/Search pages) or 'detail' (listing pages)
+HTTP_REQUEST_SECONDS = Histogram(
+    "autoscraper_http_request_seconds", "AutoTrader request latency", ["endpoint", "status"], buckets=_REQUEST_BUCKETS)
+HTTP_RESPONSE_BYTES = Counter(
+    "autoscraper_http_response_bytes", "Bytes downloaded from AutoTrader", ["endpoint"])
+HTTP_RETRIES = Counter(
+    "autoscraper_http_retries", "Requests retried, by reason", ["endpoint", "reason"])
+HTTP_RATE_LIMITED = Counter(
+    "autoscraper_http_rate_limited", "Rate-limited responses (HTTP 429 or a rate-limit page)", ["endpoint"])
+PARSE_SECONDS = Histogram(
+    "autoscraper_parse_seconds", "Time spent parsing responses", ["parser"], buckets=_PARSE_BUCKETS)
+CACHE_LOOKUPS = Counter(
+    "autoscraper_cache_lookups", "Listing cache lookups by result", ["result"]) # fresh, stale, miss
+CACHE_IO_SECONDS = Histogram(
+    "autoscraper_cache_io_seconds", "Listing cache load/write time", ["operation"], buckets=_IO_BUCKETS)
+FIRESTORE_COMMIT_SECONDS = Histogram(
+    "autoscraper_firestore_commit_seconds", "Firestore write latency", ["operation", "status"], buckets=_IO_BUCKETS)
+
+def instrumented_request(endpoint, send, url, **kwargs):
+    """
+    Calls send(url, **kwargs) (e.g. session.get) and records its latency, status and size.
+
+    Args:
+        endpoint (str): Metric label, 'search' or 'detail'.
+        send (callable): The request method to call.
+        url (str): Request URL.
+
+    Returns:
+        The response. Exceptions from send are recorded with status 'error' and re-raised.
+        With stream=True the latency is the time to the response headers and a body the transport
+        hasn't read yet isn't counted; record the bytes the caller reads with record_response_bytes.
+    """
+    start = time.perf_counter()
+    try:
+        response = send(url, **kwargs)
+    except Exception:
+        HTTP_REQUEST_SECONDS.labels(endpoint, "error").observe(time.perf_counter() - start)
+        raise
+    HTTP_REQUEST_SECONDS.labels(endpoint, str(response.status_code)).observe(time.perf_counter() - start)
+    if not kwargs.get("stream") or is_buffered(response): # The HTTP/2 transport reads streamed bodies too
+        HTTP_RESPONSE_BYTES.labels(endpoint).inc(len(response.content))
+    if response.status_code == 429:
+        HTTP_RATE_LIMITED.labels(endpoint).inc()
+    return response
+
+def record_response_bytes(endpoint, size):
+    """For streamed responses, which instrumented_request doesn't read."""
+    HTTP_RESPONSE_BYTES.labels(endpoint).inc(size)
+
+def record_retry(endpoint, reason):
+    HTTP_RETRIES.labels(endpoint, reason).inc()
+
+def record_rate_limited(endpoint):
+    """For rate limiting detected in a 200 response's body (429s are counted by instrumented_request)."""
+    HTTP_RATE_LIMITED.labels(endpoint).inc()
+
+def record_cache_lookups(fresh, stale, miss):
+    CACHE_LOOKUPS.labels("fresh").inc(fresh)
+    CACHE_LOOKUPS.labels("stale").inc(stale)
+    CACHE_LOOKUPS.labels("miss").inc(miss)
+
+@contextmanager
+def track_firestore(operation):
+    """Times the block as a Firestore write, labelled 'ok' or 'error' depending on whether it raised."""
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        FIRESTORE_COMMIT_SECONDS.labels(operation, status).observe(time.perf_counter() - start)
+
+def _collect_registry():
+    """Registry to export: the per-process default, or the aggregate of all processes in multiprocess mode."""
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    from prometheus_client import multiprocess
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    return Response(generate_latest(_collect_registry()), content_type=CONTENT_TYPE_LATEST)
+
+def start_worker_exporter(port=None):
+    """
+    Serves this worker's metrics over HTTP. Each worker on a host needs its own port
+    (WORKER_METRICS_PORT); a failure to bind is logged, never fatal for the worker.
+
+    Returns:
+        bool: True if the exporter is listening.
+    """
+    port = port or WORKER_METRICS_PORT
+    try:
+        start_http_server(port, registry=_collect_registry())
+        logging.info(f"Worker metrics exporter listening on port {port}")
+        return True
+    except OSError as e:
+        logging.warning(f"Could not start worker metrics exporter on port {port}: {e}")
+        return False
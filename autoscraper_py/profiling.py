@@ -0,0 +1,188 @@
+import os
+import sys
+import time
+import pstats
+import logging
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Profiles requested with the payload's "Profile" flag are written here as <task_id>.prof
+# (cProfile, open with snakeviz or `python -m pstats`) or <task_id>.collapsed (sampled stacks,
+# the folded format flamegraph.pl and speedscope read).
+PROFILE_DIR = os.environ.get("AUTOSCRAPER_PROFILE_DIR", "Profiles")
+PROFILE_MODES = ("cprofile", "sample")
+SAMPLE_INTERVAL = 0.005 # Seconds between stack samples
+# cProfile can't be run by two tasks at once: threading.setprofile is process-wide, and from
+# Python 3.12 cProfile uses sys.monitoring, which allows one active profiler per interpreter.
+# A second task that asks for cprofile while one is running gets the sampler instead.
+_cprofile_lock = threading.Lock()
+
+class PhaseTimer:
+    """
+    Wall and CPU time per named phase of one task. Thread-safe; a phase entered more than once
+    (or from several threads) accumulates.
+
+    Phases timed on the task thread use process CPU time, which includes the thread pools they
+    start. Per-item phases timed inside pool threads ('parse', 'filter') use thread CPU time and
+    their wall time is summed over threads, so they overlap 'search_pages' / 'detail_fetch'.
+    """
+
+    def __init__(self, phases=None):
+        self._lock = threading.Lock()
+        self.phases = {}
+        if phases:
+            self.merge(phases)
+
+    @contextmanager
+    def phase(self, name, cpu_clock=time.process_time):
+        wall_start, cpu_start = time.perf_counter(), cpu_clock()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall_start, cpu_clock() - cpu_start)
+
+    def add(self, name, wall_s, cpu_s, calls=1):
+        with self._lock:
+            entry = self.phases.setdefault(name, {'wall_s': 0.0, 'cpu_s': 0.0, 'calls': 0})
+            entry['wall_s'] += wall_s
+            entry['cpu_s'] += cpu_s
+            entry['calls'] += calls
+
+    def merge(self, phases):
+        """Adds the phases of another timer (as returned by as_dict), e.g. from a subtask."""
+        for name, entry in (phases or {}).items():
+            self.add(name, entry.get('wall_s', 0.0), entry.get('cpu_s', 0.0), entry.get('calls', 1))
+
+    def as_dict(self):
+        """{phase: {'wall_s', 'cpu_s', 'calls'}}, JSON- and Firestore-safe."""
+        with self._lock:
+            return {name: {'wall_s': round(entry['wall_s'], 4), 'cpu_s': round(entry['cpu_s'], 4), 'calls': entry['calls']}
+                    for name, entry in self.phases.items()}
+
+@contextmanager
+def timed_phase(phase_timer, name, cpu_clock=time.process_time):
+    """phase_timer.phase(name), or nothing when no timer is passed (functions called outside a task)."""
+    if phase_timer is None:
+        yield
+    else:
+        with phase_timer.phase(name, cpu_clock):
+            yield
+
+def profile_mode(payload):
+    """
+    The profiler requested by the payload's "Profile" flag: 'cprofile', 'sample' or None.
+    True (or "true") selects 'sample', which covers every thread at low overhead.
+    """
+    value = payload.get('Profile') if payload else None
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in PROFILE_MODES:
+            return value
+        return 'sample' if value == 'true' else None
+    return 'sample' if value is True else None
+
+class _ThreadedCProfile:
+    """
+    cProfile for the calling thread and every thread started while it runs (the scrape's pools).
+    Before Python 3.12 each new thread gets its own profile, merged when it stops; from 3.12 one
+    profile sees every thread. Only one may run at a time (_cprofile_lock).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.profiles = []
+
+    def _profile_new_thread(self, frame, event, arg):
+        sys.setprofile(None) # Installed by threading.setprofile; hand the thread over to its own profiler
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def start(self):
+        main_profile = cProfile.Profile()
+        main_profile.enable() # Raises ValueError from 3.12 if another profiler is active
+        self.profiles.append(main_profile)
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._profile_new_thread)
+
+    def stop(self, path):
+        self.profiles[0].disable()
+        if sys.version_info < (3, 12):
+            threading.setprofile(None)
+        stats = pstats.Stats(self.profiles[0])
+        with self._lock:
+            for profile in self.profiles[1:]:
+                stats.add(profile)
+        stats.dump_stats(path)
+
+class _StackSampler(threading.Thread):
+    """Samples the stacks of all threads every SAMPLE_INTERVAL and counts them in folded form."""
+
+    def __init__(self):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_ident = threading.get_ident()
+        while not self._stop_event.wait(SAMPLE_INTERVAL):
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self, path):
+        self._stop_event.set()
+        self.join()
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def task_profile(mode, task_id, directory=None):
+    """
+    Profiles the block with the given mode (see profile_mode) and writes the result for offline analysis
+    when it exits. Yields the profile's path, or None (and does nothing) when mode is None.
+    'cprofile' falls back to 'sample' while another task holds cProfile; the path's extension tells which ran.
+    """
+    if mode not in PROFILE_MODES:
+        yield None
+        return
+    directory = directory or PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    profiler = None
+    if mode == 'cprofile':
+        if _cprofile_lock.acquire(blocking=False):
+            profiler = _ThreadedCProfile()
+            try:
+                profiler.start()
+            except ValueError as e: # A profiler outside this module (e.g. a debugger) is active
+                _cprofile_lock.release()
+                profiler = None
+                logging.warning(f"cProfile unavailable for task {task_id}, sampling instead: {e}")
+        else:
+            logging.info(f"Another task is being profiled with cProfile; sampling task {task_id} instead")
+    if profiler is None:
+        mode = 'sample'
+        profiler = _StackSampler()
+        profiler.start()
+    path = os.path.join(directory, f"{task_id}.{'prof' if mode == 'cprofile' else 'collapsed'}").replace("\\", "/")
+    try:
+        yield path
+    finally:
+        try:
+            profiler.stop(path)
+            logging.info(f"Wrote {mode} profile of task {task_id} to {path}")
+        except Exception as e:
+            logging.warning(f"Could not write profile of task {task_id}: {e}")
+        finally:
+            if mode == 'cprofile':
+                _cprofile_lock.release()
@@ -0,0 +1,340 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from urllib.parse import urlsplit
+
+# Shared pool of outbound proxies for the AutoTrader and Kijiji scrapers, loaded once per process
+# from proxyconfig.json (see parse_proxy_config for the formats). Every request leases a proxy:
+# selection is weighted by each proxy's rolling health, each proxy has its own concurrency limit,
+# and a proxy whose responses turn into 403/429s (or errors) is ejected for a cooldown, then
+# readmitted on probation with a single slot until it has served a few requests cleanly.
+# The pool never ejects its last usable proxy (or direct connections): the best-scored one stays in rotation.
+PROXY_CONFIG_FILE = os.environ.get("PROXY_CONFIG_FILE", "proxyconfig.json")
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("PROXY_MAX_CONCURRENCY", "100")) # Per proxy, unless configured
+
+EWMA_ALPHA = 0.2 # Weight of the newest sample in the rolling scores
+MIN_SAMPLES = 10 # Requests through a proxy before it can be ejected
+EJECT_BLOCK_RATE = 0.5 # Rolling share of 403/429 responses that ejects a proxy
+EJECT_SUCCESS_RATE = 0.25 # Rolling success rate below which a proxy is ejected
+BASE_COOLDOWN = 30.0 # Seconds; doubles with every repeated ejection
+MAX_COOLDOWN = 600.0
+PROBATION_SUCCESSES = 3 # Clean requests that end a probation
+DEFAULT_LATENCY = 1.0 # Seconds, assumed until a proxy has served a request
+ASYNC_POLL_INTERVAL = 0.05 # Seconds between slot checks in async_lease
+LEASE_TIMEOUT = float(os.environ.get("PROXY_LEASE_TIMEOUT", "60")) # Seconds a request waits for a free slot by default
+
+BLOCKED_STATUSES = (403, 429)
+
+def _proxy_name(url):
+    """host:port of a proxy URL, without credentials, for logs."""
+    if not url:
+        return "direct"
+    parts = urlsplit(url if "://" in url else f"http://{url}")
+    return f"{parts.hostname}:{parts.port}" if parts.port else (parts.hostname or url)
+
+class PooledProxy:
+    """One proxy of the pool and its rolling health. Mutated only under the pool's lock."""
+
+    def __init__(self, http=None, https=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, weight=1.0):
+        self.proxies = {scheme: url for scheme, url in (("http", http), ("https", https)) if url} # For requests
+        self.url = https or http # For clients that take a single proxy URL (httpx); None means direct
+        self.name = _proxy_name(self.url)
+        self.max_concurrency = max_concurrency # None means unlimited
+        self.weight = weight
+        self.in_flight = 0
+        self.samples = 0
+        self.success_rate = 1.0
+        self.block_rate = 0.0
+        self.latency = None
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.probation = None # Clean requests since readmission, or None when not on probation
+
+    def state(self, now):
+        if self.ejected_until > now:
+            return "ejected"
+        return "active" if self.probation is None else "probation"
+
+    def capacity(self, now):
+        state = self.state(now)
+        if state == "ejected":
+            return 0
+        return 1 if state == "probation" else self.max_concurrency
+
+    def score(self):
+        """Selection weight: configured weight scaled by success rate, block rate and latency."""
+        latency = self.latency if self.latency is not None else DEFAULT_LATENCY
+        return max(self.weight * self.success_rate * (1 - self.block_rate) / max(latency, 0.01), 1e-6)
+
+def parse_proxy_config(data):
+    """
+    Proxies described by a decoded proxyconfig.json. Accepted shapes:
+        {"http": URL, "https": URL}                        a single proxy (the original format)
+        {"proxies": [entry, ...], "max_concurrency": N}    a pool; a bare list of entries also works
+    An entry is a URL string (used for http and https) or a dict with "url" (or "http"/"https"),
+    and optionally "max_concurrency" and "weight". An empty config means direct connections,
+    which are only limited by a top-level "max_concurrency".
+
+    Returns:
+        list: PooledProxy objects (never empty).
+    """
+    if isinstance(data, list):
+        data = {"proxies": data}
+    if not isinstance(data, dict):
+        data = {}
+    default_limit = data.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)
+    entries = data.get("proxies")
+    if entries is None and (data.get("http") or data.get("https")):
+        entries = [data]
+
+    pool = []
+    for entry in entries or []:
+        if isinstance(entry, str):
+            entry = {"url": entry}
+        http = entry.get("http") or entry.get("url")
+        https = entry.get("https") or entry.get("url")
+        if not (http or https):
+            logging.warning(f"Ignoring proxy entry without a URL: {sorted(entry)}")
+            continue
+        pool.append(PooledProxy(http, https, entry.get("max_concurrency", default_limit), float(entry.get("weight", 1.0))))
+    if not pool:
+        pool.append(PooledProxy(max_concurrency=data.get("max_concurrency")))
+    return pool
+
+def load_proxy_config(filename=PROXY_CONFIG_FILE):
+    """parse_proxy_config for a file; a missing or invalid file means direct connections."""
+    try:
+        with open(filename, "r") as file:
+            return parse_proxy_config(json.load(file))
+    except FileNotFoundError:
+        logging.warning(f"Proxy file '{filename}' not found. Proceeding without proxy.")
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError) as e:
+        logging.error(f"Invalid proxy file '{filename}': {e}. Proceeding without proxy.")
+    return parse_proxy_config({})
+
+class ProxyLease:
+    """A proxy checked out of the pool for one request. Report the outcome with record()."""
+
+    def __init__(self, pool, proxy):
+        self.pool = pool
+        self.proxy = proxy
+        self.proxies = proxy.proxies
+        self.url = proxy.url
+        self.recorded = False
+        self._start = time.perf_counter()
+
+    def record(self, status_code=None, blocked=False):
+        """
+        Args:
+            status_code (int, optional): HTTP status of the response.
+            blocked (bool): The response was a block/rate-limit page despite its status.
+        """
+        if self.recorded:
+            return
+        if blocked or status_code in BLOCKED_STATUSES:
+            outcome = "blocked"
+        elif status_code is not None and status_code >= 500:
+            outcome = "error"
+        else:
+            outcome = "ok"
+        self.pool.record(self.proxy, outcome, time.perf_counter() - self._start)
+        self.recorded = True
+
+    def record_error(self):
+        """The request failed without a response (connection error, timeout)."""
+        if not self.recorded:
+            self.pool.record(self.proxy, "error", None)
+            self.recorded = True
+
+class ProxyPool:
+    """Thread-safe pool of PooledProxy objects. Use lease() (or async_lease() in async code) per request."""
+
+    def __init__(self, proxies, clock=time.monotonic):
+        self.proxies = list(proxies)
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._request_interval = 0 # Minimum seconds between requests (rate_limit); 0 means unlimited
+        self._next_request_at = 0
+
+    def _select(self, now):
+        candidates = [proxy for proxy in self.proxies
+                      if proxy.capacity(now) is None or proxy.in_flight < proxy.capacity(now)]
+        if not candidates:
+            return None
+        return random.choices(candidates, weights=[proxy.score() for proxy in candidates])[0]
+
+    def acquire(self, timeout=None, blocking=True):
+        """
+        Checks out a proxy with a free slot, waiting for one unless blocking is False.
+
+        Returns:
+            PooledProxy, or None if none was free (non-blocking) or the timeout expired.
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._condition:
+            while True:
+                now = self._clock()
+                throttled = self._request_interval and now < self._next_request_at
+                proxy = None if throttled else self._select(now)
+                if proxy is not None:
+                    proxy.in_flight += 1
+                    if self._request_interval:
+                        self._next_request_at = now + self._request_interval
+                    return proxy
+                if not blocking or (deadline is not None and now >= deadline):
+                    return None
+                # Wake up for a released slot, when the next ejected proxy is readmitted or the rate limit allows a request
+                waits = [proxy.ejected_until - now for proxy in self.proxies if proxy.ejected_until > now]
+                if throttled:
+                    waits.append(self._next_request_at - now)
+                if deadline is not None:
+                    waits.append(deadline - now)
+                self._condition.wait(min(waits) if waits else None)
+
+    def release(self, proxy):
+        with self._condition:
+            proxy.in_flight -= 1
+            self._condition.notify()
+
+    def record(self, proxy, outcome, latency):
+        """Updates a proxy's rolling scores with one request outcome: 'ok', 'blocked' or 'error'."""
+        with self._condition:
+            now = self._clock()
+            proxy.samples += 1
+            proxy.success_rate += EWMA_ALPHA * ((outcome == "ok") - proxy.success_rate)
+            proxy.block_rate += EWMA_ALPHA * ((outcome == "blocked") - proxy.block_rate)
+            if outcome == "ok" and latency is not None:
+                proxy.latency = latency if proxy.latency is None else proxy.latency + EWMA_ALPHA * (latency - proxy.latency)
+
+            if proxy.probation is not None and proxy.ejected_until <= now:
+                if outcome != "ok":
+                    self._eject(proxy, now, "failed on probation")
+                    return
+                proxy.probation += 1
+                if proxy.probation >= PROBATION_SUCCESSES:
+                    proxy.probation = None
+                    proxy.samples, proxy.success_rate, proxy.block_rate = 0, 1.0, 0.0
+                    logging.info(f"Proxy {proxy.name} passed probation and is back in rotation.")
+                    self._condition.notify_all()
+            elif proxy.probation is None and proxy.samples >= MIN_SAMPLES:
+                if proxy.block_rate > EJECT_BLOCK_RATE:
+                    self._eject(proxy, now, f"block rate {proxy.block_rate:.0%}")
+                elif proxy.success_rate < EJECT_SUCCESS_RATE:
+                    self._eject(proxy, now, f"success rate {proxy.success_rate:.0%}")
+
+    def _eject(self, proxy, now, reason):
+        if proxy.url is None:
+            self._keep_in_rotation(proxy, f"{reason}; direct connections are never ejected")
+            return
+        if not any(other is not proxy and other.state(now) != "ejected" for other in self.proxies):
+            # Last usable proxy: keep whichever of it and the ejected ones scores best
+            best = max(self.proxies, key=lambda candidate: (candidate.score(), candidate is proxy))
+            if best is proxy:
+                self._keep_in_rotation(proxy, f"{reason}; it is the last proxy in rotation")
+                return
+            best.ejected_until = now
+            self._keep_in_rotation(best, f"readmitted early, {proxy.name} is being ejected")
+        cooldown = min(BASE_COOLDOWN * 2 ** proxy.ejections, MAX_COOLDOWN)
+        proxy.ejections += 1
+        proxy.ejected_until = now + cooldown
+        proxy.probation = 0
+        logging.warning(f"Ejected proxy {proxy.name} for {cooldown:.0f}s ({reason}); it returns on probation.")
+
+    def _keep_in_rotation(self, proxy, reason):
+        """Leaves a proxy that would otherwise be ejected in full rotation; its health is re-judged after MIN_SAMPLES."""
+        proxy.probation = None
+        proxy.samples = 0
+        logging.warning(f"Keeping proxy {proxy.name} in rotation ({reason}).")
+        self._condition.notify_all()
+
+    @contextmanager
+    def rate_limit(self, requests_per_second):
+        """
+        Spaces out every request through this pool (all proxies, all threads of the process) to at
+        most requests_per_second while the block runs, e.g. for background crawls on a solo worker.
+        """
+        with self._condition:
+            previous = self._request_interval
+            self._request_interval = 1 / requests_per_second if requests_per_second else 0
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._request_interval = previous
+                self._condition.notify_all()
+
+    @contextmanager
+    def lease(self, timeout=LEASE_TIMEOUT):
+        """
+        Checks out a proxy for one request. An exception inside the block is recorded as an error
+        unless the lease already recorded an outcome.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a free slot; None waits indefinitely.
+
+        Raises:
+            TimeoutError: No proxy had a free slot within the timeout.
+        """
+        proxy = self.acquire(timeout)
+        if proxy is None:
+            raise TimeoutError("No proxy available")
+        lease = ProxyLease(self, proxy)
+        try:
+            yield lease
+        except Exception:
+            lease.record_error()
+            raise
+        finally:
+            self.release(proxy)
+
+    @asynccontextmanager
+    async def async_lease(self, timeout=LEASE_TIMEOUT):
+        """lease() for asyncio code: polls for a free slot instead of blocking the event loop."""
+        deadline = None if timeout is None else self._clock() + timeout
+        proxy = self.acquire(blocking=False)
+        while proxy is None:
+            if deadline is not None and self._clock() >= deadline:
+                raise TimeoutError("No proxy available")
+            await asyncio.sleep(ASYNC_POLL_INTERVAL)
+            proxy = self.acquire(blocking=False)
+        lease = ProxyLease(self, proxy)
+        try:
+            yield lease
+        except Exception:
+            lease.record_error()
+            raise
+        finally:
+            self.release(proxy)
+
+    def snapshot(self):
+        """Current state of each proxy, e.g. for logging."""
+        with self._condition:
+            now = self._clock()
+            return [{
+                'proxy': proxy.name,
+                'state': proxy.state(now),
+                'in_flight': proxy.in_flight,
+                'max_concurrency': proxy.max_concurrency,
+                'success_rate': round(proxy.success_rate, 3),
+                'block_rate': round(proxy.block_rate, 3),
+                'latency_ms': round(proxy.latency * 1000, 1) if proxy.latency is not None else None,
+                'ejections': proxy.ejections,
+            } for proxy in self.proxies]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_proxy_pool():
+    """The process-wide pool, loaded from PROXY_CONFIG_FILE on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProxyPool(load_proxy_config())
+                logging.info(f"Proxy pool loaded: {', '.join(proxy.name for proxy in _pool.proxies)}")
+    return _pool
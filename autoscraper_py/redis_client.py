@@ -0,0 +1,49 @@
+import os
+import time
+import logging
+import threading
+
+import redis
+
+# Same Redis instance Celery uses as broker/backend unless overridden
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+# After a failed connection attempt, wait this long before trying Redis again
+REDIS_RETRY_INTERVAL = 30
+
+_client = None
+_last_failure = 0.0
+_lock = threading.Lock()
+
+def get_redis_client():
+    """
+    Returns a shared Redis client, or None if Redis is unreachable.
+
+    Callers are expected to fall back to local storage when None is returned.
+    The connection is checked once and re-attempted at most every REDIS_RETRY_INTERVAL seconds.
+    """
+    global _client, _last_failure
+    if _client is not None:
+        return _client
+    if time.time() - _last_failure < REDIS_RETRY_INTERVAL:
+        return None
+
+    with _lock:
+        if _client is not None:
+            return _client
+        try:
+            client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=2, socket_timeout=5, decode_responses=True)
+            client.ping()
+            _client = client
+            logging.info(f"Connected to Redis at {REDIS_URL}.")
+        except Exception as e:
+            _last_failure = time.time()
+            logging.warning(f"Redis unavailable at {REDIS_URL}, using local fallback: {e}")
+    return _client
+
+def reset_redis_client():
+    """Drops the shared client so the next get_redis_client() reconnects (e.g. after a connection error)."""
+    global _client, _last_failure
+    with _lock:
+        _client = None
+        _last_failure = time.time()
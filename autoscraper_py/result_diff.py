@@ -0,0 +1,194 @@
+import re
+import json
+import hashlib
+import logging
+
+from .firebase_config import (
+    get_result,
+    get_result_analytics,
+    save_result_analytics,
+    update_result_metadata,
+    find_previous_result_for_payload
+)
+
+# Diff layout version. Bump when the shape of diff_against_index() output changes.
+DIFF_VERSION = 1
+
+# Firestore documents are capped at 1 MiB; an index larger than this isn't stored and the
+# next run rebuilds it from the listings subcollection instead.
+MAX_INDEX_BYTES = 900 * 1024
+
+# AutoTrader ad IDs look like 5_64023045_on20080422140418812 (or 19_12345678)
+_AD_ID_RE = re.compile(r"/(\d+_\d+(?:_[a-z0-9]+)?)/?(?:[?#]|$)", re.IGNORECASE)
+_NUMBER_RE = re.compile(r"[^0-9.\-]")
+
+# Row fields that change between runs without the listing itself changing
+_VOLATILE_FIELDS = {"Link", "date_cached"}
+# Listing lists of a diff, cut short by _trim_diff when the diff is too large to store
+_DIFF_LISTS = ("added", "removed", "price_changes", "mileage_changes")
+
+def canonical_listing_id(link):
+    """
+    Stable short ID for a listing link: the hashed AutoTrader ad ID when present, otherwise
+    the hashed link without query string/fragment. Tracking parameters and URL slugs
+    (e.g. a city change) therefore don't make a listing look new.
+    """
+    link = (link or "").strip()
+    match = _AD_ID_RE.search(link)
+    key = match.group(1).lower() if match else link.split("#")[0].split("?")[0].rstrip("/").lower()
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+def content_hash(row):
+    """Hash of the listing's content, ignoring the link and cache date."""
+    content = {k: row[k] for k in sorted(row) if k not in _VOLATILE_FIELDS}
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+
+def _to_number(value):
+    cleaned = _NUMBER_RE.sub("", str(value)) if value is not None else ""
+    try:
+        return float(cleaned) if cleaned else None
+    except ValueError:
+        return None
+
+def build_listing_index(rows):
+    """
+    Compact index of a result's listings for diffing the next run against it. Rows without a
+    link are skipped: they have no identity to match the next run's rows by.
+
+    Returns:
+        dict: {listing_id: {'h': content_hash, 'p': price, 'km': kilometres, 'l': link}}
+    """
+    index = {}
+    for row in rows:
+        if not (row.get("Link") or "").strip():
+            continue
+        index[canonical_listing_id(row.get("Link"))] = {
+            "h": content_hash(row),
+            "p": _to_number(row.get("Price")),
+            "km": _to_number(row.get("Kilometres")),
+            "l": row.get("Link"),
+        }
+    return index
+
+def diff_against_index(previous_index, rows, previous_result_id=None):
+    """
+    Compares a run's rows with the listing index of the previous run of the same payload.
+    Rows without a link are left out, as in build_listing_index.
+
+    Args:
+        previous_index (dict): Output of build_listing_index for the previous run.
+        rows (list): Listing dicts of the new run.
+        previous_result_id (str, optional): Stored in the diff for reference.
+
+    Returns:
+        dict: {'version', 'previous_result_id', 'added' (full rows), 'removed',
+               'price_changes', 'mileage_changes', 'changed_count', 'unchanged_count'}
+              update_result_diff may cut the diff down (see _trim_diff) when it is too
+              large to store.
+    """
+    added, price_changes, mileage_changes = [], [], []
+    changed_count = unchanged_count = 0
+    seen = set()
+    for row in rows:
+        if not (row.get("Link") or "").strip():
+            continue
+        listing_id = canonical_listing_id(row.get("Link"))
+        seen.add(listing_id)
+        previous = previous_index.get(listing_id)
+        if previous is None:
+            added.append({"id": listing_id, **row})
+            continue
+        if previous["h"] == content_hash(row):
+            unchanged_count += 1
+            continue
+        changed_count += 1
+        price, km = _to_number(row.get("Price")), _to_number(row.get("Kilometres"))
+        if price != previous["p"]:
+            price_changes.append({"id": listing_id, "Link": row.get("Link"), "old": previous["p"], "new": price})
+        if km != previous["km"]:
+            mileage_changes.append({"id": listing_id, "Link": row.get("Link"), "old": previous["km"], "new": km})
+
+    removed = [{"id": listing_id, "Link": entry["l"], "Price": entry["p"], "Kilometres": entry["km"]}
+               for listing_id, entry in previous_index.items() if listing_id not in seen]
+
+    return {
+        "version": DIFF_VERSION,
+        "previous_result_id": previous_result_id,
+        "added": added,
+        "removed": removed,
+        "price_changes": price_changes,
+        "mileage_changes": mileage_changes,
+        "changed_count": changed_count,
+        "unchanged_count": unchanged_count,
+    }
+
+def summarize_diff(diff):
+    """Counts stored in the result metadata, so result lists can show them without loading the diff."""
+    return {
+        "previous_result_id": diff["previous_result_id"],
+        "added": len(diff["added"]),
+        "removed": len(diff["removed"]),
+        "price_changes": len(diff["price_changes"]),
+        "mileage_changes": len(diff["mileage_changes"]),
+    }
+
+def _trim_diff(diff, max_bytes):
+    """
+    Cuts diff down to at most max_bytes of JSON, in place: 'added' is reduced to
+    id/Link/Price/Kilometres first, then the longest of the listing lists is halved until it fits.
+    Each list that was cut gets a '<list>_truncated' flag.
+    """
+    if len(json.dumps(diff, default=str)) <= max_bytes:
+        return
+    # The full rows are in the listings subcollection
+    diff["added"] = [{k: row.get(k) for k in ("id", "Link", "Price", "Kilometres")} for row in diff["added"]]
+    diff["added_truncated"] = True
+    while len(json.dumps(diff, default=str)) > max_bytes:
+        longest = max(_DIFF_LISTS, key=lambda name: len(diff[name]))
+        if not diff[longest]:
+            break
+        diff[longest] = diff[longest][:len(diff[longest]) // 2]
+        diff[f"{longest}_truncated"] = True
+
+def _load_listing_index(user_id, result_id):
+    """Stored index of a result, or one rebuilt from its listings (older results / oversized index)."""
+    stored = get_result_analytics(user_id, result_id, "listing_index")
+    if stored and stored.get("version") == DIFF_VERSION:
+        return stored["index"]
+    result = get_result(user_id, result_id)
+    return build_listing_index(result.get("results", [])) if result else None
+
+def update_result_diff(user_id, result_id, payload_key, rows):
+    """
+    Stores the listing index of a newly saved result and its diff against the previous
+    result of the same payload (if any), both in the result's 'analytics' subcollection,
+    plus a summary in its metadata.
+
+    Args:
+        user_id (str): The user's ID
+        result_id (str): The new result document ID
+        payload_key (str): AutoScraperUtil.payload_key of the search
+        rows (list): The listings saved with the result
+
+    Returns:
+        dict: The diff, or None if there is no previous run.
+    """
+    index = build_listing_index(rows)
+    if len(json.dumps(index)) <= MAX_INDEX_BYTES:
+        save_result_analytics(user_id, result_id, "listing_index", {"version": DIFF_VERSION, "index": index})
+    else:
+        logging.info(f"Listing index for result {result_id} is too large to store; it will be rebuilt when needed.")
+
+    previous_result_id = find_previous_result_for_payload(user_id, payload_key, result_id)
+    if previous_result_id is None:
+        return None
+    previous_index = _load_listing_index(user_id, previous_result_id)
+    if previous_index is None:
+        return None
+
+    diff = diff_against_index(previous_index, rows, previous_result_id)
+    summary = summarize_diff(diff) # Full counts, also when the stored diff is cut short
+    _trim_diff(diff, MAX_INDEX_BYTES) # Keep it under the document limit
+    save_result_analytics(user_id, result_id, "diff", diff)
+    update_result_metadata(user_id, result_id, {"diff_summary": summary})
+    return diff
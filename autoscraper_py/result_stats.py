@@ -0,0 +1,197 @@
+import re
+import logging
+
+import numpy as np
+
+# Stats payload layout version. Bump when the shape of compute_result_stats()
+# output changes so stale cached documents are recomputed instead of served.
+STATS_VERSION = 2
+
+# Firestore documents are capped at 1 MiB; stats larger than this aren't cached and are
+# recomputed on every request instead (see result_stats_api).
+MAX_STATS_BYTES = 900 * 1024
+
+# Listings whose robust z-score (residual from the price/km fit, scaled by MAD)
+# exceeds this are reported as outliers.
+OUTLIER_Z_THRESHOLD = 3.5
+
+_NUMBER_RE = re.compile(r"[^0-9.\-]")
+
+def _to_float(value):
+    """Converts values like '$25,995', '109,403 km' or 2018 to float, NaN if unparseable."""
+    if value is None:
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    cleaned = _NUMBER_RE.sub("", str(value))
+    if not cleaned:
+        return np.nan
+    try:
+        return float(cleaned)
+    except ValueError:
+        return np.nan
+
+def listings_to_arrays(listings):
+    """
+    Loads the numeric columns of a result's listings into NumPy arrays.
+
+    Args:
+        listings (list): Listing dicts as stored in the result's 'listings' subcollection.
+
+    Returns:
+        tuple: (links, price, km, year) where links is a list and the others are float64
+               arrays of the same length, NaN where the value could not be parsed.
+    """
+    n = len(listings)
+    links = [listing.get("Link", "") for listing in listings]
+    price = np.fromiter((_to_float(l.get("Price")) for l in listings), dtype=np.float64, count=n)
+    km = np.fromiter((_to_float(l.get("Kilometres")) for l in listings), dtype=np.float64, count=n)
+    year = np.fromiter((_to_float(l.get("Year")) for l in listings), dtype=np.float64, count=n)
+    # A price of 0 is AutoTrader's placeholder for "call for price"
+    price[price <= 0] = np.nan
+    km[km < 0] = np.nan
+    return links, price, km, year
+
+def _percentile_rank(values):
+    """Percentile rank (0-100) of each value within the array, NaN entries stay NaN."""
+    ranks = np.full(values.shape, np.nan)
+    valid = ~np.isnan(values)
+    count = int(valid.sum())
+    if count == 0:
+        return ranks
+    if count == 1:
+        ranks[valid] = 100.0
+        return ranks
+    # 'average' style ranking: ties share the mean of their positions
+    sorted_vals = np.sort(values[valid])
+    left = np.searchsorted(sorted_vals, values[valid], side="left")
+    right = np.searchsorted(sorted_vals, values[valid], side="right")
+    ranks[valid] = ((left + right - 1) / 2.0) / (count - 1) * 100.0
+    return ranks
+
+def _rank_list(ranks):
+    """Ranks rounded to 0.1 as a JSON/Firestore friendly list, None where NaN."""
+    return [None if np.isnan(rank) else round(float(rank), 1) for rank in ranks]
+
+def _price_by_year(price, year):
+    """Price distribution (count, min, quartiles, max, mean) for every model year."""
+    valid = ~np.isnan(price) & ~np.isnan(year)
+    if not valid.any():
+        return []
+    p = price[valid]
+    y = year[valid].astype(np.int64)
+    order = np.lexsort((p, y))  # Sort by year, then price within the year
+    p, y = p[order], y[order]
+    years, starts, counts = np.unique(y, return_index=True, return_counts=True)
+    sums = np.add.reduceat(p, starts)
+
+    def at(q):
+        # Linear interpolation on the already sorted per-year slices
+        pos = starts + (counts - 1) * q
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        return p[lo] + (p[hi] - p[lo]) * (pos - lo)
+
+    q1, median, q3 = at(0.25), at(0.5), at(0.75)
+    return [
+        {
+            "year": int(years[i]),
+            "count": int(counts[i]),
+            "min": float(p[starts[i]]),
+            "p25": round(float(q1[i]), 2),
+            "median": round(float(median[i]), 2),
+            "p75": round(float(q3[i]), 2),
+            "max": float(p[starts[i] + counts[i] - 1]),
+            "mean": round(float(sums[i] / counts[i]), 2),
+        }
+        for i in range(len(years))
+    ]
+
+def _depreciation_fit(price, km):
+    """Least-squares fit price = intercept + slope * km. Returns (slope, intercept, mask) or None."""
+    mask = ~np.isnan(price) & ~np.isnan(km)
+    if mask.sum() < 2:
+        return None
+    x, y = km[mask], price[mask]
+    x_mean = x.mean()
+    var = np.square(x - x_mean).sum()
+    if var == 0:
+        return None
+    slope = ((x - x_mean) * (y - y.mean())).sum() / var
+    intercept = y.mean() - slope * x_mean
+    return float(slope), float(intercept), mask
+
+def compute_result_stats(listings):
+    """
+    Computes market analytics for a saved result in a single vectorized pass.
+
+    Args:
+        listings (list): Listing dicts (the 'results' list returned by get_result).
+            The rank lists follow this order, so the stats document stays small (no links as keys).
+
+    Returns:
+        dict: {
+            'version', 'listing_count', 'priced_count',
+            'price_by_year': per-year price distribution,
+            'depreciation': {'slope_per_km', 'per_10000_km', 'intercept'} or None,
+            'percentile_rank': [rank of each listing's price, 0 = cheapest, None if unpriced],
+            'year_percentile_rank': [rank among listings of the same year, None if unranked],
+            'outliers': [{'Link', 'Price', 'expected_price', 'z_score', 'direction'}]
+        }
+    """
+    links, price, km, year = listings_to_arrays(listings)
+
+    stats = {
+        "version": STATS_VERSION,
+        "listing_count": len(links),
+        "priced_count": int((~np.isnan(price)).sum()),
+        "price_by_year": _price_by_year(price, year),
+        "depreciation": None,
+        "percentile_rank": [],
+        "year_percentile_rank": [],
+        "outliers": [],
+    }
+    if not links:
+        return stats
+
+    overall_rank = _percentile_rank(price)
+
+    # Per-year ranks: rank each year group separately (group count is small)
+    year_rank = np.full(price.shape, np.nan)
+    valid_year = ~np.isnan(year)
+    for y in np.unique(year[valid_year]):
+        group = year == y
+        year_rank[group] = _percentile_rank(price[group])
+
+    stats["percentile_rank"] = _rank_list(overall_rank)
+    stats["year_percentile_rank"] = _rank_list(year_rank)
+
+    fit = _depreciation_fit(price, km)
+    if fit is None:
+        return stats
+    slope, intercept, mask = fit
+    stats["depreciation"] = {
+        "slope_per_km": round(slope, 5),
+        "per_10000_km": round(slope * 10000, 2),
+        "intercept": round(intercept, 2),
+    }
+
+    # Outliers: robust z-score of the residual from the price/km fit
+    expected = intercept + slope * km
+    residual = price - expected
+    fitted_residual = residual[mask]
+    mad = np.median(np.abs(fitted_residual - np.median(fitted_residual)))
+    if mad == 0:
+        return stats
+    z = np.full(price.shape, np.nan)
+    z[mask] = 0.6745 * (fitted_residual - np.median(fitted_residual)) / mad
+    for i in np.flatnonzero(np.abs(np.nan_to_num(z)) > OUTLIER_Z_THRESHOLD):
+        stats["outliers"].append({
+            "Link": links[i],
+            "Price": float(price[i]),
+            "expected_price": round(float(expected[i]), 2),
+            "z_score": round(float(z[i]), 2),
+            "direction": "underpriced" if z[i] < 0 else "overpriced",
+        })
+    logging.debug(f"Computed stats for {len(links)} listings ({len(stats['outliers'])} outliers).")
+    return stats
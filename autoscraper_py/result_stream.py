@@ -0,0 +1,135 @@
+import json
+import time
+import logging
+
+from .redis_client import get_redis_client, reset_redis_client
+
+# Accepted listing rows of a running scrape are appended to a Redis stream per task, so the
+# UI can show them before the scrape finishes and the task can assemble its final result.
+RESULT_STREAM_KEY = "task_results:{task_id}"
+RESULT_STREAM_OWNER_KEY = "task_results:{task_id}:owner"
+RESULT_STREAM_TTL = 24 * 3600
+RESULT_BATCH_SIZE = 25
+RESULT_BATCH_INTERVAL = 1.0 # Seconds; a partial batch is published after this long
+
+def open_result_stream(task_id, owner_id):
+    """Records which user may read task_id's stream. Returns False if Redis is unavailable."""
+    client = get_redis_client()
+    if client is None:
+        return False
+    try:
+        client.set(RESULT_STREAM_OWNER_KEY.format(task_id=task_id), owner_id, ex=RESULT_STREAM_TTL)
+        return True
+    except Exception as e:
+        logging.warning(f"Could not open result stream for task {task_id}: {e}")
+        reset_redis_client()
+        return False
+
+def get_result_stream_owner(task_id):
+    client = get_redis_client()
+    if client is None:
+        return None
+    try:
+        return client.get(RESULT_STREAM_OWNER_KEY.format(task_id=task_id))
+    except Exception as e:
+        logging.warning(f"Could not read result stream owner for task {task_id}: {e}")
+        return None
+
+class ResultStreamSink:
+    """
+    Collects accepted rows from process_links_and_update_cache and publishes them in
+    batches to the task's result stream.
+
+    Batches that can't be published (no Redis) are kept in `unpublished`; the caller
+    must pass those on so the final result can still be assembled.
+    """
+
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.key = RESULT_STREAM_KEY.format(task_id=task_id)
+        self.unpublished = []
+        self.published_batches = 0
+        self._batch = []
+        self._last_publish = time.monotonic()
+
+    def add(self, row):
+        self._batch.append(row)
+        if len(self._batch) >= RESULT_BATCH_SIZE or time.monotonic() - self._last_publish >= RESULT_BATCH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        self._last_publish = time.monotonic()
+        client = get_redis_client()
+        if client is not None:
+            try:
+                client.xadd(self.key, {'rows': json.dumps(batch)})
+                client.expire(self.key, RESULT_STREAM_TTL)
+                self.published_batches += 1
+                return
+            except Exception as e:
+                logging.warning(f"Could not publish results for task {self.task_id}: {e}")
+                reset_redis_client()
+        self.unpublished.extend(batch)
+
+def close_result_stream(task_id):
+    """Appends the end-of-results marker that tells readers the scrape has finished."""
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        client.xadd(RESULT_STREAM_KEY.format(task_id=task_id), {'done': '1'})
+        client.expire(RESULT_STREAM_KEY.format(task_id=task_id), RESULT_STREAM_TTL)
+    except Exception as e:
+        logging.warning(f"Could not close result stream for task {task_id}: {e}")
+
+def read_result_stream(task_id, after='0-0', count=None, block_ms=None):
+    """
+    Reads rows published after stream ID `after`.
+
+    Args:
+        task_id (str): Task whose stream to read.
+        after (str): Last stream ID the caller has seen ('0-0' for the beginning).
+        count (int, optional): Maximum number of entries (batches) to read.
+        block_ms (int, optional): Wait up to this long for new entries if there are none.
+
+    Returns:
+        tuple: (rows, last_id, done). last_id is `after` when nothing new was read.
+    """
+    client = get_redis_client()
+    if client is None:
+        return [], after, False
+    key = RESULT_STREAM_KEY.format(task_id=task_id)
+    if block_ms:
+        response = client.xread({key: after}, count=count, block=block_ms)
+        entries = response[0][1] if response else []
+    else:
+        entries = client.xrange(key, min=f"({after}" if after != '0-0' else '-', count=count)
+
+    rows, last_id, done = [], after, False
+    for entry_id, fields in entries:
+        last_id = entry_id
+        if fields.get('done'):
+            done = True
+        elif fields.get('rows'):
+            rows.extend(json.loads(fields['rows']))
+    return rows, last_id, done
+
+def assemble_results(task_id, extra_rows=(), published_batches=0):
+    """
+    Builds the final result list from everything published to the task's stream plus
+    extra_rows (batches that couldn't be published). Rows are de-duplicated by Link,
+    since a resumed task republishes rows it had already accepted.
+    Raises if rows were published but the stream can't be read.
+    """
+    streamed_rows = []
+    if published_batches:
+        if get_redis_client() is None:
+            raise ConnectionError(f"Result stream for task {task_id} is unavailable")
+        streamed_rows, _, _ = read_result_stream(task_id)
+    rows_by_link = {}
+    for row in list(streamed_rows) + list(extra_rows):
+        rows_by_link[row.get('Link')] = row
+    return list(rows_by_link.values())
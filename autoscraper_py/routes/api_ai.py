@@ -1,26 +1,95 @@
 import logging
 import json
 import time
+import hashlib
+import threading
+import concurrent.futures
 import requests
+import httplib2
 from flask import Blueprint, request, jsonify, session, g, current_app
 from ..firebase_config import get_user_settings
-from googleapiclient.discovery import build # Import Google Search library
-from googleapiclient.errors import HttpError # Import HttpError for search retries
+from googleapiclient.errors import HttpError # Import HttpError for search retries (lightweight, no discovery)
 from ..auth_decorator import login_required # Import the updated decorator
 from ..AutoScraperUtil import clean_model_name # Import the cleaning function
+from ..ttl_cache import TTLCache
+from ..services import (
+    get_gemini_model,
+    get_search_service,
+    get_search_engine_id,
+    get_exchange_rate_api_key,
+    get_ai_response_cache_ttl
+)
 
 # Create the blueprint
 api_ai_bp = Blueprint('api_ai', __name__, url_prefix='/api')
 
+# Custom Search fan-out: small bounded pool, one shared retry budget per analysis,
+# a socket timeout per query and an overall deadline for the whole phase
+SEARCH_MAX_WORKERS = 5
+SEARCH_RETRY_BUDGET = 6
+SEARCH_QUERY_TIMEOUT = 10
+SEARCH_PHASE_TIMEOUT = 20
+
+# Web search context per (year, make, model); reviews/recalls change slowly. A context with
+# failed or unfinished queries is only kept briefly, so the next analysis soon retries them.
+SEARCH_CONTEXT_CACHE_TTL = 24 * 3600
+SEARCH_CONTEXT_PARTIAL_TTL = 10 * 60
+search_context_cache = TTLCache('search_context', SEARCH_CONTEXT_CACHE_TTL)
+# CAD rate table; the API updates daily. Entries are served up to the TTL and
+# refreshed in the background once older than EXCHANGE_RATE_REFRESH_AFTER.
+EXCHANGE_RATE_CACHE_TTL = 24 * 3600
+EXCHANGE_RATE_REFRESH_AFTER = 6 * 3600
+exchange_rate_cache = TTLCache('exchange_rates', EXCHANGE_RATE_CACHE_TTL)
+# Gemini answers keyed by prompt hash; TTL comes from AI_RESPONSE_CACHE_TTL in config.json (0 = disabled)
+ai_response_cache = TTLCache('ai_response', 0)
+
 # No placeholder decorator needed anymore
 
 # --- Helper Function ---
 # This function uses external libraries (requests) and config (api_key).
 # It's okay here for now, but could be moved to a 'utils.py' or similar.
 def get_exchange_rates(api_key):
+    """
+    Returns the CAD exchange rate table from exchange_rate_cache, shared by all processes.
+
+    The table is fetched synchronously only when nothing is cached. Once an entry is older
+    than EXCHANGE_RATE_REFRESH_AFTER it is still served while one background thread
+    (one per fleet, guarded by a cache lock) fetches a fresh copy.
+    """
     if not api_key:
         logging.warning("Exchange Rate API key not configured.")
         return None
+
+    cached = exchange_rate_cache.get('CAD')
+    if cached:
+        if time.time() - cached.get('fetched_at', 0) > EXCHANGE_RATE_REFRESH_AFTER:
+            _refresh_exchange_rates_in_background(api_key)
+        return cached.get('rates')
+
+    return _refresh_exchange_rates(api_key)
+
+def _refresh_exchange_rates(api_key):
+    """Fetches the rate table and stores it in the cache. Returns the rates or None."""
+    rates = _fetch_exchange_rates(api_key)
+    if rates:
+        exchange_rate_cache.set('CAD', {'rates': rates, 'fetched_at': time.time()})
+    return rates
+
+def _refresh_exchange_rates_in_background(api_key):
+    # The lock entry expires on its own, so a crashed refresher can't block refreshes for long
+    if not exchange_rate_cache.add('CAD:refreshing', True, ttl=60):
+        return
+
+    def refresh():
+        try:
+            if _refresh_exchange_rates(api_key):
+                logging.info("Refreshed cached exchange rates in the background.")
+        finally:
+            exchange_rate_cache.delete('CAD:refreshing')
+
+    threading.Thread(target=refresh, name='exchange-rate-refresh', daemon=True).start()
+
+def _fetch_exchange_rates(api_key):
     url = f"https://v6.exchangerate-api.com/v6/{api_key}/latest/CAD"
     try:
         response = requests.get(url, timeout=10)
@@ -46,6 +115,146 @@ def get_exchange_rates(api_key):
     except Exception as e:
         logging.error(f"Unexpected error getting exchange rates: {e}")
         return None
+
+class _RetryBudget:
+    """Retry allowance shared by all queries of one analysis, so an upstream outage can't multiply into 25x retries."""
+    def __init__(self, retries):
+        self._remaining = retries
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            if self._remaining <= 0:
+                return False
+            self._remaining -= 1
+            return True
+
+def _search_context_key(year, make, model):
+    """Cache key for the web search context; the queries only depend on year/make/model."""
+    return f"{str(year).strip()}|{str(make).strip().lower()}|{str(model).strip().lower()}"
+
+def build_search_summary(search_service, search_engine_id, year, make, model):
+    """
+    Runs the Custom Search queries for a car concurrently (SEARCH_MAX_WORKERS at a time)
+    and assembles the prompt context in the original query order.
+
+    Returns:
+        tuple: (search_summary, found_any, failed) where found_any is False if no query returned items
+               and failed counts the queries that errored, ran out of retries or missed SEARCH_PHASE_TIMEOUT
+               (as opposed to ones that completed with no results).
+    """
+    queries = [
+        f'"{year} {make} {model}" reliability rating', f'"{year} {make} {model}" common problems',
+        f'"{year} {make} {model}" long term reliability', f'"{year} {make} {model}" maintenance costs',
+        f'"{year} {make} {model}" repair costs', f'"{year} {make} {model}" expert review',
+        f'"{year} {make} {model}" owner reviews', f'"{year} {make} {model}" pros and cons',
+        f'"{year} {make} {model}" vs competitor cars', f'"{year} {make} {model}" is it a good car to buy',
+        f'"{year} {make} {model}" owners forum', f'"{year} {make} {model}" reddit reviews',
+        f'"{year} {make} {model}" online community feedback', f'"{make} {model}" recalls and TSBs',
+        f'"{year} {make} {model}" fuel economy MPG', f'"{year} {make} {model}" safety ratings',
+        f'"{year} {make} {model}" cargo space', f'"{year} {make} {model}" warranty details',
+        f'"{year} {make} {model}" fair market price', f'"{year} {make} {model}" used car value',
+        f'"{year} {make} {model}" lease or buy deals', f'"{year} {make} {model}" incentives rebates',
+        f'"{year} {make} {model}" best time to buy', f'"{year} {make} {model}" owner satisfaction',
+        f'"{year} {make} {model}" things to know before buying',
+    ]
+    num_results_per_query = 10
+    max_search_retries = 3
+    initial_search_delay = 0.5
+
+    # Each query runs on a pool thread with its own httplib2.Http: the shared
+    # service object's transport is not thread-safe.
+    thread_local = threading.local()
+    retry_budget = _RetryBudget(SEARCH_RETRY_BUDGET)
+
+    def run_query(query):
+        if not hasattr(thread_local, 'http'):
+            thread_local.http = httplib2.Http(timeout=SEARCH_QUERY_TIMEOUT)
+        logging.info(f"Performing web search: {query}")
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = search_service.cse().list(
+                    q=query, cx=search_engine_id, num=num_results_per_query
+                ).execute(http=thread_local.http)
+                return result.get('items', [])
+            except HttpError as e:
+                logging.warning(f"Search attempt {attempt} failed for query '{query}': {e}")
+                if e.resp.status in [429, 500, 503] and attempt < max_search_retries and retry_budget.take():
+                    delay = initial_search_delay * (2 ** (attempt - 1))
+                    logging.info(f"Retrying in {delay:.2f} seconds...")
+                    time.sleep(delay)
+                else:
+                    logging.error(f"Search failed permanently for query '{query}' after {attempt} attempts.")
+                    return None
+            except Exception as e:
+                logging.error(f"Unexpected error during search for query '{query}': {e}")
+                return None
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS)
+    try:
+        futures = [executor.submit(run_query, query) for query in queries]
+        concurrent.futures.wait(futures, timeout=SEARCH_PHASE_TIMEOUT)
+    finally:
+        # Don't hold the request thread for stragglers; they finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # Assemble in the original query order regardless of completion order
+    search_results_text = []
+    found_any = False
+    failed = 0
+    for query, future in zip(queries, futures):
+        items = None
+        if future.done() and not future.cancelled():
+            items = future.result()
+        else:
+            logging.warning(f"Search for query '{query}' did not finish within {SEARCH_PHASE_TIMEOUT}s.")
+
+        if items is None:
+            failed += 1
+            search_results_text.append(f"Search failed for '{query}'.")
+        elif items:
+            found_any = True
+            search_results_text.append(f"Search results for '{query}':")
+            for item in items:
+                title = item.get('title')
+                link = item.get('link')
+                snippet = item.get('snippet', '').replace('\n', ' ')
+                search_results_text.append(f"- {title} ({link}): {snippet}")
+        else:
+             search_results_text.append(f"No significant results found for '{query}'.")
+        search_results_text.append("\n")
+
+    return "\n".join(search_results_text), found_any, failed
+
+def get_search_summary(search_service, search_engine_id, year, make, model):
+    """
+    Returns the web search context for (year, make, model), served from
+    search_context_cache when possible so repeat analyses skip the Custom Search calls.
+    """
+    if not (search_service and search_engine_id):
+        return "Web search is not configured or enabled on the server."
+
+    cache_key = _search_context_key(year, make, model)
+    cached_summary = search_context_cache.get(cache_key)
+    if cached_summary is not None:
+        logging.info(f"Using cached web search context for {year} {make} {model}")
+        return cached_summary
+
+    try:
+        search_summary, found_any, failed = build_search_summary(search_service, search_engine_id, year, make, model)
+    except Exception as e:
+        logging.error(f"Error during web search setup or processing: {e}", exc_info=True)
+        return "Error occurred during web search processing."
+
+    # Don't pin a fully failed search (quota exhausted, outage) in the cache, and keep a
+    # partly failed one only briefly
+    if found_any:
+        if failed:
+            logging.warning(f"{failed} web searches failed for {year} {make} {model}; caching the context for {SEARCH_CONTEXT_PARTIAL_TTL}s only")
+        search_context_cache.set(cache_key, search_summary, ttl=SEARCH_CONTEXT_PARTIAL_TTL if failed else SEARCH_CONTEXT_CACHE_TTL)
+    return search_summary
 # --- End Helper Function ---
 
 
@@ -60,12 +269,12 @@ def analyze_car_api():
         logging.warning(f"User {user_id} denied AI analysis access.")
         return jsonify({"success": False, "error": "AI analysis access denied for this user."}), 403
 
-    # Access shared services/config from current_app context
-    # These need to be attached to the app object during initialization in app.py
-    gemini_model = getattr(current_app, 'gemini_model', None)
-    search_service = getattr(current_app, 'search_service', None)
-    search_engine_id = getattr(current_app, 'SEARCH_ENGINE_ID', None)
-    exchange_rate_api_key = getattr(current_app, 'EXCHANGE_RATE_API_KEY', None)
+    # Shared services/config are created lazily on first use (see services.py)
+    gemini_model = get_gemini_model()
+    search_service = get_search_service()
+    search_engine_id = get_search_engine_id()
+    exchange_rate_api_key = get_exchange_rate_api_key()
+    ai_response_cache_ttl = get_ai_response_cache_ttl()
 
     if not gemini_model:
         return jsonify({"success": False, "error": "AI Model not configured on the server."}), 500
@@ -96,70 +305,7 @@ def analyze_car_api():
     if not make or not model or not year:
         return jsonify({"success": False, "error": "Make, Model, and Year are required for analysis."}), 400
 
-    search_summary = ""
-    if search_service and search_engine_id:
-        try:
-            queries = [
-                f'"{year} {make} {model}" reliability rating', f'"{year} {make} {model}" common problems',
-                f'"{year} {make} {model}" long term reliability', f'"{year} {make} {model}" maintenance costs',
-                f'"{year} {make} {model}" repair costs', f'"{year} {make} {model}" expert review',
-                f'"{year} {make} {model}" owner reviews', f'"{year} {make} {model}" pros and cons',
-                f'"{year} {make} {model}" vs competitor cars', f'"{year} {make} {model}" is it a good car to buy',
-                f'"{year} {make} {model}" owners forum', f'"{year} {make} {model}" reddit reviews',
-                f'"{year} {make} {model}" online community feedback', f'"{make} {model}" recalls and TSBs',
-                f'"{year} {make} {model}" fuel economy MPG', f'"{year} {make} {model}" safety ratings',
-                f'"{year} {make} {model}" cargo space', f'"{year} {make} {model}" warranty details',
-                f'"{year} {make} {model}" fair market price', f'"{year} {make} {model}" used car value',
-                f'"{year} {make} {model}" lease or buy deals', f'"{year} {make} {model}" incentives rebates',
-                f'"{year} {make} {model}" best time to buy', f'"{year} {make} {model}" owner satisfaction',
-                f'"{year} {make} {model}" things to know before buying',
-            ]
-            search_results_text = []
-            num_results_per_query = 10
-            max_search_retries = 3
-            initial_search_delay = 0.5
-
-            for query in queries:
-                logging.info(f"Performing web search: {query}")
-                items = []
-                for attempt in range(max_search_retries):
-                    try:
-                        result = search_service.cse().list(
-                            q=query, cx=search_engine_id, num=num_results_per_query
-                        ).execute()
-                        items = result.get('items', [])
-                        break
-                    except HttpError as e:
-                        logging.warning(f"Search attempt {attempt + 1} failed for query '{query}': {e}")
-                        if e.resp.status in [429, 500, 503] and attempt < max_search_retries - 1:
-                            delay = initial_search_delay * (2 ** attempt)
-                            logging.info(f"Retrying in {delay:.2f} seconds...")
-                            time.sleep(delay)
-                        else:
-                            logging.error(f"Search failed permanently for query '{query}' after {attempt + 1} attempts.")
-                            break
-                    except Exception as e:
-                         logging.error(f"Unexpected error during search for query '{query}': {e}")
-                         break
-
-                if items:
-                    search_results_text.append(f"Search results for '{query}':")
-                    for item in items:
-                        title = item.get('title')
-                        link = item.get('link')
-                        snippet = item.get('snippet', '').replace('\n', ' ')
-                        search_results_text.append(f"- {title} ({link}): {snippet}")
-                else:
-                     search_results_text.append(f"No significant results found for '{query}' (or search failed).")
-                search_results_text.append("\n")
-
-            search_summary = "\n".join(search_results_text)
-
-        except Exception as e:
-            logging.error(f"Error during web search setup or processing: {e}", exc_info=True)
-            search_summary = "Error occurred during web search processing."
-    else:
-        search_summary = "Web search is not configured or enabled on the server."
+    search_summary = get_search_summary(search_service, search_engine_id, year, make, model)
 
     # Get current exchange rates
     rates = get_exchange_rates(exchange_rate_api_key) # Use key from app context
@@ -211,11 +357,20 @@ Based on ALL the information provided (car details, price, mileage, web context,
 Format the response clearly using headings (like **Reliability Summary**, **Price Analysis**, **Negotiation Tips**) and bullet points. Be objective and base the analysis ONLY on the provided information. If context is missing or contradictory, state that.
 """
 
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    if ai_response_cache_ttl:
+        cached_summary = ai_response_cache.get(prompt_hash)
+        if cached_summary is not None:
+            logging.info(f"Serving cached AI analysis for {year} {make} {model} to user {user_id}")
+            return jsonify({"success": True, "summary": cached_summary, "cached": True})
+
     try:
         logging.info(f"Sending AI analysis request for {year} {make} {model} for user {user_id}")
         response = gemini_model.generate_content(prompt)
         ai_summary = response.text
         logging.info(f"Received AI analysis response for user {user_id}")
+        if ai_response_cache_ttl:
+            ai_response_cache.set(prompt_hash, ai_summary, ttl=ai_response_cache_ttl)
         return jsonify({"success": True, "summary": ai_summary})
 
     except Exception as e:
@@ -77,7 +77,9 @@ def list_payloads_api(): # Renamed function
 
             formatted_payloads.append({
                 "name": formatted_name,
-                "id": payload_data['id'] # Pass the document ID
+                "id": payload_data['id'], # Pass the document ID
+                "auto_refresh": bool(payload.get('auto_refresh')),
+                "last_refreshed_at": payload.get('last_refreshed_at')
             })
 
         return jsonify({"success": True, "payloads": formatted_payloads})
@@ -158,6 +160,33 @@ def rename_payload_api():
         print(f"Error renaming payload {payload_id}: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@api_payloads_bp.route('/payload_auto_refresh', methods=['POST'])
+@login_required # Apply actual decorator
+def payload_auto_refresh_api():
+    """
+    Opts a saved payload in or out of the scheduled refresh (tasks.schedule_saved_search_refresh).
+    Each refresh is charged like a manual search of the same size.
+    """
+    payload_id = request.json.get('payload_id')
+    enabled = request.json.get('enabled')
+    user_id = session.get('user_id')
+
+    if not payload_id or not isinstance(enabled, bool):
+        return jsonify({"success": False, "error": "Missing payload ID or enabled flag"}), 400
+
+    try:
+        if get_payload(user_id, payload_id) is None:
+            return jsonify({"success": False, "error": "Payload not found"}), 404
+
+        result = update_payload(user_id, payload_id, {'auto_refresh': enabled})
+        if result.get('success'):
+            return jsonify({"success": True, "auto_refresh": enabled})
+        else:
+            return jsonify({"success": False, "error": result.get('error', 'Failed to update payload')}), 500
+    except Exception as e:
+        print(f"Error updating auto refresh for payload {payload_id}: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @api_payloads_bp.route('/delete_payload', methods=['POST'])
 @login_required # Apply actual decorator
 def delete_payload_api():
@@ -1,29 +1,80 @@
 import os
 import csv
+import json
 import time
+import uuid
 import logging
 from flask import Blueprint, request, jsonify, session, g, current_app
+from celery.exceptions import TimeoutError as CeleryTimeoutError
 # Import transform_strings as well
-from ..AutoScraperUtil import format_time_ymd_hms, showcarsmain, clean_model_name, transform_strings
-# Import the new processing function and necessary constants from AutoScraper
-from ..AutoScraper import fetch_autotrader_data # Keep fetch_autotrader_data for initial fetch
+from ..AutoScraperUtil import format_time_ymd_hms, showcarsmain, clean_model_name, transform_strings, payload_key
 # Remove process_links_and_update_cache import as it's now called within the task
 from ..firebase_config import (
     get_user_results,     # Add back for /list_results
     get_result,           # Add back for /get_result
     delete_result,        # Add back for /delete_result
+    get_result_stats,     # Cached market stats for /result_stats
+    save_result_stats,
+    delete_result_stats,
+    get_result_analytics, # Stored diffs for /result_diff
     # Keep update_user_settings if used elsewhere in this file, otherwise remove
     # Remove deduct_search_tokens as it's called within the task
     get_firestore_db      # Keep if needed for direct listing deletion or other routes in this file
 )
 from ..auth_decorator import login_required # Import the updated decorator
-from ..tasks import scrape_and_process_task # Import the Celery task
+from ..result_stats import compute_result_stats, STATS_VERSION, MAX_STATS_BYTES
+from ..result_diff import update_result_diff, DIFF_VERSION
+from ..tasks import scrape_and_process_task, scrape_batch_task, fetch_quote_task, required_tokens_for # Import the Celery tasks
+from ..search_quote import get_cached_quote, pending_quotes, QUOTE_WAIT_TIMEOUT, QUOTE_TIME_LIMIT
+from ..scrape_batch import MAX_BATCH_SEARCHES
+from ..cache_warming import record_search
+from ..scrape_scheduling import scrape_queue_for, acquire_scrape_slot, release_scrape_slot, MAX_ACTIVE_SCRAPES_PER_USER
+from ..profiling import PhaseTimer
 
 # Create the blueprint
 api_results_bp = Blueprint('api_results', __name__, url_prefix='/api')
 
 # No placeholder decorator needed anymore
 
+def _start_quote(payload):
+    """
+    The search's quote (estimated_count, max_page, page-0 results) from the quote cache, or the
+    fetch_quote_task probing it. A probe of the same search that is already running is joined,
+    not repeated.
+
+    Returns:
+        tuple: (cached quote, None) or (None, AsyncResult of the probe)
+    """
+    quote = get_cached_quote(payload)
+    if quote is not None:
+        return quote, None
+    key = payload_key(payload)
+    task_id = str(uuid.uuid4())
+    running_id = None if pending_quotes.add(key, task_id) else pending_quotes.get(key)
+    if running_id:
+        return None, fetch_quote_task.AsyncResult(running_id)
+    try:
+        return None, fetch_quote_task.apply_async(args=[payload], task_id=task_id, expires=QUOTE_TIME_LIMIT)
+    except Exception:
+        pending_quotes.delete(key) # Never sent; later requests must not wait on it
+        raise
+
+def _search_quote(payload):
+    """
+    _start_quote, waiting for the probe if there is one.
+
+    Returns:
+        tuple: (quote dict, True if it came from the cache)
+
+    Raises:
+        celery.exceptions.TimeoutError: The probe took longer than QUOTE_WAIT_TIMEOUT. It keeps
+            running and caches its quote, so a retry of the request is answered from the cache.
+    """
+    quote, probe = _start_quote(payload)
+    if probe is None:
+        return quote, True
+    return probe.get(timeout=QUOTE_WAIT_TIMEOUT), False
+
 @api_results_bp.route('/fetch_data', methods=['POST'])
 @login_required # Apply actual decorator (it populates g)
 def fetch_data_api():
@@ -39,18 +90,31 @@ def fetch_data_api():
         user_settings = g.user_settings
         current_tokens = user_settings.get('search_tokens', 0)
 
-        # 2. Perform initial fetch to get estimated count
-        initial_scrape_data = fetch_autotrader_data(payload, initial_fetch_only=True)
+        # 2. Get the quote (estimated count and page 0) from the cache or a probe on the quote queue
+        phase_timer = PhaseTimer() # Continued by the task, which stores the timings with the result
+        try:
+            with phase_timer.phase("initial_fetch", cpu_clock=time.thread_time): # Other requests share this process
+                initial_scrape_data, cached = _search_quote(payload)
+        except CeleryTimeoutError:
+            logging.warning(f"Quote for user {user_id} not ready within {QUOTE_WAIT_TIMEOUT}s.")
+            return jsonify({
+                "success": False,
+                "error": "AutoTrader is slow to respond. Your search is still being checked; please try again in a moment."
+            }), 504
         if not isinstance(initial_scrape_data, dict):
              logging.error(f"Initial fetch did not return expected dictionary. Got: {initial_scrape_data}")
              return jsonify({"success": False, "error": "Initial data fetch failed unexpectedly."}), 500
+        phase_timer.merge(initial_scrape_data.pop('timings', None)) # The probe's parse time, when it just ran
+        initial_scrape_data['timings'] = phase_timer.as_dict()
+        if cached:
+            logging.info(f"Using cached quote for user {user_id}'s search.")
 
         estimated_count = initial_scrape_data.get('estimated_count', 0)
         initial_results_html = initial_scrape_data.get('initial_results_html', [])
         max_page = initial_scrape_data.get('max_page', 1)
 
         # 3. Calculate required tokens
-        required_tokens = round(max(estimated_count / 100.0, 0.1), 1) if estimated_count > 0 else 0
+        required_tokens = required_tokens_for(estimated_count)
         print(f"Estimated count: {estimated_count}, Required tokens: {required_tokens}")
 
 
@@ -62,18 +126,37 @@ def fetch_data_api():
                 "error": f"Insufficient tokens. This search requires {required_tokens} tokens ({estimated_count} listings found), but you only have {current_tokens}."
             }), 402 # Payment Required
 
-        # 5. If enough tokens, launch the background task
-        logging.info(f"User {user_id} has sufficient tokens ({current_tokens} >= {required_tokens}). Launching background task.")
+        # 5. Enforce the per-user concurrency cap (the slot is released when the task finishes)
+        task_id = str(uuid.uuid4())
+        if not acquire_scrape_slot(user_id, task_id):
+            logging.info(f"User {user_id} already has {MAX_ACTIVE_SCRAPES_PER_USER} searches running.")
+            return jsonify({
+                "success": False,
+                "error": f"You already have {MAX_ACTIVE_SCRAPES_PER_USER} searches running. Please wait for one to finish."
+            }), 429
+
+        # 6. If enough tokens, launch the background task on the queue matching its size
+        queue = scrape_queue_for(estimated_count)
+        logging.info(f"User {user_id} has sufficient tokens ({current_tokens} >= {required_tokens}). Launching background task on '{queue}'.")
 
         # Pass the necessary data to the task, including the initial scrape results
-        task = scrape_and_process_task.delay(
-            payload=payload,
-            user_id=user_id,
-            required_tokens=required_tokens,
-            initial_scrape_data=initial_scrape_data # Pass the dict containing initial results and max_page
-        )
+        try:
+            task = scrape_and_process_task.apply_async(
+                kwargs={
+                    'payload': payload,
+                    'user_id': user_id,
+                    'required_tokens': required_tokens,
+                    'initial_scrape_data': initial_scrape_data # Pass the dict containing initial results and max_page
+                },
+                task_id=task_id,
+                queue=queue
+            )
+        except Exception:
+            release_scrape_slot(task_id)
+            raise
 
         logging.info(f"Launched Celery task {task.id} for user {user_id}")
+        record_search(payload) # Popular searches are pre-fetched off-peak (cache_warming.py)
 
         # Return the task ID to the client immediately
         return jsonify({"success": True, "task_id": task.id})
@@ -83,6 +166,78 @@ def fetch_data_api():
         return jsonify({"success": False, "error": f"An unexpected error occurred: {str(e)}"}), 500
 
 
+@api_results_bp.route('/fetch_data_batch', methods=['POST'])
+@login_required
+def fetch_data_batch_api():
+    """
+    Starts several related searches (e.g. trims or neighbouring year ranges) as one task that fetches
+    each listing they share only once. Expects {"payloads": [payload, ...]}; tokens are checked and
+    charged per search as for /fetch_data, and one concurrency slot is used for the whole batch.
+    """
+    payloads = request.json.get('payloads')
+    user_id = g.user_id
+
+    if not isinstance(payloads, list) or not payloads or not all(isinstance(payload, dict) and payload for payload in payloads):
+        return jsonify({"success": False, "error": "Provide a non-empty list of payloads"}), 400
+    if len(payloads) > MAX_BATCH_SEARCHES:
+        return jsonify({"success": False, "error": f"A batch can contain at most {MAX_BATCH_SEARCHES} searches"}), 400
+
+    try:
+        current_tokens = g.user_settings.get('search_tokens', 0)
+
+        # 1. Quotes for all searches: probes run concurrently, sharing one wait budget
+        started = [_start_quote(payload) for payload in payloads]
+        deadline = time.monotonic() + QUOTE_WAIT_TIMEOUT
+        try:
+            quotes = [quote if probe is None else probe.get(timeout=max(deadline - time.monotonic(), 0.1))
+                      for quote, probe in started]
+        except CeleryTimeoutError:
+            logging.warning(f"Batch quotes for user {user_id} not ready within {QUOTE_WAIT_TIMEOUT}s.")
+            return jsonify({
+                "success": False,
+                "error": "AutoTrader is slow to respond. Your searches are still being checked; please try again in a moment."
+            }), 504
+        for quote in quotes:
+            quote.pop('timings', None)
+
+        # 2. Tokens for the whole batch
+        required_tokens = [required_tokens_for(quote.get('estimated_count', 0)) for quote in quotes]
+        total_tokens = round(sum(required_tokens), 1)
+        estimated_total = sum(quote.get('estimated_count', 0) for quote in quotes)
+        if current_tokens < total_tokens:
+            return jsonify({
+                "success": False,
+                "error": f"Insufficient tokens. These searches require {total_tokens} tokens ({estimated_total} listings found), but you only have {current_tokens}."
+            }), 402
+
+        # 3. One concurrency slot and one task for the batch
+        task_id = str(uuid.uuid4())
+        if not acquire_scrape_slot(user_id, task_id):
+            return jsonify({
+                "success": False,
+                "error": f"You already have {MAX_ACTIVE_SCRAPES_PER_USER} searches running. Please wait for one to finish."
+            }), 429
+        queue = scrape_queue_for(estimated_total)
+        try:
+            task = scrape_batch_task.apply_async(
+                kwargs={'payloads': payloads, 'user_id': user_id, 'required_tokens': required_tokens, 'initial_scrape_data': quotes},
+                task_id=task_id,
+                queue=queue
+            )
+        except Exception:
+            release_scrape_slot(task_id)
+            raise
+
+        logging.info(f"Launched batch task {task.id} ({len(payloads)} searches) for user {user_id} on '{queue}'.")
+        for payload in payloads:
+            record_search(payload)
+        return jsonify({"success": True, "task_id": task.id, "searches": len(payloads), "tokens_required": total_tokens})
+
+    except Exception as e:
+        logging.error(f"Error in fetch_data_batch_api: {e}", exc_info=True)
+        return jsonify({"success": False, "error": f"An unexpected error occurred: {str(e)}"}), 500
+
+
 @api_results_bp.route('/open_links', methods=['POST'])
 @login_required # Apply actual decorator
 def open_links_api():
@@ -136,6 +291,73 @@ def get_result_api():
         logging.error(f"Error getting result {result_id} for user {user_id}: {e}", exc_info=True)
         return jsonify({"success": False, "error": str(e)}), 500
 
+@api_results_bp.route('/result_stats/<result_id>')
+@login_required # Apply actual decorator
+def result_stats_api(result_id):
+    """
+    Market analytics for a saved result: price distribution by year, price-per-km
+    depreciation slope, per-listing percentile rank (lists in the order of the result's listings) and outliers.
+    Computed once with NumPy and cached alongside the result; pass ?refresh=true to recompute.
+    """
+    user_id = session.get('user_id')
+    refresh = request.args.get('refresh', 'false').lower() == 'true'
+
+    try:
+        if not refresh:
+            cached_stats = get_result_stats(user_id, result_id)
+            if cached_stats and cached_stats.get('version') == STATS_VERSION:
+                cached_stats.pop('computed_at', None) # Firestore timestamp, not JSON serializable
+                return jsonify({"success": True, "stats": cached_stats, "cached": True})
+
+        result = get_result(user_id, result_id)
+        if result is None:
+            return jsonify({"success": False, "error": "Result not found"}), 404
+
+        start = time.time()
+        stats = compute_result_stats(result.get('results', []))
+        logging.info(f"Computed stats for result {result_id} ({stats['listing_count']} listings) in {time.time() - start:.3f}s")
+
+        if len(json.dumps(stats)) > MAX_STATS_BYTES:
+            logging.info(f"Stats for result {result_id} are too large to cache; they will be recomputed when requested.")
+        else:
+            save_status = save_result_stats(user_id, result_id, stats)
+            if not save_status.get('success'):
+                # Still return the stats, they just get recomputed next time
+                logging.warning(f"Could not cache stats for result {result_id}: {save_status.get('error')}")
+
+        return jsonify({"success": True, "stats": stats, "cached": False})
+    except Exception as e:
+        logging.error(f"Error computing stats for result {result_id} for user {user_id}: {e}", exc_info=True)
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@api_results_bp.route('/result_diff/<result_id>')
+@login_required # Apply actual decorator
+def result_diff_api(result_id):
+    """
+    Changes since the previous run of the same search: new and removed listings, price and
+    mileage changes. Stored when the result is saved; results saved before diffs existed
+    get it computed (and stored) on first request.
+    """
+    user_id = session.get('user_id')
+
+    try:
+        diff = get_result_analytics(user_id, result_id, 'diff')
+        if diff and diff.get('version') == DIFF_VERSION:
+            diff.pop('computed_at', None) # Firestore timestamp, not JSON serializable
+            return jsonify({"success": True, "diff": diff})
+
+        result = get_result(user_id, result_id)
+        if result is None:
+            return jsonify({"success": False, "error": "Result not found"}), 404
+        key = result.get('metadata', {}).get('payload_key')
+        diff = update_result_diff(user_id, result_id, key, result.get('results', [])) if key else None
+        if diff is None:
+            return jsonify({"success": True, "diff": None}) # First run of this search, nothing to compare
+        return jsonify({"success": True, "diff": diff})
+    except Exception as e:
+        logging.error(f"Error loading diff for result {result_id} for user {user_id}: {e}", exc_info=True)
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @api_results_bp.route('/delete_result', methods=['POST'])
 @login_required # Apply actual decorator
 def delete_result_api():
@@ -192,6 +414,7 @@ def delete_listing_from_result_api():
         if doc_to_delete:
             # Delete the specific listing document
             doc_to_delete.reference.delete()
+            delete_result_stats(user_id, result_id) # Cached stats no longer match the listings
             logging.info(f"Deleted listing document {doc_to_delete.id} (Link: {link_to_delete}) from result '{result_id}' for user '{user_id}'.")
             # Optional: Decrement count in parent doc? For now, skip for performance.
             # parent_doc_ref = db.collection('users').document(user_id).collection('results').document(result_id)
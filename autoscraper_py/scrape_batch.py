@@ -0,0 +1,45 @@
+from .AutoScraperUtil import filter_dicts, transform_strings
+
+# Related searches submitted together (/api/fetch_data_batch, scrape_batch_task) share their
+# detail fetches: the search pages of every search are fetched, the listing links are unioned,
+# each listing is fetched once, and the rows are split back per search with its own exclusions.
+MAX_BATCH_SEARCHES = 10
+
+def merge_search_links(results_per_search):
+    """
+    Unions the listings found by several searches.
+
+    Args:
+        results_per_search (list): One list of listing dicts ({'link', ...}) per search.
+
+    Returns:
+        tuple: (unique listing dicts in first-seen order, list of each search's links)
+    """
+    unique = {}
+    links_per_search = []
+    for results in results_per_search:
+        links = []
+        for item in results:
+            link = item.get("link")
+            if not link:
+                continue
+            unique.setdefault(link, item)
+            links.append(link)
+        links_per_search.append(list(dict.fromkeys(links)))
+    return list(unique.values()), links_per_search
+
+def split_batch_rows(rows, links_per_search, exclusions_per_search):
+    """
+    Splits the detail rows of a merged fetch back into per-search results.
+
+    Args:
+        rows (list): Detail rows (dicts with 'Link') for the unique listings; failed fetches are missing.
+        links_per_search (list): Each search's links, from merge_search_links.
+        exclusions_per_search (list): Each search's raw Exclusions.
+
+    Returns:
+        list: One list of rows per search, in the search's listing order, without its excluded rows.
+    """
+    rows_by_link = {row.get("Link"): row for row in rows}
+    return [filter_dicts([rows_by_link[link] for link in links if link in rows_by_link], transform_strings(exclusions or []))
+            for links, exclusions in zip(links_per_search, exclusions_per_search)]
@@ -0,0 +1,96 @@
+import time
+import logging
+
+from .ttl_cache import TTLCache
+
+# How long an unfinished scrape can be resumed, and how often progress is persisted
+CHECKPOINT_TTL = 48 * 3600
+CHECKPOINT_FLUSH_INTERVAL = 5 # Seconds between writes while a scrape is running
+
+checkpoint_cache = TTLCache('scrape_checkpoint', CHECKPOINT_TTL)
+
+class ScrapeCheckpoint:
+    """
+    Progress of one scrape task, persisted to Redis (or disk) so a retried or
+    redelivered task can skip work that already finished.
+
+    Records completed search pages with their parsed listings, fetched detail rows
+    (including excluded ones, so they aren't fetched again), the saved result document and
+    the token deduction as soon as each happens, and finally the task result.
+
+    Writes are coalesced to at most one every CHECKPOINT_FLUSH_INTERVAL seconds;
+    call flush() when a stage finishes.
+    """
+
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self._last_flush = 0.0
+        self._dirty = False
+        self.state = checkpoint_cache.get(task_id) or {'pages': {}, 'rows': {}, 'saved': None, 'charge': None, 'result': None}
+        if self.state['pages'] or self.state['rows']:
+            logging.info(f"Resuming task {task_id} from checkpoint: {len(self.state['pages'])} pages, {len(self.state['rows'])} detail rows.")
+
+    @property
+    def result(self):
+        return self.state.get('result')
+
+    def completed_pages(self):
+        """Returns {page_number: parsed_listings} for search pages already fetched."""
+        return {int(page): results for page, results in self.state['pages'].items()}
+
+    def record_page(self, page, results):
+        self.state['pages'][str(page)] = results
+        self._changed()
+
+    def fetched_row(self, link):
+        """Returns (row_dict, kept) for a detail page fetched earlier, or None."""
+        entry = self.state['rows'].get(link)
+        return (entry['row'], entry['kept']) if entry else None
+
+    def record_row(self, link, row, kept):
+        self.state['rows'][link] = {'row': row, 'kept': kept}
+        self._changed()
+
+    @property
+    def saved(self):
+        """{'doc_id', 'file_path'} once the results were saved, else None."""
+        return self.state.get('saved')
+
+    def record_saved(self, doc_id, file_path):
+        """Stores the saved result document right away, so a retry doesn't save a second copy."""
+        self.state['saved'] = {'doc_id': doc_id, 'file_path': file_path}
+        self._dirty = True
+        self.flush()
+
+    @property
+    def charge(self):
+        """The deduct_search_tokens result once tokens were deducted, else None."""
+        return self.state.get('charge')
+
+    def record_charge(self, deduct_result):
+        """Stores the token deduction right away, so a retry doesn't charge the user again."""
+        self.state['charge'] = deduct_result
+        self._dirty = True
+        self.flush()
+
+    def record_result(self, result):
+        """Stores the final task result; a redelivered task returns it instead of charging again."""
+        # Pages/rows aren't needed once the result exists; keep the entry small
+        self.state = {'pages': {}, 'rows': {}, 'saved': self.saved, 'charge': self.charge, 'result': result}
+        self._dirty = True
+        self.flush()
+
+    def _changed(self):
+        self._dirty = True
+        if time.time() - self._last_flush >= CHECKPOINT_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if not self._dirty:
+            return
+        checkpoint_cache.set(self.task_id, self.state)
+        self._last_flush = time.time()
+        self._dirty = False
+
+    def clear(self):
+        checkpoint_cache.delete(self.task_id)
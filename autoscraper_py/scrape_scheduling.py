@@ -0,0 +1,75 @@
+import time
+import logging
+
+from .redis_client import get_redis_client
+
+# --- Size-aware routing ---
+# Searches up to SMALL_SCRAPE_MAX_LISTINGS (estimate from the initial fetch) go to the small
+# queue, everything else (and all fan-out subtasks) to the large queue. Run separate workers
+# per queue so small searches never wait behind a large scan (see start_app.bat).
+SCRAPE_SMALL_QUEUE = 'scrape_small'
+SCRAPE_LARGE_QUEUE = 'scrape_large'
+SMALL_SCRAPE_MAX_LISTINGS = 500
+# Quote probes (search_quote.py) have their own queue: /api/fetch_data waits on them, so they
+# must not queue behind scrapes. The probes are I/O-bound; its worker can run a thread pool.
+QUOTE_QUEUE = 'quote'
+# The nightly cache warming crawl runs for hours under a strict request rate (cache_warming.py).
+# It gets its own solo worker so it neither holds up large scrapes nor slows their requests.
+CACHE_WARM_QUEUE = 'cache_warm'
+# Unrouted tasks (chord errbacks, the beat scheduler, cache maintenance) land on Celery's default
+# queue. Only the thread-pool quote worker consumes it: on a solo scrape worker they would wait
+# behind a long scrape, and the small-search worker would be blocked while running them.
+DEFAULT_QUEUE = 'celery'
+
+# --- Per-user concurrency cap ---
+MAX_ACTIVE_SCRAPES_PER_USER = 2
+ACTIVE_SCRAPES_KEY = "autoscraper:active_scrapes:{user_id}" # zset: task_id -> start time
+SCRAPE_OWNER_KEY = "autoscraper:scrape_owner:{task_id}"
+ACTIVE_SCRAPE_MAX_AGE = 3 * 3600 # Slots older than this are assumed lost (e.g. worker killed)
+
+def scrape_queue_for(estimated_count):
+    """Returns the queue a scrape of estimated_count listings should run on."""
+    return SCRAPE_SMALL_QUEUE if estimated_count <= SMALL_SCRAPE_MAX_LISTINGS else SCRAPE_LARGE_QUEUE
+
+def acquire_scrape_slot(user_id, task_id):
+    """
+    Reserves one of the user's MAX_ACTIVE_SCRAPES_PER_USER scrape slots for task_id.
+
+    Returns:
+        bool: False if the user already has the maximum number of scrapes running.
+              True if the slot was reserved, or if Redis is unavailable (the cap isn't enforced then).
+    """
+    client = get_redis_client()
+    if client is None:
+        return True
+    key = ACTIVE_SCRAPES_KEY.format(user_id=user_id)
+    now = time.time()
+    try:
+        pipe = client.pipeline()
+        pipe.zremrangebyscore(key, 0, now - ACTIVE_SCRAPE_MAX_AGE)
+        pipe.zadd(key, {task_id: now})
+        pipe.zcard(key)
+        pipe.expire(key, ACTIVE_SCRAPE_MAX_AGE)
+        active = pipe.execute()[2]
+        if active > MAX_ACTIVE_SCRAPES_PER_USER:
+            client.zrem(key, task_id)
+            return False
+        client.set(SCRAPE_OWNER_KEY.format(task_id=task_id), user_id, ex=ACTIVE_SCRAPE_MAX_AGE)
+        return True
+    except Exception as e:
+        logging.warning(f"Could not reserve scrape slot for user {user_id}: {e}")
+        return True
+
+def release_scrape_slot(task_id):
+    """Frees the slot held by task_id, if any. Safe to call more than once."""
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        owner_key = SCRAPE_OWNER_KEY.format(task_id=task_id)
+        user_id = client.get(owner_key)
+        if user_id:
+            client.zrem(ACTIVE_SCRAPES_KEY.format(user_id=user_id), task_id)
+            client.delete(owner_key)
+    except Exception as e:
+        logging.warning(f"Could not release scrape slot for task {task_id}: {e}")
@@ -0,0 +1,43 @@
+import os
+import logging
+
+from .AutoScraper import fetch_autotrader_data
+from .AutoScraperUtil import payload_key
+from .ttl_cache import TTLCache
+
+# A quote is the page-0 probe that prices a search before it is launched: estimated_count,
+# max_page and the parsed page-0 results (reused by the scrape). /api/fetch_data gets it from
+# fetch_quote_task on the quote queue instead of probing on the web request thread, and quotes
+# are cached per normalized search (payload_key), so re-submitting or confirming a search within
+# QUOTE_TTL doesn't probe AutoTrader again.
+QUOTE_TTL = int(os.environ.get("SEARCH_QUOTE_TTL", "300"))
+QUOTE_WAIT_TIMEOUT = float(os.environ.get("SEARCH_QUOTE_TIMEOUT", "20")) # Seconds a web request waits for a probe
+QUOTE_TIME_LIMIT = 60 # Seconds a probe may run (soft limit where the worker pool supports it, then it expires)
+QUOTE_MAX_RETRIES = 2 # Per page-0 request; a full scrape retries 5 times with up to 30 s backoff
+
+quote_cache = TTLCache('search_quote', QUOTE_TTL)
+pending_quotes = TTLCache('search_quote_pending', QUOTE_TIME_LIMIT) # payload key -> task id of the running probe
+
+def get_cached_quote(payload):
+    """The cached quote for the payload's search, or None."""
+    return quote_cache.get(payload_key(payload))
+
+def fetch_quote(payload, phase_timer=None):
+    """
+    Probes page 0 of a search over a single connection with bounded retries and caches the quote.
+    Probes that came back empty-handed (no listings and no count) are not cached.
+
+    Args:
+        payload (dict): The search payload.
+        phase_timer (PhaseTimer, optional): Records the probe's 'parse' phase.
+
+    Returns:
+        dict: {'estimated_count', 'initial_results_html', 'max_page'} from fetch_autotrader_data.
+    """
+    quote = fetch_autotrader_data(payload, max_retries=QUOTE_MAX_RETRIES, max_workers=1, initial_fetch_only=True,
+                                  phase_timer=phase_timer)
+    if quote.get('initial_results_html') or quote.get('estimated_count') == 0:
+        quote_cache.set(payload_key(payload), quote)
+    else:
+        logging.warning("Quote probe found no listings and no count; not caching it.")
+    return quote
@@ -0,0 +1,99 @@
+import json
+import logging
+import threading
+
+# Heavy client libraries (google.generativeai, googleapiclient) are imported inside
+# the accessors below so importing the app or a Celery worker doesn't pay for them.
+
+GEMINI_MODEL_NAME = 'gemini-2.0-flash-thinking-exp-01-21' # Or your chosen model
+
+_lock = threading.RLock() # Re-entrant: accessors call get_config() while holding it
+_config = None
+_gemini_model = None
+_gemini_loaded = False
+_search_service = None
+_search_loaded = False
+
+def get_config():
+    """Loads config.json once. Returns an empty dict if it is missing or invalid."""
+    global _config
+    if _config is not None:
+        return _config
+    with _lock:
+        if _config is None:
+            try:
+                with open('config.json', 'r') as f:
+                    _config = json.load(f)
+            except FileNotFoundError:
+                logging.error("config.json not found. AI/Search/Exchange features may be limited.")
+                _config = {}
+            except json.JSONDecodeError:
+                logging.error("Error decoding config.json.")
+                _config = {}
+            except Exception as e:
+                logging.error(f"An unexpected error occurred loading config.json: {e}", exc_info=True)
+                _config = {}
+    return _config
+
+def get_search_engine_id():
+    return get_config().get('SEARCH_ENGINE_ID')
+
+def get_exchange_rate_api_key():
+    key = get_config().get('EXCHANGE_RATE_API_KEY')
+    if not key:
+        logging.warning("EXCHANGE_RATE_API_KEY not found. Exchange rate features may be limited.")
+    return key
+
+def get_ai_response_cache_ttl():
+    """Seconds to reuse a Gemini answer for an identical prompt, 0 disables the cache."""
+    try:
+        return int(get_config().get('AI_RESPONSE_CACHE_TTL', 0))
+    except (TypeError, ValueError):
+        return 0
+
+def get_gemini_model():
+    """
+    Returns the configured Gemini GenerativeModel, created on first use.
+    Returns None if GEMINI_API_KEY is missing or configuration failed (not retried).
+    """
+    global _gemini_model, _gemini_loaded
+    if _gemini_loaded:
+        return _gemini_model
+    with _lock:
+        if not _gemini_loaded:
+            api_key = get_config().get('GEMINI_API_KEY')
+            if api_key:
+                try:
+                    import google.generativeai as genai
+                    genai.configure(api_key=api_key)
+                    _gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+                    logging.info("Gemini AI Model configured.")
+                except Exception as e:
+                    logging.error(f"Failed to configure Gemini AI Model: {e}", exc_info=True)
+            else:
+                logging.warning("GEMINI_API_KEY not found. AI analysis will be disabled.")
+            _gemini_loaded = True
+    return _gemini_model
+
+def get_search_service():
+    """
+    Returns the Google Custom Search service, built on first use.
+    Returns None if SEARCH_API_KEY/SEARCH_ENGINE_ID are missing or the build failed (not retried).
+    """
+    global _search_service, _search_loaded
+    if _search_loaded:
+        return _search_service
+    with _lock:
+        if not _search_loaded:
+            api_key = get_config().get('SEARCH_API_KEY')
+            if api_key and get_config().get('SEARCH_ENGINE_ID'):
+                try:
+                    from googleapiclient.discovery import build
+                    _search_service = build("customsearch", "v1", developerKey=api_key)
+                    logging.info("Google Custom Search service configured.")
+                except Exception as e:
+                    logging.error(f"Failed to configure Google Custom Search service: {e}", exc_info=True)
+            else:
+                logging.warning("SEARCH_API_KEY or SEARCH_ENGINE_ID not found. Web search will be disabled.")
+            _search_loaded = True
+    return _search_service
@@ -1,17 +1,46 @@
 import os
 import csv
+import json
+import time
 import logging
-from celery import Celery, Task
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from celery import Celery, Task, chord, signature
+from celery.schedules import crontab
+from celery.signals import worker_init
 from celery.utils.log import get_task_logger
 
 # Import necessary functions from other modules
 from .AutoScraper import fetch_autotrader_data, process_links_and_update_cache, CACHE_HEADERS
-from .AutoScraperUtil import format_time_ymd_hms, clean_model_name, transform_strings
-from .firebase_config import initialize_firebase, save_results, deduct_search_tokens, get_firestore_db # Add initialize_firebase
+from .AutoScraperUtil import (format_time_ymd_hms, clean_model_name, transform_strings, remove_duplicates_exclusions,
+                              filter_dicts, payload_key, PAYLOAD_NON_SEARCH_FIELDS)
+from .firebase_config import (save_results, deduct_search_tokens, get_firestore_db, get_auto_refresh_payloads,
+                              get_all_saved_payloads, get_user_settings, update_payload, update_result_metadata)
+from .redis_client import get_redis_client
+from .ttl_cache import TTLCache
+from .scrape_checkpoint import ScrapeCheckpoint
+from .result_stream import ResultStreamSink, open_result_stream, close_result_stream, assemble_results, read_result_stream, get_result_stream_owner
+from .auth_decorator import login_required
+from .scrape_scheduling import SCRAPE_LARGE_QUEUE, QUOTE_QUEUE, CACHE_WARM_QUEUE, DEFAULT_QUEUE, release_scrape_slot
+from .search_quote import fetch_quote, pending_quotes, QUOTE_TIME_LIMIT
+from .scrape_batch import merge_search_links, split_batch_rows
+from .cache_maintenance import maintain_listing_cache
+from .cache_warming import recent_searches, pick_warm_searches, warm_listing_cache
+from .result_diff import update_result_diff
+from .metrics import start_worker_exporter
+from .profiling import PhaseTimer, profile_mode, task_profile
 
 # Configure Celery
 # Replace 'redis://localhost:6379/0' with your actual Redis broker URL if different
 # You might need to install redis: pip install redis
+# Saved payloads with auto_refresh=True are re-run this often (see schedule_saved_search_refresh)
+SAVED_SEARCH_REFRESH_INTERVAL = 24 * 3600
+# Beat period of the scheduler; each search is refreshed in one slot of the interval
+SAVED_SEARCH_REFRESH_SLOT = 3600
+# The Redis broker hands an unacknowledged message to another worker after the visibility
+# timeout, even while its task is still running (acks_late scrapes) or waiting for its ETA.
+# It must stay above the longest scrape and the longest countdown.
+BROKER_VISIBILITY_TIMEOUT = 6 * 3600
+
 celery_app = Celery('tasks', broker='redis://localhost:6379/0', backend='redis://localhost:6379/0')
 
 # Optional: Configure Celery further (e.g., timezone)
@@ -21,192 +50,843 @@ celery_app.conf.update(
     result_serializer='json',
     timezone='America/Toronto', # Match your app's timezone
     enable_utc=True,
+    worker_prefetch_multiplier=1, # Scrapes are long; don't let one worker reserve queued ones others could run
+    broker_transport_options={'visibility_timeout': BROKER_VISIBILITY_TIMEOUT},
+    # scrape_and_process_task is routed per call by size (scrape_scheduling.scrape_queue_for);
+    # fan-out subtasks only exist for large searches. Everything else goes to DEFAULT_QUEUE.
+    task_default_queue=DEFAULT_QUEUE,
+    task_routes={
+        'tasks.fetch_search_pages_task': {'queue': SCRAPE_LARGE_QUEUE},
+        'tasks.fan_out_detail_fetch_task': {'queue': SCRAPE_LARGE_QUEUE},
+        'tasks.process_link_chunk_task': {'queue': SCRAPE_LARGE_QUEUE},
+        'tasks.finalize_scrape_task': {'queue': SCRAPE_LARGE_QUEUE},
+        'tasks.refresh_saved_search_task': {'queue': SCRAPE_LARGE_QUEUE},
+        'tasks.fetch_quote_task': {'queue': QUOTE_QUEUE},
+        'tasks.warm_listing_cache_task': {'queue': CACHE_WARM_QUEUE},
+    },
+    # Run `celery -A autoscraper_py.tasks:celery_app beat` alongside the workers for scheduled jobs
+    beat_schedule={
+        'refresh-saved-searches': {
+            'task': 'tasks.schedule_saved_search_refresh',
+            'schedule': crontab(minute=0), # Every SAVED_SEARCH_REFRESH_SLOT, on the hour so slots line up
+        },
+        'maintain-listing-cache': {
+            'task': 'tasks.maintain_listing_cache_task',
+            'schedule': crontab(hour=4, minute=30), # Off-peak, in the app's timezone
+        },
+        'warm-listing-cache': {
+            'task': 'tasks.warm_listing_cache_task',
+            'schedule': crontab(hour=2, minute=0), # Off-peak; done by the morning within CACHE_WARM_MAX_SECONDS
+        },
+    },
 )
 
 # Get a logger for tasks
 logger = get_task_logger(__name__)
 
-# Initialize Firebase within the Celery worker context
-# This ensures the worker process can interact with Firebase
-try:
-    initialize_firebase()
-    logger.info("Firebase initialized successfully within Celery worker.")
-except Exception as e:
-    logger.error(f"Failed to initialize Firebase in Celery worker: {e}", exc_info=True)
-    # Depending on requirements, you might want to prevent the worker from starting
-    # or handle this failure more gracefully. For now, just log the error.
+# --- Metrics ---
+# Each worker serves its scrape metrics (metrics.py) on WORKER_METRICS_PORT for Prometheus to scrape.
+@worker_init.connect
+def _start_metrics_exporter(**kwargs):
+    start_worker_exporter()
+
+# Firebase is initialized lazily by get_firestore_db() the first time a task needs it,
+# so worker processes don't pay for credential loading and client setup at import.
+
+# --- Distributed scrape settings ---
+# Searches with more result pages than SCRAPE_FANOUT_MIN_PAGES are split into subtasks
+# (a chord of search-page ranges, then a chord of detail-link chunks) so one big market
+# scan can use the whole worker fleet instead of a single process.
+SCRAPE_FANOUT_MIN_PAGES = 20
+SCRAPE_PAGES_PER_SUBTASK = 10
+SCRAPE_LINKS_PER_SUBTASK = 300
+
+# --- Retry/redelivery settings ---
+# Scrape tasks are acknowledged only after they finish, so a worker that dies mid-scrape
+# gets the task redelivered; with the checkpoint (scrape_checkpoint.py) it resumes instead
+# of starting over from page 0.
+SCRAPE_MAX_RETRIES = 3
+SCRAPE_RETRY_DELAY = 30 # Seconds, doubled by retry_backoff for subtasks
+
+# --- Progress reporting ---
+# Progress is written to the result backend (for /api/tasks/status polling) and published on
+# PROGRESS_CHANNEL (for the /api/tasks/stream SSE endpoint), at most once per PROGRESS_MIN_INTERVAL.
+PROGRESS_MIN_INTERVAL = 0.5 # Seconds
+PROGRESS_CHANNEL = "task_progress:{task_id}"
+
+def publish_task_event(task_id, event):
+    """Publishes a progress/state event for task_id on its Redis channel. No-op without Redis."""
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        client.publish(PROGRESS_CHANNEL.format(task_id=task_id), json.dumps({'task_id': task_id, **event}))
+    except Exception as e:
+        logger.warning(f"Could not publish progress for task {task_id}: {e}")
 
 class ProgressTask(Task):
     """Custom Task class to easily update state."""
-    def update_progress(self, current, total, step="Processing"):
+    _progress_sent_at = {} # task_id -> monotonic time of the last progress write (per worker process)
+
+    def update_progress(self, current, total, step="Processing", task_id=None):
+        """
+        Records progress for task_id (defaults to this task) and publishes it.
+        Updates are coalesced to one per PROGRESS_MIN_INTERVAL; the start and end of a
+        step (current == 0 or current >= total) are always sent.
+        """
+        task_id = task_id or self.request.id
+        now = time.monotonic()
+        if 0 < current < total and now - self._progress_sent_at.get(task_id, 0) < PROGRESS_MIN_INTERVAL:
+            return
+        self._progress_sent_at[task_id] = now
         self.update_state(
+            task_id=task_id,
             state='PROGRESS',
             meta={'current': current, 'total': total, 'step': step}
         )
+        publish_task_event(task_id, {'state': 'PROGRESS', 'progress': current, 'total': total, 'step': step})
+
+    def after_return(self, status, retval, task_id, args, kwargs, einfo):
+        self._progress_sent_at.pop(task_id, None)
+        if status in ('SUCCESS', 'FAILURE'):
+            # Stream listeners fetch the stored result when they see this
+            publish_task_event(task_id, {'state': status})
+            release_scrape_slot(task_id) # No-op for tasks that don't hold a per-user slot
+
+class FanOutProgress:
+    """
+    Progress reporter handed to fetch_autotrader_data / process_links_and_update_cache
+    inside a fan-out subtask. Sums the progress of all sibling subtasks in a Redis counter
+    and reports the total on root_id, the scrape_and_process_task ID the frontend polls.
+    """
+    def __init__(self, task, root_id, phase, grand_total, step_label, already_counted=0):
+        self.task = task
+        self.root_id = root_id
+        self.counter_key = f"autoscraper:scrape_progress:{self.root_id}:{phase}"
+        self.grand_total = grand_total
+        self.step_label = step_label
+        self._reported = already_counted # Progress the callee reports that isn't ours (e.g. page 0)
+
+    def update_progress(self, current, total, step="Processing"):
+        delta = current - self._reported
+        self._reported = current
+        done = current
+        client = get_redis_client()
+        if client is not None:
+            try:
+                done = client.incrby(self.counter_key, delta)
+                client.expire(self.counter_key, 24 * 3600)
+            except Exception as e:
+                logger.warning(f"Could not update fan-out progress counter: {e}")
+        done = min(done, self.grand_total)
+        self.task.update_progress(done, self.grand_total, step=f"{self.step_label} {done}/{self.grand_total}", task_id=self.root_id)
+
+def _fan_out_chord(task, header, callback):
+    """
+    Chord for a fan-out stage whose failure runs scrape_failed_task: when a subtask is out of
+    retries the callback never runs, so the root task would otherwise never be finalized.
+    The errback linked to the first stage is carried over by replace(), so it isn't linked twice.
+    """
+    fan_out = chord(header, callback)
+    if not any(signature(errback).task == scrape_failed_task.name for errback in task.request.errbacks or []):
+        fan_out.on_error(scrape_failed_task.s())
+    return fan_out
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def required_tokens_for(estimated_count):
+    """Tokens charged for a search of estimated_count listings (1 per 100, minimum 0.1)."""
+    return round(max(estimated_count / 100.0, 0.1), 1) if estimated_count > 0 else 0
+
+def _results_file_name(payload, timestamp):
+    return f"{payload.get('YearMin', '')}-{payload.get('YearMax', '')}_{payload.get('PriceMin', '')}-{payload.get('PriceMax', '')}_{timestamp}.csv"
+
+def _results_metadata(payload, file_name, timestamp, initial_scrape_data, result_count, required_tokens):
+    """Metadata stored with a results document (see save_results)."""
+    return {
+        'make': payload.get('Make', 'Unknown'),
+        'model': clean_model_name(payload.get('Model', 'Unknown')),
+        'yearMin': payload.get('YearMin', ''),
+        'yearMax': payload.get('YearMax', ''),
+        'priceMin': payload.get('PriceMin', ''),
+        'priceMax': payload.get('PriceMax', ''),
+        'file_name': file_name,
+        'timestamp': timestamp,
+        'estimated_listings_scanned': initial_scrape_data.get('estimated_count', 0), # Use estimate from initial fetch
+        'actual_results_found': result_count,
+        'tokens_charged': required_tokens, # Tokens charged based on estimate
+        'custom_name': payload.get('custom_name'),
+        'payload_key': payload_key(payload) # Links runs of the same search for result diffs
+    }
+
+def _record_result_diff(task_id, user_id, doc_id, payload, rows):
+    """Stores the diff against the previous run of the same search; failures only lose the diff."""
+    try:
+        diff = update_result_diff(user_id, doc_id, payload_key(payload), rows)
+        if diff:
+            logger.info(f"[Task ID: {task_id}] Diff vs {diff['previous_result_id']}: {len(diff['added'])} new, "
+                        f"{len(diff['removed'])} removed, {len(diff['price_changes'])} price changes.")
+    except Exception as e:
+        logger.warning(f"[Task ID: {task_id}] Could not compute result diff for {doc_id}: {e}", exc_info=True)
+
+def _save_scrape_results(task, payload, user_id, required_tokens, initial_scrape_data, processed_results_dicts, checkpoint,
+                         phase_timer):
+    """
+    Steps 3-4 of a scrape: the local CSV and the Firebase result document. The document is
+    recorded in the checkpoint as soon as it exists, so an attempt that fails after this
+    point is retried without saving a second copy.
+
+    Returns:
+        tuple: (full_path, doc_id), each None if nothing was saved there.
+    """
+    task_id = task.request.id
+
+    make = payload.get('Make', 'Unknown')
+    model = clean_model_name(payload.get('Model', 'Unknown'))
+    results_base_dir = "Results"
+    folder_path = os.path.join(results_base_dir, f"{make}_{model}")
+    os.makedirs(folder_path, exist_ok=True) # Ensure directory exists
+
+    timestamp = format_time_ymd_hms()
+    file_name = _results_file_name(payload, timestamp)
+    full_path = os.path.join(folder_path, file_name).replace("\\", "/")
+
+    # --- 3. Save to Local File ---
+    if processed_results_dicts:
+        logger.info(f"[Task ID: {task_id}] Saving {len(processed_results_dicts)} results to {full_path}")
+        task.update_progress(0, 100, "Saving local file...")
+        try:
+            with phase_timer.phase("csv_write"), open(full_path, mode="w", newline="", encoding="utf-8") as file:
+                writer = csv.DictWriter(file, fieldnames=CACHE_HEADERS)
+                writer.writeheader()
+                writer.writerows(processed_results_dicts)
+            task.update_progress(100, 100, "Local file saved.")
+        except Exception as e:
+             logger.error(f"[Task ID: {task_id}] Error writing timestamped CSV {full_path}: {e}", exc_info=True)
+             # Don't deduct tokens if saving failed critically
+             raise Exception(f"Failed to save results file: {e}") # Raise exception to mark task as failed
+    else:
+         logger.warning(f"[Task ID: {task_id}] No results obtained after processing links for file {full_path}")
+         full_path = None # No file path if no results
+
+    # --- 4. Save to Firebase ---
+    doc_id = None
+    if processed_results_dicts:
+        logger.info(f"[Task ID: {task_id}] Saving results to Firebase for user {user_id}")
+        task.update_progress(0, 100, "Saving to Firebase...")
+        metadata = _results_metadata(payload, file_name, timestamp, initial_scrape_data, len(processed_results_dicts), required_tokens)
+        with phase_timer.phase("firestore_save"):
+            firebase_result = save_results(user_id, processed_results_dicts, metadata)
+        if firebase_result.get('success'):
+            doc_id = firebase_result.get('doc_id')
+            checkpoint.record_saved(doc_id, full_path)
+            logger.info(f"[Task ID: {task_id}] Successfully saved results to Firebase (Doc ID: {doc_id})")
+            with phase_timer.phase("result_diff"):
+                _record_result_diff(task_id, user_id, doc_id, payload, processed_results_dicts)
+            task.update_progress(100, 100, "Saved to Firebase.")
+        else:
+             logger.error(f"[Task ID: {task_id}] Failed to save results to Firebase for user {user_id}. Error: {firebase_result.get('error')}")
+             # Decide if this is fatal. For now, log error but continue to token deduction.
+             task.update_progress(100, 100, "Firebase save failed.")
+    else:
+        logger.info(f"[Task ID: {task_id}] Skipping Firebase save as there were no processed results.")
+    return full_path, doc_id
+
+def _deduct_tokens_once(task, user_id, required_tokens, checkpoint, phase_timer):
+    """
+    Step 5 of a scrape: deducts the search's tokens, unless an earlier attempt of the task already
+    did (the deduction is recorded in the checkpoint right away). Returns the deduct_search_tokens result.
+    """
+    task_id = task.request.id
+    if checkpoint.charge is not None:
+        logger.info(f"[Task ID: {task_id}] Tokens were already deducted by an earlier attempt, not charging again.")
+        return checkpoint.charge
+    logger.info(f"[Task ID: {task_id}] Deducting {required_tokens} tokens for user {user_id}")
+    with phase_timer.phase("token_deduction"):
+        deduct_result = deduct_search_tokens(user_id, required_tokens)
+    checkpoint.record_charge(deduct_result)
+    return deduct_result
+
+def _finalize_scrape(task, payload, user_id, required_tokens, initial_scrape_data, processed_results_dicts, checkpoint,
+                     phase_timer, profile_path=None):
+    """
+    Saves the processed rows (local CSV + Firebase), deducts tokens and builds the task result.
+    Shared by the single-worker task and the fan-out callback. Each step is recorded in the
+    checkpoint once done, so a retried or redelivered task neither saves nor charges a second time.
+    The phase timings (and the profile path, if profiled) go into the result and its metadata.
+    """
+    task_id = task.request.id
+
+    saved = checkpoint.saved
+    if saved:
+        logger.info(f"[Task ID: {task_id}] Results were already saved by an earlier attempt (Doc ID: {saved['doc_id']}).")
+        full_path, doc_id = saved['file_path'], saved['doc_id']
+    else:
+        full_path, doc_id = _save_scrape_results(task, payload, user_id, required_tokens, initial_scrape_data,
+                                                 processed_results_dicts, checkpoint, phase_timer)
 
-@celery_app.task(bind=True, base=ProgressTask, name='tasks.scrape_and_process_task')
+    # --- 5. Deduct Tokens ---
+    task.update_progress(0, 100, "Finalizing...")
+    deduct_result = _deduct_tokens_once(task, user_id, required_tokens, checkpoint, phase_timer)
+    if not deduct_result.get('success'):
+        # Log the error, but the task itself succeeded in scraping/saving.
+        logger.error(f"[Task ID: {task_id}] Failed to deduct tokens for user {user_id} after successful task completion. Error: {deduct_result.get('error')}")
+        # The 'tokens_remaining' will reflect the state *before* this failed deduction attempt in the final result.
+
+    tokens_remaining_final = deduct_result.get('tokens_remaining', 'N/A') # Get remaining tokens from the result of the deduction function
+
+    # Timings are complete only now, so they're added to the saved metadata afterwards
+    timings = phase_timer.as_dict()
+    if doc_id:
+        metadata_update = {'timings': timings}
+        if profile_path:
+            metadata_update['profile_path'] = profile_path
+        update_result_metadata(user_id, doc_id, metadata_update)
+
+    logger.info(f"[Task ID: {task_id}] Task completed successfully.")
+    task.update_progress(100, 100, "Complete.")
+
+    # --- 6. Return Final Result ---
+    result = {
+        "status": "Complete",
+        "file_path": full_path,
+        "result_count": len(processed_results_dicts),
+        "doc_id": doc_id,
+        "tokens_charged": required_tokens,
+        "tokens_remaining": tokens_remaining_final,
+        "timings": timings
+    }
+    if profile_path:
+        result["profile_path"] = profile_path
+    close_result_stream(task_id)
+    checkpoint.record_result(result)
+    return result
+
+def _empty_fetch_result(task, user_id, required_tokens, checkpoint, phase_timer, profile_path=None):
+    """Result for a search whose fetch returned nothing; tokens are still charged for the attempt."""
+    task_id = task.request.id
+    logger.warning(f"[Task ID: {task_id}] Full fetch returned no results.")
+    # Deduct tokens anyway based on initial estimate, as the attempt was made
+    deduct_result = _deduct_tokens_once(task, user_id, required_tokens, checkpoint, phase_timer)
+    if not deduct_result.get('success'):
+        logger.error(f"[Task ID: {task_id}] Failed to deduct tokens for user {user_id} after empty fetch. Error: {deduct_result.get('error')}")
+    # Return success but indicate no results found
+    result = {
+        "status": "Complete",
+        "file_path": None,
+        "result_count": 0,
+        "doc_id": None,
+        "tokens_charged": required_tokens,
+        "tokens_remaining": deduct_result.get('tokens_remaining', 'N/A'), # Get remaining from deduct func
+        "timings": phase_timer.as_dict()
+    }
+    if profile_path:
+        result["profile_path"] = profile_path
+    close_result_stream(task_id)
+    checkpoint.record_result(result)
+    return result
+
+@celery_app.task(name='tasks.fetch_quote_task', soft_time_limit=QUOTE_TIME_LIMIT)
+def fetch_quote_task(payload):
+    """
+    Probes page 0 of a search for /api/fetch_data (see search_quote.py) and caches the quote.
+
+    Returns:
+        dict: The quote ({'estimated_count', 'initial_results_html', 'max_page'}) with the probe's 'timings'.
+    """
+    phase_timer = PhaseTimer()
+    try:
+        quote = fetch_quote(payload, phase_timer=phase_timer)
+    finally:
+        pending_quotes.delete(payload_key(payload)) # Later requests read the cache or start a new probe
+    return {**quote, 'timings': phase_timer.as_dict()}
+
+@celery_app.task(bind=True, base=ProgressTask, name='tasks.scrape_and_process_task',
+                 acks_late=True, reject_on_worker_lost=True, max_retries=SCRAPE_MAX_RETRIES)
 def scrape_and_process_task(self, payload, user_id, required_tokens, initial_scrape_data):
     """
     Celery task to perform the full scrape, process results, save, and deduct tokens.
+    Large searches are handed off to a distributed chord (see SCRAPE_FANOUT_MIN_PAGES);
+    the task ID stays the same, so status polling is unchanged.
+    On retry or redelivery the scrape resumes from its checkpoint.
+    Phase timings are returned in the result; payload["Profile"] also profiles the task (profiling.py).
     """
     logger.info(f"[Task ID: {self.request.id}] Starting scrape for user {user_id}. Payload: {payload}")
+    checkpoint = ScrapeCheckpoint(self.request.id)
+    if checkpoint.result:
+        logger.info(f"[Task ID: {self.request.id}] Already completed before redelivery, returning recorded result.")
+        return checkpoint.result
+    open_result_stream(self.request.id, user_id) # Lets the user tail accepted rows via /api/tasks/results
     self.update_progress(0, 100, "Initializing scrape...")
 
-    try:
-        # --- 1. Full Data Fetch ---
-        logger.info(f"[Task ID: {self.request.id}] Performing full data fetch.")
-        # Extract data needed from initial_scrape_data passed from the route
-        initial_results_html = initial_scrape_data.get('initial_results_html', [])
-        max_page = initial_scrape_data.get('max_page', 1)
-
-        if max_page > 1:
-            # Pass the task instance (self) to the fetch function (progress updates disabled for now)
-            all_results_html = fetch_autotrader_data(
-                payload,
-                start_page=1,
-                initial_results_html=initial_results_html,
-                max_page_override=max_page,
-                task_instance=self 
-            )
-        else:
-            all_results_html = initial_results_html
-            self.update_progress(100, 100, "Fetching complete (1 page).")
-
-        if not all_results_html:
-            logger.warning(f"[Task ID: {self.request.id}] Full fetch returned no results.")
-            # Deduct tokens anyway based on initial estimate, as the attempt was made
-            deduct_result = deduct_search_tokens(user_id, required_tokens)
-            if not deduct_result.get('success'):
-                logger.error(f"[Task ID: {self.request.id}] Failed to deduct tokens for user {user_id} after empty fetch. Error: {deduct_result.get('error')}")
-            # Return success but indicate no results found
-            return {
-                "status": "Complete",
-                "file_path": None,
-                "result_count": 0,
-                "doc_id": None,
-                "tokens_charged": required_tokens,
-                "tokens_remaining": deduct_result.get('tokens_remaining', 'N/A') # Get remaining from deduct func
-            }
-
-        # --- 2. Processing and Saving Results ---
-        logger.info(f"[Task ID: {self.request.id}] Processing {len(all_results_html)} fetched items.")
-        self.update_progress(0, 100, "Processing results...")
-
-        make = payload.get('Make', 'Unknown')
-        model = payload.get('Model', 'Unknown')
-        model = clean_model_name(model)
-        results_base_dir = "Results"
-        folder_path = os.path.join(results_base_dir, f"{make}_{model}")
-        os.makedirs(folder_path, exist_ok=True) # Ensure directory exists
-
-        timestamp = format_time_ymd_hms()
-        file_name = f"{payload.get('YearMin', '')}-{payload.get('YearMax', '')}_{payload.get('PriceMin', '')}-{payload.get('PriceMax', '')}_{timestamp}.csv"
-        full_path = os.path.join(folder_path, file_name).replace("\\", "/")
-
-        raw_exclusions = payload.get("Exclusions", [])
-        transformed_exclusions = transform_strings(raw_exclusions)
-
-        # Pass the task instance (self) to the processing function
-        processed_results_dicts = process_links_and_update_cache(
-            data=all_results_html,
-            transformed_exclusions=transformed_exclusions,
-            max_workers=1000, # Use the reduced worker count here as well
-            task_instance=self 
-        )
-        logger.info(f"[Task ID: {self.request.id}] Processing complete. Got {len(processed_results_dicts)} results.")
-        self.update_progress(100, 100, "Processing complete.")
+    max_page = initial_scrape_data.get('max_page', 1)
+    if max_page > SCRAPE_FANOUT_MIN_PAGES:
+        # Replace this task with: chord(search page ranges) -> fan_out_detail_fetch_task.
+        # Done outside the try below: replace() raises Ignore, which must not be caught.
+        page_ranges = [(start, min(start + SCRAPE_PAGES_PER_SUBTASK, max_page))
+                       for start in range(1, max_page, SCRAPE_PAGES_PER_SUBTASK)]
+        logger.info(f"[Task ID: {self.request.id}] Distributing {max_page - 1} search pages over {len(page_ranges)} subtasks.")
+        header = [fetch_search_pages_task.s(payload, start, end, max_page - 1, self.request.id) for start, end in page_ranges]
+        callback = fan_out_detail_fetch_task.s(payload, user_id, required_tokens, initial_scrape_data)
+        raise self.replace(_fan_out_chord(self, header, callback))
+
+    phase_timer = PhaseTimer(initial_scrape_data.get('timings')) # Starts with the route's initial fetch
+    with task_profile(profile_mode(payload), self.request.id) as profile_path:
+        try:
+            # --- 1. Full Data Fetch ---
+            logger.info(f"[Task ID: {self.request.id}] Performing full data fetch.")
+            # Extract data needed from initial_scrape_data passed from the route
+            initial_results_html = initial_scrape_data.get('initial_results_html', [])
 
-        # --- 3. Save to Local File ---
-        if processed_results_dicts:
-            logger.info(f"[Task ID: {self.request.id}] Saving {len(processed_results_dicts)} results to {full_path}")
-            self.update_progress(0, 100, "Saving local file...")
+            if max_page > 1:
+                # Pass the task instance (self) to the fetch function (progress updates disabled for now)
+                all_results_html = fetch_autotrader_data(
+                    payload,
+                    start_page=1,
+                    initial_results_html=initial_results_html,
+                    max_page_override=max_page,
+                    task_instance=self,
+                    checkpoint=checkpoint,
+                    phase_timer=phase_timer
+                )
+            else:
+                all_results_html = initial_results_html
+                self.update_progress(100, 100, "Fetching complete (1 page).")
+
+            if not all_results_html:
+                return _empty_fetch_result(self, user_id, required_tokens, checkpoint, phase_timer, profile_path)
+
+            # --- 2. Processing and Saving Results ---
+            logger.info(f"[Task ID: {self.request.id}] Processing {len(all_results_html)} fetched items.")
+            self.update_progress(0, 100, "Processing results...")
+
+            raw_exclusions = payload.get("Exclusions", [])
+            transformed_exclusions = transform_strings(raw_exclusions)
+
+            # Pass the task instance (self) to the processing function
+            result_sink = ResultStreamSink(self.request.id)
+            processed_results_dicts = process_links_and_update_cache(
+                data=all_results_html,
+                transformed_exclusions=transformed_exclusions,
+                max_workers=1000, # Use the reduced worker count here as well
+                task_instance=self,
+                checkpoint=checkpoint,
+                result_sink=result_sink,
+                phase_timer=phase_timer
+            )
             try:
-                with open(full_path, mode="w", newline="", encoding="utf-8") as file:
-                    writer = csv.DictWriter(file, fieldnames=CACHE_HEADERS)
-                    writer.writeheader()
-                    writer.writerows(processed_results_dicts)
-                self.update_progress(100, 100, "Local file saved.")
+                # Same rows the user has been shown while the scrape ran
+                processed_results_dicts = assemble_results(self.request.id, result_sink.unpublished, result_sink.published_batches)
             except Exception as e:
-                 logger.error(f"[Task ID: {self.request.id}] Error writing timestamped CSV {full_path}: {e}", exc_info=True)
-                 # Don't deduct tokens if saving failed critically
-                 raise Exception(f"Failed to save results file: {e}") # Raise exception to mark task as failed
+                logger.warning(f"[Task ID: {self.request.id}] Could not assemble results from stream, using in-memory rows: {e}")
+            logger.info(f"[Task ID: {self.request.id}] Processing complete. Got {len(processed_results_dicts)} results.")
+            self.update_progress(100, 100, "Processing complete.")
+
+            return _finalize_scrape(self, payload, user_id, required_tokens, initial_scrape_data, processed_results_dicts, checkpoint,
+                                    phase_timer, profile_path)
+
+        except Exception as e:
+            if self.request.retries < self.max_retries:
+                # Checkpoint is kept, so the retry picks up where this attempt stopped
+                logger.warning(f"[Task ID: {self.request.id}] Attempt {self.request.retries + 1} failed: {e}. Retrying in {SCRAPE_RETRY_DELAY}s.")
+                raise self.retry(exc=e, countdown=SCRAPE_RETRY_DELAY)
+            logger.error(f"[Task ID: {self.request.id}] Task failed: {e}", exc_info=True)
+            close_result_stream(self.request.id)
+            self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e)})
+            # Do NOT deduct tokens if the task failed before the deduction step
+            raise # Re-raise the exception so Celery marks the task as failed
+
+@celery_app.task(bind=True, base=ProgressTask, name='tasks.fetch_search_pages_task',
+                 acks_late=True, reject_on_worker_lost=True, autoretry_for=(Exception,),
+                 max_retries=SCRAPE_MAX_RETRIES, retry_backoff=SCRAPE_RETRY_DELAY)
+def fetch_search_pages_task(self, payload, start_page, end_page, total_pages, root_id):
+    """
+    Fan-out subtask: fetches search result pages [start_page, end_page).
+
+    Returns:
+        dict: {'results': parsed listings, 'timings': this subtask's phase timings}
+    """
+    logger.info(f"[Task ID: {self.request.id}] Fetching search pages {start_page}-{end_page - 1} for root task {root_id}.")
+    # fetch_autotrader_data counts page 0 as done when continuing a fetch
+    progress = FanOutProgress(self, root_id, 'pages', total_pages, "Fetching pages", already_counted=1)
+    checkpoint = ScrapeCheckpoint(self.request.id)
+    phase_timer = PhaseTimer()
+    results = fetch_autotrader_data(
+        payload,
+        start_page=start_page,
+        initial_results_html=[],
+        max_page_override=end_page,
+        task_instance=progress,
+        checkpoint=checkpoint,
+        phase_timer=phase_timer
+    )
+    checkpoint.clear() # The chord keeps the return value from here on
+    return {'results': results, 'timings': phase_timer.as_dict()}
+
+@celery_app.task(bind=True, base=ProgressTask, name='tasks.fan_out_detail_fetch_task',
+                 acks_late=True, reject_on_worker_lost=True)
+def fan_out_detail_fetch_task(self, page_results, payload, user_id, required_tokens, initial_scrape_data):
+    """
+    Chord callback for the search-page stage: merges and de-duplicates the links from all
+    page ranges, then replaces itself with a chord of detail-link chunks -> finalize_scrape_task.
+    Task.replace() keeps the original task ID, so this runs under the scrape_and_process_task ID.
+    The page subtasks' timings are summed and passed on with initial_scrape_data.
+    """
+    all_results = list(initial_scrape_data.get('initial_results_html', []))
+    phase_timer = PhaseTimer(initial_scrape_data.get('timings'))
+    for page_result in page_results:
+        if isinstance(page_result, dict):
+            all_results.extend(page_result.get('results') or [])
+            phase_timer.merge(page_result.get('timings'))
+        else: # Subtask queued before timings were returned
+            all_results.extend(page_result or [])
+    initial_scrape_data = {**initial_scrape_data, 'timings': phase_timer.as_dict()}
+    unique_link_results = remove_duplicates_exclusions(all_results)
+    logger.info(f"[Task ID: {self.request.id}] {len(unique_link_results)} unique listings from {len(page_results)} page subtasks.")
+
+    if not unique_link_results:
+        checkpoint = ScrapeCheckpoint(self.request.id)
+        if checkpoint.result:
+            return checkpoint.result
+        return _empty_fetch_result(self, user_id, required_tokens, checkpoint, phase_timer)
+
+    transformed_exclusions = transform_strings(payload.get("Exclusions", []))
+    link_chunks = _chunks(unique_link_results, SCRAPE_LINKS_PER_SUBTASK)
+    header = [process_link_chunk_task.s(chunk, transformed_exclusions, len(unique_link_results), self.request.id) for chunk in link_chunks]
+    callback = finalize_scrape_task.s(payload, user_id, required_tokens, initial_scrape_data)
+    raise self.replace(_fan_out_chord(self, header, callback))
+
+@celery_app.task(bind=True, base=ProgressTask, name='tasks.process_link_chunk_task',
+                 acks_late=True, reject_on_worker_lost=True, autoretry_for=(Exception,),
+                 max_retries=SCRAPE_MAX_RETRIES, retry_backoff=SCRAPE_RETRY_DELAY)
+def process_link_chunk_task(self, link_items, transformed_exclusions, total_links, root_id):
+    """
+    Fan-out subtask: fetches/filters the detail pages for one chunk of links. Kept rows go to
+    the root task's result stream; only rows that couldn't be published are returned.
+    """
+    logger.info(f"[Task ID: {self.request.id}] Processing {len(link_items)} links for root task {root_id}.")
+    progress = FanOutProgress(self, root_id, 'links', total_links, "Processing link")
+    checkpoint = ScrapeCheckpoint(self.request.id)
+    result_sink = ResultStreamSink(root_id)
+    phase_timer = PhaseTimer()
+    process_links_and_update_cache(
+        data=link_items,
+        transformed_exclusions=transformed_exclusions,
+        max_workers=1000,
+        task_instance=progress,
+        checkpoint=checkpoint,
+        result_sink=result_sink,
+        phase_timer=phase_timer
+    )
+    checkpoint.clear() # The chord keeps the return value from here on
+    return {'unpublished': result_sink.unpublished, 'published_batches': result_sink.published_batches,
+            'timings': phase_timer.as_dict()}
+
+@celery_app.task(bind=True, base=ProgressTask, name='tasks.finalize_scrape_task',
+                 acks_late=True, reject_on_worker_lost=True, autoretry_for=(ConnectionError,),
+                 max_retries=SCRAPE_MAX_RETRIES, retry_backoff=SCRAPE_RETRY_DELAY)
+def finalize_scrape_task(self, chunk_results, payload, user_id, required_tokens, initial_scrape_data):
+    """
+    Chord callback for the detail stage: assembles the rows all chunks published to the result
+    stream (plus any they returned), saves them and deducts tokens. Timings are summed over all subtasks.
+    The callback runs under the root task ID, so it frees the user's scrape slot once the scrape is done;
+    if the chord fails instead, scrape_failed_task frees it.
+    """
+    checkpoint = ScrapeCheckpoint(self.request.id)
+    if checkpoint.result:
+        release_scrape_slot(self.request.id)
+        return checkpoint.result
+    phase_timer = PhaseTimer(initial_scrape_data.get('timings'))
+    unpublished_rows = []
+    for chunk in chunk_results:
+        unpublished_rows.extend(chunk['unpublished'])
+        phase_timer.merge(chunk.get('timings'))
+    published_batches = sum(chunk['published_batches'] for chunk in chunk_results)
+    processed_results_dicts = assemble_results(self.request.id, unpublished_rows, published_batches)
+    logger.info(f"[Task ID: {self.request.id}] Merged {len(processed_results_dicts)} results from {len(chunk_results)} link subtasks.")
+    result = _finalize_scrape(self, payload, user_id, required_tokens, initial_scrape_data, processed_results_dicts, checkpoint, phase_timer)
+    release_scrape_slot(self.request.id)
+    return result
+
+@celery_app.task(name='tasks.scrape_failed_task')
+def scrape_failed_task(request, exc, traceback):
+    """
+    Errback of the fan-out chords, called with the failed chord callback's request (its ID is
+    the root scrape_and_process_task ID). Marks the scrape failed, ends its result stream and
+    frees the user's scrape slot, which the root task's after_return never gets to do.
+    """
+    task_id = request.id
+    logger.error(f"[Task ID: {task_id}] Distributed scrape failed: {exc}")
+    # Stored before the event below, so stream listeners read FAILURE when they fetch the state
+    celery_app.backend.mark_as_failure(task_id, exc, traceback)
+    close_result_stream(task_id)
+    release_scrape_slot(task_id)
+    publish_task_event(task_id, {'state': 'FAILURE'})
+
+# --- Scheduled refresh of saved searches ---
+# Saved payloads with auto_refresh=True are re-run every SAVED_SEARCH_REFRESH_INTERVAL.
+# Payloads that normalize to the same search (AutoScraperUtil.payload_key) are scraped once and
+# the rows fanned out to every subscriber, each with their own exclusions and token charge.
+# Each search is assigned a fixed hourly slot of the interval by its key, and beat schedules a
+# slot's searches at the start of it, spread over the hour. Countdowns stay far below
+# BROKER_VISIBILITY_TIMEOUT, so the broker never redelivers a refresh still waiting for its ETA.
+# A (payload_id, run) is recorded in refresh_runs before the results are saved and charged, so a
+# refresh that is redelivered anyway skips subscribers it has already served.
+refresh_runs = TTLCache('saved_search_refresh_runs', 2 * SAVED_SEARCH_REFRESH_INTERVAL)
+
+def _refresh_slot_count():
+    return SAVED_SEARCH_REFRESH_INTERVAL // SAVED_SEARCH_REFRESH_SLOT
+
+def _refresh_slot_for(search_key):
+    """The slot of the interval in which the search with this payload_key is refreshed."""
+    return int(search_key[:8], 16) % _refresh_slot_count()
+
+def _refresh_run_and_slot(now):
+    """Returns (run, slot) for a time: run numbers the intervals, slot is the hour within it."""
+    run, offset = divmod(int(now), SAVED_SEARCH_REFRESH_INTERVAL)
+    return run, offset // SAVED_SEARCH_REFRESH_SLOT
+
+@celery_app.task(name='tasks.schedule_saved_search_refresh')
+def schedule_saved_search_refresh():
+    """
+    Beat task (every SAVED_SEARCH_REFRESH_SLOT): groups opted-in payloads by search and schedules
+    one refresh per distinct search whose slot starts now.
+    """
+    run, slot = _refresh_run_and_slot(time.time())
+    groups = {}
+    for saved in get_auto_refresh_payloads():
+        payload = saved['payload']
+        search_key = payload_key(payload)
+        if _refresh_slot_for(search_key) != slot:
+            continue
+        group = groups.setdefault(search_key, {'payload': payload, 'subscribers': []})
+        group['subscribers'].append({
+            'user_id': saved['user_id'],
+            'payload_id': saved['id'],
+            'exclusions': payload.get('Exclusions', []),
+            'custom_name': payload.get('custom_name'),
+        })
+
+    spacing = SAVED_SEARCH_REFRESH_SLOT / max(len(groups), 1)
+    for i, group in enumerate(groups.values()):
+        refresh_saved_search_task.apply_async(args=(group['payload'], group['subscribers'], run), countdown=int(i * spacing))
+    subscriber_count = sum(len(group['subscribers']) for group in groups.values())
+    logger.info(f"Scheduled {len(groups)} saved-search refreshes for {subscriber_count} saved payloads (run {run}, slot {slot}).")
+    return {'searches': len(groups), 'subscribers': subscriber_count}
+
+@celery_app.task(bind=True, base=ProgressTask, name='tasks.refresh_saved_search_task')
+def refresh_saved_search_task(self, payload, subscribers, run=None):
+    """
+    Scrapes one saved search once and saves the results for each subscriber.
+
+    Args:
+        payload (dict): The search (any subscriber's saved payload; exclusions are ignored).
+        subscribers (list): [{'user_id', 'payload_id', 'exclusions', 'custom_name'}, ...]
+        run (int, optional): The refresh interval this run belongs to; defaults to the current one.
+
+    Returns:
+        dict: Per-subscriber outcome ({'user_id', 'payload_id', 'doc_id', 'result_count'} or 'skipped').
+    """
+    if run is None:
+        run, _ = _refresh_run_and_slot(time.time())
+    # Subscribers already served this run (the refresh was redelivered) are skipped before scraping
+    outcomes = []
+    pending = []
+    for subscriber in subscribers:
+        if refresh_runs.get(f"{subscriber['payload_id']}:{run}"):
+            outcomes.append({'user_id': subscriber['user_id'], 'payload_id': subscriber['payload_id'], 'skipped': 'already refreshed'})
         else:
-             logger.warning(f"[Task ID: {self.request.id}] No results obtained after processing links for file {full_path}")
-             full_path = None # No file path if no results
+            pending.append(subscriber)
+    if not pending:
+        return {'subscribers': outcomes}
 
-        # --- 4. Save to Firebase ---
-        doc_id = None
-        if processed_results_dicts:
-            logger.info(f"[Task ID: {self.request.id}] Saving results to Firebase for user {user_id}")
-            self.update_progress(0, 100, "Saving to Firebase...")
-            metadata = {
-                'make': make,
-                'model': model,
-                'yearMin': payload.get('YearMin', ''),
-                'yearMax': payload.get('YearMax', ''),
-                'priceMin': payload.get('PriceMin', ''),
-                'priceMax': payload.get('PriceMax', ''),
-                'file_name': file_name,
-                'timestamp': timestamp,
-                'estimated_listings_scanned': initial_scrape_data.get('estimated_count', 0), # Use estimate from initial fetch
-                'actual_results_found': len(processed_results_dicts),
-                'tokens_charged': required_tokens, # Tokens charged based on estimate
-                'custom_name': payload.get('custom_name')
-            }
-            firebase_result = save_results(user_id, processed_results_dicts, metadata)
-            if firebase_result.get('success'):
-                doc_id = firebase_result.get('doc_id')
-                logger.info(f"[Task ID: {self.request.id}] Successfully saved results to Firebase (Doc ID: {doc_id})")
-                self.update_progress(100, 100, "Saved to Firebase.")
-            else:
-                 logger.error(f"[Task ID: {self.request.id}] Failed to save results to Firebase for user {user_id}. Error: {firebase_result.get('error')}")
-                 # Decide if this is fatal. For now, log error but continue to token deduction.
-                 self.update_progress(100, 100, "Firebase save failed.")
+    search_payload = {k: v for k, v in payload.items() if k not in PAYLOAD_NON_SEARCH_FIELDS}
+    search_payload['Exclusions'] = [] # Applied per subscriber below
+
+    phase_timer = PhaseTimer()
+    with phase_timer.phase("initial_fetch"):
+        initial_scrape_data = fetch_autotrader_data(search_payload, initial_fetch_only=True, phase_timer=phase_timer)
+    if not isinstance(initial_scrape_data, dict):
+        raise Exception("Initial data fetch failed unexpectedly.")
+    required_tokens = required_tokens_for(initial_scrape_data.get('estimated_count', 0))
+
+    # Only subscribers who can pay for this run get it
+    paying = []
+    for subscriber in pending:
+        tokens = get_user_settings(subscriber['user_id']).get('search_tokens', 0)
+        if tokens >= required_tokens:
+            paying.append(subscriber)
         else:
-            logger.info(f"[Task ID: {self.request.id}] Skipping Firebase save as there were no processed results.")
+            logger.info(f"[Task ID: {self.request.id}] Skipping refresh of payload {subscriber['payload_id']} for user {subscriber['user_id']}: insufficient tokens.")
+            outcomes.append({'user_id': subscriber['user_id'], 'payload_id': subscriber['payload_id'], 'skipped': 'insufficient tokens'})
+    if not paying:
+        return {'subscribers': outcomes}
 
+    all_results_html = initial_scrape_data.get('initial_results_html', [])
+    if initial_scrape_data.get('max_page', 1) > 1:
+        all_results_html = fetch_autotrader_data(
+            search_payload,
+            start_page=1,
+            initial_results_html=all_results_html,
+            max_page_override=initial_scrape_data['max_page'],
+            task_instance=self,
+            phase_timer=phase_timer
+        )
+    rows = process_links_and_update_cache(data=all_results_html, transformed_exclusions=[], task_instance=self,
+                                          phase_timer=phase_timer) if all_results_html else []
+    scrape_timings = phase_timer.as_dict() # Shared by every subscriber's result
+    logger.info(f"[Task ID: {self.request.id}] Refreshed search has {len(rows)} listings for {len(paying)} subscribers.")
 
-        # --- 5. Deduct Tokens ---
-        logger.info(f"[Task ID: {self.request.id}] Deducting {required_tokens} tokens for user {user_id}")
-        self.update_progress(0, 100, "Finalizing...")
+    timestamp = format_time_ymd_hms()
+    for subscriber in paying:
+        user_id = subscriber['user_id']
+        # Recorded before saving and charging: a crash in between loses this run for the
+        # subscriber, rather than a redelivery charging them twice
+        if not refresh_runs.add(f"{subscriber['payload_id']}:{run}", self.request.id):
+            outcomes.append({'user_id': user_id, 'payload_id': subscriber['payload_id'], 'skipped': 'already refreshed'})
+            continue
+        user_rows = filter_dicts(rows, transform_strings(subscriber['exclusions']))
+        subscriber_payload = {**search_payload, 'custom_name': subscriber['custom_name']}
+        doc_id = None
+        if user_rows:
+            metadata = _results_metadata(subscriber_payload, _results_file_name(subscriber_payload, timestamp), timestamp,
+                                         initial_scrape_data, len(user_rows), required_tokens)
+            metadata['auto_refresh'] = True
+            metadata['payload_id'] = subscriber['payload_id']
+            metadata['timings'] = scrape_timings
+            firebase_result = save_results(user_id, user_rows, metadata)
+            if not firebase_result.get('success'):
+                logger.error(f"[Task ID: {self.request.id}] Failed to save refreshed results for user {user_id}: {firebase_result.get('error')}")
+                outcomes.append({'user_id': user_id, 'payload_id': subscriber['payload_id'], 'skipped': 'save failed'})
+                continue
+            doc_id = firebase_result.get('doc_id')
+            _record_result_diff(self.request.id, user_id, doc_id, subscriber_payload, user_rows)
         deduct_result = deduct_search_tokens(user_id, required_tokens)
         if not deduct_result.get('success'):
-            # Log the error, but the task itself succeeded in scraping/saving.
-            logger.error(f"[Task ID: {self.request.id}] Failed to deduct tokens for user {user_id} after successful task completion. Error: {deduct_result.get('error')}")
-            # The 'tokens_remaining' will reflect the state *before* this failed deduction attempt in the final result.
+            logger.error(f"[Task ID: {self.request.id}] Failed to deduct tokens for user {user_id} after refresh. Error: {deduct_result.get('error')}")
+        update_payload(user_id, subscriber['payload_id'], {'last_refreshed_at': timestamp})
+        outcomes.append({'user_id': user_id, 'payload_id': subscriber['payload_id'], 'doc_id': doc_id, 'result_count': len(user_rows)})
+    return {'subscribers': outcomes, 'timings': scrape_timings}
 
-        tokens_remaining_final = deduct_result.get('tokens_remaining', 'N/A') # Get remaining tokens from the result of the deduction function
+# --- Listing cache maintenance ---
 
-        logger.info(f"[Task ID: {self.request.id}] Task completed successfully.")
-        self.update_progress(100, 100, "Complete.")
+@celery_app.task(name='tasks.maintain_listing_cache_task')
+def maintain_listing_cache_task():
+    """Beat task: evicts unseen listings, enforces the cache size cap and reports reclaimed space (cache_maintenance.py)."""
+    return maintain_listing_cache()
 
-        # --- 6. Return Final Result ---
-        return {
-            "status": "Complete",
-            "file_path": full_path,
-            "result_count": len(processed_results_dicts),
-            "doc_id": doc_id,
-            "tokens_charged": required_tokens,
-            "tokens_remaining": tokens_remaining_final
-        }
+@celery_app.task(bind=True, base=ProgressTask, name='tasks.warm_listing_cache_task')
+def warm_listing_cache_task(self):
+    """
+    Beat task: crawls the most popular searches (saved payloads and recently launched searches)
+    into the listing cache under a strict request rate (cache_warming.py).
+    """
+    searches = pick_warm_searches(get_all_saved_payloads(), recent_searches())
+    logger.info(f"[Task ID: {self.request.id}] Warming the listing cache for {len(searches)} searches.")
+    return warm_listing_cache(searches, task_instance=self)
 
-    except Exception as e:
-        logger.error(f"[Task ID: {self.request.id}] Task failed: {e}", exc_info=True)
-        self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e)})
-        # Do NOT deduct tokens if the task failed before the deduction step
-        raise # Re-raise the exception so Celery marks the task as failed
+# --- Batch submission ---
+# scrape_batch_task runs several related searches of one user (/api/fetch_data_batch) as one
+# scrape: search pages in parallel, each distinct listing fetched once (scrape_batch.py), then one
+# result document per search. Tokens are charged per search, as for separate submissions.
+
+@celery_app.task(bind=True, base=ProgressTask, name='tasks.scrape_batch_task')
+def scrape_batch_task(self, payloads, user_id, required_tokens, initial_scrape_data):
+    """
+    Args:
+        payloads (list): The searches.
+        user_id (str): The user who submitted them.
+        required_tokens (list): Tokens charged per search.
+        initial_scrape_data (list): Each search's quote (estimated_count, max_page, initial_results_html).
+
+    Returns:
+        dict: {'status', 'searches': [{'doc_id', 'result_count', 'tokens_charged'} or 'error'],
+               'unique_listings', 'listings_across_searches', 'tokens_charged', 'tokens_remaining', 'timings'}
+    """
+    task_id = self.request.id
+    phase_timer = PhaseTimer()
+    logger.info(f"[Task ID: {task_id}] Starting batch of {len(payloads)} searches for user {user_id}.")
+
+    # --- 1. Search pages of all searches in parallel ---
+    def fetch_search(index):
+        quote = initial_scrape_data[index]
+        if quote.get('max_page', 1) <= 1:
+            return quote.get('initial_results_html', [])
+        return fetch_autotrader_data(payloads[index], start_page=1, initial_results_html=quote.get('initial_results_html', []),
+                                     max_page_override=quote['max_page'], phase_timer=phase_timer)
+
+    self.update_progress(0, len(payloads), "Fetching search pages...")
+    results_per_search = [None] * len(payloads)
+    with ThreadPoolExecutor(max_workers=len(payloads)) as executor:
+        futures = {executor.submit(fetch_search, index): index for index in range(len(payloads))}
+        for done, future in enumerate(as_completed(futures), start=1):
+            results_per_search[futures[future]] = future.result() or []
+            self.update_progress(done, len(payloads), f"Fetched search pages {done}/{len(payloads)}")
+
+    # --- 2. Each distinct listing once ---
+    unique_items, links_per_search = merge_search_links(results_per_search)
+    listings_across_searches = sum(len(links) for links in links_per_search)
+    logger.info(f"[Task ID: {task_id}] {listings_across_searches} listings across searches, {len(unique_items)} distinct.")
+    rows = process_links_and_update_cache(data=unique_items, transformed_exclusions=[], task_instance=self,
+                                          phase_timer=phase_timer) if unique_items else []
+
+    # --- 3. One result per search, with its own exclusions ---
+    rows_per_search = split_batch_rows(rows, links_per_search, [payload.get('Exclusions', []) for payload in payloads])
+    timings = phase_timer.as_dict() # Shared by every search's result
+    timestamp = format_time_ymd_hms()
+    outcomes = []
+    tokens_charged = 0
+    for payload, quote, tokens, search_rows in zip(payloads, initial_scrape_data, required_tokens, rows_per_search):
+        doc_id = None
+        if search_rows:
+            metadata = _results_metadata(payload, _results_file_name(payload, timestamp), timestamp, quote, len(search_rows), tokens)
+            metadata['batch_id'] = task_id
+            metadata['timings'] = timings
+            firebase_result = save_results(user_id, search_rows, metadata)
+            if not firebase_result.get('success'):
+                logger.error(f"[Task ID: {task_id}] Failed to save batch results for user {user_id}: {firebase_result.get('error')}")
+                outcomes.append({'error': 'save failed', 'result_count': len(search_rows), 'tokens_charged': 0})
+                continue
+            doc_id = firebase_result.get('doc_id')
+            _record_result_diff(task_id, user_id, doc_id, payload, search_rows)
+        tokens_charged += tokens
+        outcomes.append({'doc_id': doc_id, 'result_count': len(search_rows), 'tokens_charged': tokens})
+
+    tokens_charged = round(tokens_charged, 1)
+    deduct_result = deduct_search_tokens(user_id, tokens_charged)
+    if not deduct_result.get('success'):
+        logger.error(f"[Task ID: {task_id}] Failed to deduct tokens for user {user_id} after batch. Error: {deduct_result.get('error')}")
+    self.update_progress(100, 100, "Complete.")
+    return {
+        'status': 'Complete',
+        'searches': outcomes,
+        'unique_listings': len(unique_items),
+        'listings_across_searches': listings_across_searches,
+        'tokens_charged': tokens_charged,
+        'tokens_remaining': deduct_result.get('tokens_remaining', 'N/A'),
+        'timings': timings,
+    }
 
 # --- Optional: Add a route within tasks.py for status checking ---
 # Alternatively, this route can be in api_results.py or app.py
 
-from flask import Blueprint, jsonify as flask_jsonify
+from flask import Blueprint, Response, stream_with_context, request, session, jsonify as flask_jsonify
 from celery.result import AsyncResult
 
 tasks_bp = Blueprint('tasks_api', __name__, url_prefix='/api/tasks') # Separate prefix for task routes
 
-@tasks_bp.route('/status/<task_id>')
-def task_status(task_id):
-    """Endpoint to check the status of a Celery task."""
+# SSE stream settings: how often to check the result backend / send a keepalive while no
+# event arrives (kept below the Redis socket timeout), and when to end the stream.
+# Every open stream holds a Waitress thread (see --threads in start_app.bat), so streams are
+# short; EventSource reconnects after STREAM_RETRY_MS and gets the current state first.
+STREAM_POLL_INTERVAL = 3
+STREAM_MAX_DURATION = 2 * 60
+STREAM_RETRY_MS = 1000
+RESULTS_MAX_WAIT_MS = 4000 # Long-poll cap for /results, kept below the Redis socket timeout
+
+def _task_status_payload(task_id):
+    """Builds the status dict returned by /status and sent by /stream."""
     task_result = AsyncResult(task_id, app=celery_app)
 
     response_data = {
@@ -226,4 +906,89 @@ def task_status(task_id):
         response_data['error'] = str(task_result.info) # Celery stores exception info here
         # Optionally include traceback: response_data['traceback'] = task_result.traceback
 
-    return flask_jsonify(response_data)
+    return response_data
+
+@tasks_bp.route('/status/<task_id>')
+def task_status(task_id):
+    """Endpoint to check the status of a Celery task."""
+    return flask_jsonify(_task_status_payload(task_id))
+
+@tasks_bp.route('/stream/<task_id>')
+def task_stream(task_id):
+    """
+    Server-Sent Events stream of a task's progress, pushed from PROGRESS_CHANNEL.
+    Each event's data is the same JSON as /status; the stream ends after SUCCESS/FAILURE, or
+    after STREAM_MAX_DURATION, when the client reconnects.
+    Returns 503 when Redis is unavailable so the client falls back to polling /status.
+    """
+    client = get_redis_client()
+    if client is None:
+        return flask_jsonify({'error': 'Progress streaming unavailable'}), 503
+
+    def sse(data):
+        return f"data: {json.dumps(data)}\n\n"
+
+    def generate():
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(PROGRESS_CHANNEL.format(task_id=task_id))
+        try:
+            # Current state first: the task may have progressed (or finished) before we subscribed
+            status = _task_status_payload(task_id)
+            yield f"retry: {STREAM_RETRY_MS}\n" + sse(status)
+            if status['state'] in ('SUCCESS', 'FAILURE'):
+                return
+            deadline = time.monotonic() + STREAM_MAX_DURATION
+            while time.monotonic() < deadline:
+                message = pubsub.get_message(timeout=STREAM_POLL_INTERVAL)
+                if message is not None:
+                    event = json.loads(message['data'])
+                    if event.get('state') in ('SUCCESS', 'FAILURE'):
+                        yield sse(_task_status_payload(task_id)) # Includes the result/error
+                        return
+                    yield sse(event)
+                    continue
+                # Quiet period: catch a missed final event, and keep the connection open
+                status = _task_status_payload(task_id)
+                if status['state'] in ('SUCCESS', 'FAILURE'):
+                    yield sse(status)
+                    return
+                yield ": keepalive\n\n"
+        finally:
+            pubsub.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@tasks_bp.route('/results/<task_id>')
+@login_required
+def task_partial_results(task_id):
+    """
+    Returns listing rows a running scrape has accepted so far, read from its result stream.
+
+    Query params:
+        after: Last stream ID the client has seen (from the previous response), default '0-0'.
+        wait: Milliseconds to wait for new rows when there are none (capped at RESULTS_MAX_WAIT_MS).
+
+    Returns JSON {success, rows, last_id, done}; done is true once the scrape has finished
+    (succeeded or failed).
+    """
+    user_id = session.get('user_id')
+    if get_result_stream_owner(task_id) != user_id:
+        return flask_jsonify({'success': False, 'error': 'No streamed results for this task'}), 404
+
+    after = request.args.get('after', '0-0')
+    try:
+        wait_ms = min(int(request.args.get('wait', 0)), RESULTS_MAX_WAIT_MS)
+    except ValueError:
+        wait_ms = 0
+    try:
+        rows, last_id, done = read_result_stream(task_id, after=after, block_ms=wait_ms or None)
+        if not rows and not done and AsyncResult(task_id, app=celery_app).state in ('SUCCESS', 'FAILURE'):
+            # Finished without an end marker (e.g. the failure handler couldn't reach Redis): stop the
+            # client's long-poll instead of holding a thread for it until the stream expires
+            rows, last_id, _ = read_result_stream(task_id, after=last_id)
+            done = True
+    except Exception as e:
+        logger.error(f"Error reading result stream for task {task_id}: {e}")
+        return flask_jsonify({'success': False, 'error': 'Could not read results'}), 500
+    return flask_jsonify({'success': True, 'rows': rows, 'last_id': last_id, 'done': done})
@@ -0,0 +1,154 @@
+import datetime
+import json
+import os
+import tempfile
+import time
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from autoscraper_py import cache_maintenance, listing_cache
+from autoscraper_py.cache_maintenance import maintain_csv_tier, maintain_redis_tier, rows_allowed
+from autoscraper_py.listing_cache import REDIS_HASH_KEY, REDIS_SEEN_KEY, append_to_cache, load_cache
+
+
+def _days_ago(days):
+    return (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+
+
+def _row(link, days_ago=0):
+    return {"Link": link, "Make": "Honda", "date_cached": _days_ago(days_ago)}
+
+
+class FakeRedis:
+    """The hash and sorted set commands maintenance uses, on one hash and one sorted set."""
+
+    def __init__(self):
+        self.hash = {}
+        self.seen = {}
+
+    def pipeline(self, transaction=True):
+        client = self
+
+        class Pipeline:
+            calls = []
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.calls.append(getattr(client, name)(*args, **kwargs))
+
+            def execute(self):
+                results, Pipeline.calls = list(self.calls), []
+                return results
+        return Pipeline()
+
+    def hlen(self, key):
+        return len(self.hash)
+
+    def zcard(self, key):
+        return len(self.seen)
+
+    def hscan(self, key, cursor, count):
+        return 0, dict(self.hash)
+
+    def zadd(self, key, mapping, nx=False):
+        added = {link: score for link, score in mapping.items() if not (nx and link in self.seen)}
+        self.seen.update(added)
+        return len(added)
+
+    def zrangebyscore(self, key, low, high):
+        return [link for link, score in sorted(self.seen.items(), key=lambda item: item[1]) if score <= high]
+
+    def zrange(self, key, start, end):
+        return [link for link, _ in sorted(self.seen.items(), key=lambda item: item[1])][start:end + 1]
+
+    def hdel(self, key, *links):
+        return sum(self.hash.pop(link, None) is not None for link in links)
+
+    def zrem(self, key, *links):
+        return sum(self.seen.pop(link, None) is not None for link in links)
+
+    def memory_usage(self, key, samples=None):
+        return sum(len(link) + len(value) for link, value in self.hash.items()) if key == REDIS_HASH_KEY else 0
+
+
+class TestCacheMaintenance(unittest.TestCase):
+
+    def test_caps(self):
+        self.assertEqual(rows_allowed(100, 1000, 0, 0), 100)
+        self.assertEqual(rows_allowed(100, 1000, 80, 0), 80)
+        self.assertEqual(rows_allowed(100, 1000, 80, 500), 50)
+
+    def test_redis_evicts_unseen_then_least_recently_seen(self):
+        client = FakeRedis()
+        now = time.time()
+        for i in range(6):
+            client.hash[f"/a/{i}"] = json.dumps(_row(f"/a/{i}"))
+            client.seen[f"/a/{i}"] = now - i * 86400 # /a/i last seen i days ago
+        client.hash["/a/old"] = json.dumps(_row("/a/old", days_ago=90)) # Cached before last-seen tracking
+
+        report = maintain_redis_tier(client, max_rows=3, max_bytes=0, max_age_days=5)
+        self.assertEqual(sorted(client.hash), ["/a/0", "/a/1", "/a/2"])
+        self.assertEqual(sorted(client.seen), sorted(client.hash))
+        self.assertEqual((report['rows_before'], report['evicted_unseen'], report['evicted_over_cap']), (7, 2, 2))
+        self.assertGreater(report['reclaimed_bytes'], 0)
+
+    def test_csv_is_compacted_and_evicted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.csv")
+            append_to_cache([_row("/a/1", 3), _row("/a/2", 2), _row("/a/3", 60), _row("/a/4", 1)], path)
+            append_to_cache([_row("/a/1", 0)], path) # Refreshed: supersedes the first row
+
+            report = maintain_csv_tier(path, max_rows=2, max_bytes=0, max_age_days=30)
+            cache = load_cache(path)
+        self.assertEqual(sorted(cache), ["/a/1", "/a/4"])
+        self.assertEqual(cache["/a/1"]["date_cached"], _days_ago(0))
+        self.assertEqual((report['superseded_rows'], report['evicted_unseen'], report['evicted_over_cap']), (1, 1, 1))
+        self.assertEqual(report['reclaimed_bytes'], report['bytes_before'] - report['bytes_after'])
+        self.assertIsNone(maintain_csv_tier(path))
+
+    def test_csv_rows_appended_during_compaction_are_kept(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.csv")
+            append_to_cache([_row("/a/1"), _row("/a/1")], path)
+            real_lock = listing_cache.cache_file_lock
+
+            @contextmanager
+            def append_first(filepath):
+                append_to_cache([_row("/a/2")], filepath) # A scrape appends just before the swap
+                with real_lock(filepath):
+                    yield
+            with patch.object(cache_maintenance, 'cache_file_lock', append_first):
+                report = maintain_csv_tier(path, max_rows=0, max_bytes=0, max_age_days=0)
+            self.assertEqual(sorted(load_cache(path)), ["/a/1", "/a/2"])
+            self.assertEqual(report['superseded_rows'], 1)
+            self.assertEqual(os.listdir(tmp), ["cache.csv"]) # Lock and temporary file are gone
+
+    def test_csv_left_alone_when_it_cannot_be_replaced(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.csv")
+            append_to_cache([_row("/a/1"), _row("/a/1")], path)
+            with open(path, 'rb') as file:
+                before = file.read()
+            with patch.object(cache_maintenance.os, 'replace', side_effect=PermissionError("in use")):
+                self.assertIsNone(maintain_csv_tier(path, max_rows=0, max_bytes=0, max_age_days=0))
+            with open(path, 'rb') as file:
+                self.assertEqual(file.read(), before)
+            self.assertEqual(os.listdir(tmp), ["cache.csv"])
+            append_to_cache([_row("/a/2")], path) # The lock was released
+            self.assertIn("/a/2", load_cache(path))
+
+    def test_stale_lock_is_broken(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.csv")
+            open(f"{path}.lock", 'w').close()
+            with self.assertRaises(TimeoutError):
+                with listing_cache.cache_file_lock(path, timeout=0):
+                    pass
+            stale = time.time() - listing_cache.FILE_LOCK_STALE_AFTER - 1
+            os.utime(f"{path}.lock", (stale, stale))
+            append_to_cache([_row("/a/1")], path)
+            self.assertIn("/a/1", load_cache(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
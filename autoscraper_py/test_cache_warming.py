@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import patch
+
+from autoscraper_py import cache_warming
+from autoscraper_py.AutoScraperUtil import payload_key
+from autoscraper_py.proxy_pool import get_proxy_pool
+
+
+class FakeRedis:
+    """The sorted set and hash commands the search frequency stats use."""
+
+    def __init__(self):
+        self.scores = {}
+        self.hash = {}
+
+    def pipeline(self, transaction=True):
+        client = self
+
+        class Pipeline:
+            def __getattr__(self, name):
+                return getattr(client, name)
+
+            def execute(self):
+                return []
+        return Pipeline()
+
+    def zincrby(self, key, amount, member):
+        self.scores[member] = self.scores.get(member, 0) + amount
+
+    def hset(self, key, field, value):
+        self.hash[field] = value
+
+    def zrange(self, key, start, end, withscores=False):
+        return sorted(self.scores.items(), key=lambda item: item[1])
+
+    def hgetall(self, key):
+        return dict(self.hash)
+
+    def zunionstore(self, key, weights):
+        self.scores = {member: score * weights[key] for member, score in self.scores.items()}
+
+    def zrem(self, key, *members):
+        for member in members:
+            self.scores.pop(member, None)
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hash.pop(field, None)
+
+
+CIVIC = {"Make": "Honda", "Model": "Civic"}
+F150 = {"Make": "Ford", "Model": "F-150"}
+
+
+class TestCacheWarming(unittest.TestCase):
+
+    def test_launched_searches_decay_between_runs(self):
+        redis = FakeRedis()
+        with patch.object(cache_warming, 'get_redis_client', return_value=redis):
+            for _ in range(3):
+                cache_warming.record_search({**CIVIC, "Exclusions": ["salvage"]})
+            cache_warming.record_search(F150)
+
+            recent = cache_warming.recent_searches()
+            self.assertEqual(recent[payload_key(CIVIC)], (3, CIVIC))
+            for _ in range(4):
+                recent = cache_warming.recent_searches()
+        # Counts halve every run; the single F-150 launch is forgotten once it would drop below FREQUENCY_MIN_SCORE
+        self.assertEqual(recent[payload_key(CIVIC)], (3 / 16, CIVIC))
+        self.assertEqual((list(redis.scores), list(redis.hash)), ([payload_key(CIVIC)], [payload_key(CIVIC)]))
+
+    def test_saved_payloads_and_recent_searches_are_ranked_together(self):
+        saved = [{'payload': {**F150, "custom_name": "Truck"}}, {'payload': {"Make": "ford", "Model": "f-150"}},
+                 {'payload': {"Make": "Toyota", "Model": "RAV4"}}]
+        recent = {payload_key(CIVIC): (1.5, CIVIC), payload_key(F150): (0.5, F150)}
+        searches = cache_warming.pick_warm_searches(saved, recent, top_n=2)
+        self.assertEqual([(payload, score) for _, payload, score in searches], [(F150, 2.5), (CIVIC, 1.5)])
+
+    def test_crawl_is_rate_limited_and_capped(self):
+        intervals = []
+
+        def fetch(payload, **kwargs):
+            intervals.append(get_proxy_pool()._request_interval)
+            self.assertEqual(payload["Exclusions"], [])
+            return [{"link": f"/a/{i}"} for i in range(10)]
+
+        searches = [(payload_key(CIVIC), CIVIC, 2), (payload_key(F150), F150, 1)]
+        with patch.object(cache_warming, 'fetch_autotrader_data', side_effect=fetch), \
+             patch.object(cache_warming, 'process_links_and_update_cache') as process:
+            report = cache_warming.warm_listing_cache(searches, requests_per_second=4, max_listings=3)
+            self.assertEqual((report['warmed'], report['listings']), (2, 6))
+            self.assertEqual(intervals, [0.25, 0.25])
+            self.assertEqual(len(process.call_args.args[0]), 3)
+            self.assertEqual(get_proxy_pool()._request_interval, 0)
+
+            report = cache_warming.warm_listing_cache(searches, max_seconds=0)
+        self.assertEqual((report['warmed'], report['stopped_early']), (0, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
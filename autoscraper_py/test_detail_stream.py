@@ -0,0 +1,85 @@
+import json
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from prometheus_client import REGISTRY
+
+from autoscraper_py import AutoScraper
+from autoscraper_py.AutoScraper import extract_vehicle_info, extract_vehicle_info_from_json
+from autoscraper_py.AutoScraperUtil import parse_html_content_to_json, read_until_json_object
+from autoscraper_py.proxy_pool import ProxyPool, parse_proxy_config
+from autoscraper_py.benchmarks.stub_autotrader import StubConfig, detail_page, listing, listing_path, start_stub_server
+
+
+def _detail_bytes():
+    return REGISTRY.get_sample_value("autoscraper_http_response_bytes_total", {"endpoint": "detail"}) or 0
+
+
+class TestReadUntilJsonObject(unittest.TestCase):
+
+    def test_object_split_across_chunks(self):
+        """Braces and escaped quotes inside strings don't end the object, wherever the chunks split."""
+        model = {"Trim": 'Sport "}{" \\', "Specs": [{"Key": "a"}, {}], "Price": "1"}
+        document = f"<script>window['ngVdpModel'] = {json.dumps(model)};</script><style>p {{}}</style>".encode()
+        for size in (1, 2, 5, 64, len(document)):
+            chunks = [document[i:i + size] for i in range(0, len(document), size)]
+            body, end = read_until_json_object(chunks)
+            self.assertEqual(json.loads(body[body.index(b"{"):end]), model)
+
+    def test_stops_reading_when_object_is_complete(self):
+        def chunks():
+            yield b'<p>{"a": 1}'
+            self.fail("Read past the end of the object")
+        self.assertEqual(read_until_json_object(chunks()), (b'<p>{"a": 1}', len(b'<p>{"a": 1}')))
+
+    def test_incomplete_document_is_read_in_full(self):
+        self.assertEqual(read_until_json_object([b"Request unsuccessful.", b" Incapsula"]), (b"Request unsuccessful. Incapsula", None))
+        self.assertEqual(read_until_json_object([b'{"a": {']), (b'{"a": {', None))
+
+
+class TestStreamedDetailFetch(unittest.TestCase):
+
+    def test_trailing_markup_is_not_downloaded(self):
+        server = start_stub_server(StubConfig(listings=5, detail_latency=0, detail_padding=2_000_000))
+        try:
+            item = listing(3)
+            full_page = detail_page(item, server.config.detail_padding)
+            before = _detail_bytes()
+            info = extract_vehicle_info(server.base_url + listing_path(item))
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(info, extract_vehicle_info_from_json(parse_html_content_to_json(detail_page(item))))
+        self.assertEqual(info["Make"], item["make"])
+        self.assertLess(_detail_bytes() - before, len(full_page) / 10)
+
+    def test_no_free_proxy_is_retried(self):
+        """A lease that times out is retried with backoff instead of dropping the listing."""
+        pool = ProxyPool(parse_proxy_config({}))
+        timeouts = [TimeoutError("No proxy available")] * 2
+        real_lease = pool.lease
+
+        @contextmanager
+        def lease():
+            if timeouts:
+                raise timeouts.pop()
+            with real_lease() as proxy_lease:
+                yield proxy_lease
+
+        pool.lease = lease
+        server = start_stub_server(StubConfig(listings=5, detail_latency=0))
+        try:
+            item = listing(2)
+            with patch.object(AutoScraper, 'get_proxy_pool', return_value=pool), \
+                 patch.object(AutoScraper.time, 'sleep') as sleep:
+                info = extract_vehicle_info(server.base_url + listing_path(item))
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(info["Make"], item["make"])
+        self.assertEqual(sleep.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from autoscraper_py.benchmarks.stub_autotrader import StubConfig, listing, listing_path, start_stub_server
+from autoscraper_py.http_transport import Http2Adapter, is_buffered
+
+
+class TestHttp2Adapter(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = start_stub_server(StubConfig(listings=50, search_latency=0.01, detail_latency=0.01))
+        cls.adapter = Http2Adapter(prior_knowledge=True) # The stub speaks h2c
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.adapter.close_clients()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def _session(self, adapter=None):
+        session = requests.Session()
+        session.trust_env = False
+        session.headers["Connection"] = "keep-alive" # Not allowed in HTTP/2; the adapter drops it
+        session.mount("http://", adapter or self.adapter)
+        return session
+
+    def test_concurrent_requests_share_one_connection(self):
+        """Threads with their own sessions (as extract_vehicle_info has) multiplex over one connection."""
+        adapter = Http2Adapter(prior_knowledge=True)
+        before = self.server.connections
+
+        def fetch(index):
+            return self._session(adapter).get(self.server.base_url + listing_path(listing(index)), timeout=10)
+
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            responses = list(executor.map(fetch, range(50)))
+        adapter.close_clients()
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertIn("ngVdpModel", responses[0].text)
+        self.assertEqual(self.server.connections - before, 1)
+
+    def test_post_and_errors_map_to_requests(self):
+        response = self._session().post(self.server.base_url + "/Refinement/Search", json={"Skip": 0, "Top": 15}, timeout=10)
+        self.assertEqual(response.json()["SearchResultsDataJson"], '{"maxPage": 4, "totalResultCount": 50}')
+        missing = self._session().get(self.server.base_url + "/nope", timeout=10)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            missing.raise_for_status()
+        streamed = self._session().get(self.server.base_url + listing_path(listing(1)), stream=True, timeout=10)
+        self.assertTrue(is_buffered(streamed)) # Read in full despite stream=True
+        self.assertIn(b"ngVdpModel", b"".join(streamed.iter_content(64)))
+        streamed.close()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self._session().get("http://127.0.0.1:9/", timeout=2) # Nothing listens on the discard port
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from autoscraper_py import listing_cache
+from autoscraper_py.listing_cache import CompactRows, ListingCache, load_cache
+
+
+def _row(link, date=None, price="10000"):
+    return {"Link": link, "Make": "Honda", "Price": price, "date_cached": date or datetime.date.today().isoformat()}
+
+
+class FakeRedis:
+    """Just the hash commands the listing cache uses."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.hmget_calls = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    def hmget(self, key, fields):
+        self.hmget_calls += 1
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    def zadd(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+
+class FakePipeline:
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class TestListingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.csv_path = os.path.join(self.tmp.name, "cache.csv")
+
+    def test_nodes_share_rows_through_redis(self):
+        redis = FakeRedis()
+        with patch.object(listing_cache, 'get_redis_client', return_value=redis):
+            node_a, node_b = ListingCache(filepath=self.csv_path), ListingCache(filepath=self.csv_path)
+            node_a.put_many([_row("/a/1"), _row("/a/2")])
+            node_b.put_many([_row("/a/2", price="9000"), _row("/a/3")]) # Upserts don't drop node A's rows
+            self.assertEqual(sorted(node_b.get_many(["/a/1", "/a/2", "/a/3", "/a/4"])), ["/a/1", "/a/2", "/a/3"])
+            self.assertEqual(node_a.get_many(["/a/2"])["/a/2"]["Price"], "10000") # Still fresh in A's LRU
+
+            # Fresh rows are served from the LRU; stale ones are re-read in case another node refreshed them
+            calls = redis.hmget_calls
+            node_b.get_many(["/a/1", "/a/3"])
+            self.assertEqual(redis.hmget_calls, calls)
+            node_a._remember({"/a/3": _row("/a/3", date="2020-01-01")})
+            self.assertEqual(node_a.get_many(["/a/3"])["/a/3"]["date_cached"], datetime.date.today().isoformat())
+        self.assertFalse(os.path.exists(self.csv_path))
+
+    def test_csv_fallback_keeps_every_writer_rows(self):
+        with patch.object(listing_cache, 'get_redis_client', return_value=None):
+            writer_a, writer_b = ListingCache(filepath=self.csv_path), ListingCache(filepath=self.csv_path)
+            writer_a.put_many([_row("/a/1"), _row("/a/2")])
+            writer_b.put_many([_row("/a/2", price="9000"), _row("/a/3")])
+            self.assertEqual(ListingCache(filepath=self.csv_path).get_many(["/a/1", "/a/2", "/a/3"])["/a/2"]["Price"], "9000")
+        self.assertEqual(len(load_cache(self.csv_path)), 3)
+
+    def test_local_tier_is_bounded(self):
+        with patch.object(listing_cache, 'get_redis_client', return_value=None):
+            cache = ListingCache(local_size=2, filepath=self.csv_path)
+            cache.put_many([_row(f"/a/{i}") for i in range(5)])
+        self.assertEqual(cache._local.links(), ["/a/3", "/a/4"])
+
+
+class TestCompactRows(unittest.TestCase):
+
+    def test_rows_round_trip_and_share_values(self):
+        rows = CompactRows(max_rows=2)
+        rows.put(_row("/a/1"))
+        rows.put({**_row("/a/2"), "Make": "".join(["Hon", "da"])}) # An equal but distinct string
+        self.assertEqual(rows.get("/a/1"), {**dict.fromkeys(listing_cache.CACHE_HEADERS, ""), **_row("/a/1")})
+        self.assertIs(rows.get("/a/1")["Make"], rows.get("/a/2")["Make"])
+
+        rows.put(_row("/a/2", price="9000")) # Upsert in place
+        rows.put(_row("/a/3")) # Evicts /a/1 and reuses its slot
+        self.assertEqual((len(rows), "/a/1" in rows, rows.get("/a/2")["Price"]), (2, False, "9000"))
+        self.assertEqual(len(rows._codes["Make"]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
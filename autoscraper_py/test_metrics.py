@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import Mock
+
+import requests
+
+from autoscraper_py import metrics
+
+
+def _sample(name, **labels):
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_instrumented_request_records_status_bytes_and_429(self):
+        before_count = _sample("autoscraper_http_request_seconds_count", endpoint="detail", status="429")
+        before_bytes = _sample("autoscraper_http_response_bytes_total", endpoint="detail")
+        before_limited = _sample("autoscraper_http_rate_limited_total", endpoint="detail")
+        send = Mock(return_value=Mock(status_code=429, content=b"x" * 10))
+
+        metrics.instrumented_request("detail", send, "https://example.test/a", timeout=5)
+
+        send.assert_called_once_with("https://example.test/a", timeout=5)
+        self.assertEqual(_sample("autoscraper_http_request_seconds_count", endpoint="detail", status="429"), before_count + 1)
+        self.assertEqual(_sample("autoscraper_http_response_bytes_total", endpoint="detail"), before_bytes + 10)
+        self.assertEqual(_sample("autoscraper_http_rate_limited_total", endpoint="detail"), before_limited + 1)
+
+    def test_streamed_bodies_are_counted_only_when_buffered(self):
+        before_bytes = _sample("autoscraper_http_response_bytes_total", endpoint="detail")
+        streamed, buffered = requests.Response(), requests.Response()
+        for response in (streamed, buffered):
+            response.status_code = 200
+        buffered._content, buffered._content_consumed, buffered.body_buffered = b"x" * 10, True, True
+
+        metrics.instrumented_request("detail", Mock(return_value=streamed), "https://example.test/a", stream=True)
+        self.assertEqual(_sample("autoscraper_http_response_bytes_total", endpoint="detail"), before_bytes) # Left to the caller
+        metrics.instrumented_request("detail", Mock(return_value=buffered), "https://example.test/a", stream=True)
+        self.assertEqual(_sample("autoscraper_http_response_bytes_total", endpoint="detail"), before_bytes + 10)
+
+    def test_failures_are_recorded_as_errors(self):
+        before_request = _sample("autoscraper_http_request_seconds_count", endpoint="search", status="error")
+        before_commit = _sample("autoscraper_firestore_commit_seconds_count", operation="test", status="error")
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            metrics.instrumented_request("search", Mock(side_effect=requests.exceptions.ConnectionError()), "https://example.test")
+        with self.assertRaises(RuntimeError):
+            with metrics.track_firestore("test"):
+                raise RuntimeError("commit failed")
+
+        self.assertEqual(_sample("autoscraper_http_request_seconds_count", endpoint="search", status="error"), before_request + 1)
+        self.assertEqual(_sample("autoscraper_firestore_commit_seconds_count", operation="test", status="error"), before_commit + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import unittest
+
+from autoscraper_py.benchmarks import parser_replay
+
+FIXTURES_DIR = os.environ.get("PARSER_FIXTURES_DIR", parser_replay.FIXTURES_DIR)
+BASELINE_FILE = os.environ.get("PARSER_BASELINE", os.path.join(FIXTURES_DIR, parser_replay.BASELINE_FILE))
+THRESHOLD = float(os.environ.get("PARSER_REGRESSION_THRESHOLD", parser_replay.DEFAULT_THRESHOLD))
+
+
+@unittest.skipUnless(os.path.isdir(FIXTURES_DIR) and parser_replay.has_fixtures(FIXTURES_DIR),
+                     "No parser fixtures recorded (see benchmarks/capture_fixtures.py)")
+class TestParserReplay(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = parser_replay.load_corpus(FIXTURES_DIR)
+
+    def test_outputs_match_golden(self):
+        outputs = parser_replay.compute_outputs(self.corpus)
+        mismatches = parser_replay.compare_outputs(outputs, parser_replay.load_golden(FIXTURES_DIR))
+        self.assertEqual(mismatches, [], "Parser output changed; if intended, rerun parser_replay --update-golden")
+
+    def test_throughput_against_baseline(self):
+        baseline = parser_replay.load_baseline(BASELINE_FILE)
+        if baseline is None:
+            self.skipTest("No parser baseline on this machine (parser_replay --update-baseline)")
+        regressions = parser_replay.find_regressions(parser_replay.time_parsers(self.corpus), baseline, THRESHOLD)
+        self.assertEqual(regressions, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
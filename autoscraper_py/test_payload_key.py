@@ -0,0 +1,21 @@
+import unittest
+
+from autoscraper_py.AutoScraperUtil import normalize_payload, payload_key
+
+
+class TestPayloadKey(unittest.TestCase):
+
+    def test_equivalent_payloads_share_key(self):
+        """Formatting, 'Any' values and non-search fields don't split a search."""
+        saved = {"Make": "Honda", "Model": "Civic", "PriceMin": 0, "YearMin": "2015", "IsNew": True,
+                 "Trim": "Any", "Exclusions": ["salvage"], "custom_name": "Mine", "auto_refresh": True}
+        sent = {"Make": " honda", "Model": "CIVIC", "PriceMin": "0", "YearMin": 2015, "IsNew": "true", "Exclusions": []}
+        self.assertEqual(normalize_payload(saved), normalize_payload(sent))
+        self.assertEqual(payload_key(saved), payload_key(sent))
+
+    def test_different_searches_differ(self):
+        self.assertNotEqual(payload_key({"Make": "Honda", "YearMin": 2015}), payload_key({"Make": "Honda", "YearMin": 2016}))
+
+
+if __name__ == '__main__':
+    unittest.main()
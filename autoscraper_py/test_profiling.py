@@ -0,0 +1,95 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from autoscraper_py.profiling import PhaseTimer, profile_mode, task_profile
+
+
+class TestPhaseTimer(unittest.TestCase):
+
+    def test_phases_accumulate_across_threads(self):
+        timer = PhaseTimer()
+        threads = [threading.Thread(target=lambda: timer.add("parse", 0.5, 0.25)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with timer.phase("csv_write"):
+            pass
+        timings = timer.as_dict()
+        self.assertEqual(timings["parse"], {'wall_s': 2.0, 'cpu_s': 1.0, 'calls': 4})
+        self.assertEqual(timings["csv_write"]["calls"], 1)
+
+    def test_merge_sums_subtask_timings(self):
+        """What the fan-out callbacks do with the timings their subtasks return."""
+        timer = PhaseTimer({"initial_fetch": {'wall_s': 1.0, 'cpu_s': 0.1, 'calls': 1}})
+        timer.merge({"detail_fetch": {'wall_s': 2.0, 'cpu_s': 0.5, 'calls': 1}})
+        timer.merge({"detail_fetch": {'wall_s': 3.0, 'cpu_s': 0.5, 'calls': 1}})
+        self.assertEqual(timer.as_dict()["detail_fetch"], {'wall_s': 5.0, 'cpu_s': 1.0, 'calls': 2})
+        self.assertIn("initial_fetch", timer.as_dict())
+
+
+class TestProfileMode(unittest.TestCase):
+
+    def test_payload_flag(self):
+        self.assertIsNone(profile_mode({"Make": "Honda"}))
+        self.assertIsNone(profile_mode({"Profile": False}))
+        self.assertEqual(profile_mode({"Profile": True}), "sample")
+        self.assertEqual(profile_mode({"Profile": "true"}), "sample")
+        self.assertEqual(profile_mode({"Profile": "cProfile"}), "cprofile")
+
+    def test_profiles_are_written(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in ("sample", "cprofile"):
+                with task_profile(mode, "task-1", directory) as path:
+                    sum(i * i for i in range(200000))
+                self.assertTrue(os.path.exists(path), mode)
+            with task_profile(None, "task-2", directory) as path:
+                self.assertIsNone(path)
+
+    def test_concurrent_cprofile_tasks(self):
+        """Two worker threads (e.g. a threads pool) asking for cprofile at once: one gets the sampler."""
+        first_started, second_done = threading.Event(), threading.Event()
+        paths, errors = {}, []
+
+        def run(task_id, started, wait_for):
+            try:
+                with task_profile("cprofile", task_id, directory) as path:
+                    paths[task_id] = path
+                    if started:
+                        started.set()
+                    # Work in a pool thread too, which the threaded profiler follows
+                    worker = threading.Thread(target=lambda: sum(i * i for i in range(100000)))
+                    worker.start()
+                    worker.join()
+                    if wait_for:
+                        wait_for.wait(5)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                if not started:
+                    second_done.set()
+
+        with tempfile.TemporaryDirectory() as directory:
+            first = threading.Thread(target=run, args=("task-1", first_started, second_done))
+            first.start()
+            first_started.wait(5)
+            second = threading.Thread(target=run, args=("task-2", None, None))
+            second.start()
+            for thread in (first, second):
+                thread.join(10)
+            self.assertEqual(errors, [])
+            self.assertTrue(paths["task-1"].endswith("task-1.prof"))
+            self.assertTrue(paths["task-2"].endswith("task-2.collapsed"))
+            for path in paths.values():
+                self.assertTrue(os.path.exists(path), path)
+
+            # Once the first has finished, cprofile is available again
+            with task_profile("cprofile", "task-3", directory) as path:
+                pass
+            self.assertTrue(path.endswith("task-3.prof"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import asyncio
+import unittest
+from collections import Counter
+from unittest.mock import patch
+
+from autoscraper_py import proxy_pool
+from autoscraper_py.proxy_pool import ProxyPool, parse_proxy_config
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestProxyConfig(unittest.TestCase):
+
+    def test_config_formats(self):
+        legacy = parse_proxy_config({"http": "http://u:p@10.0.0.1:3128", "https": "http://u:p@10.0.0.1:3128"})
+        self.assertEqual([proxy.name for proxy in legacy], ["10.0.0.1:3128"])
+        self.assertEqual(legacy[0].max_concurrency, proxy_pool.DEFAULT_MAX_CONCURRENCY)
+
+        pool = parse_proxy_config({"max_concurrency": 20, "proxies": [
+            "http://10.0.0.1:8000", {"url": "http://10.0.0.2:8000", "max_concurrency": 5, "weight": 2}]})
+        self.assertEqual([(proxy.name, proxy.max_concurrency, proxy.weight) for proxy in pool],
+                         [("10.0.0.1:8000", 20, 1.0), ("10.0.0.2:8000", 5, 2.0)])
+        self.assertEqual(pool[0].proxies, {"http": "http://10.0.0.1:8000", "https": "http://10.0.0.1:8000"})
+
+    def test_empty_config_means_direct(self):
+        direct = parse_proxy_config({})
+        self.assertEqual(len(direct), 1)
+        self.assertEqual((direct[0].proxies, direct[0].url, direct[0].max_concurrency), ({}, None, None))
+
+
+class TestProxyPool(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pool = ProxyPool(parse_proxy_config({"max_concurrency": 2, "proxies": ["http://a:1", "http://b:1"]}), clock=self.clock)
+        self.a, self.b = self.pool.proxies
+
+    def test_per_proxy_concurrency_limit(self):
+        leased = [self.pool.acquire(blocking=False) for _ in range(4)]
+        self.assertEqual(Counter(proxy.name for proxy in leased), {"a:1": 2, "b:1": 2})
+        self.assertIsNone(self.pool.acquire(blocking=False))
+        self.pool.release(leased[0])
+        self.assertIs(self.pool.acquire(blocking=False), leased[0])
+
+    def test_block_spike_ejects_then_probation_readmits(self):
+        for _ in range(proxy_pool.MIN_SAMPLES):
+            self.pool.record(self.a, "blocked", None)
+        self.assertEqual(self.a.state(self.clock()), "ejected")
+        # Only b is handed out while a cools down
+        self.assertEqual({self.pool.acquire(blocking=False).name for _ in range(2)}, {"b:1"})
+        self.assertIsNone(self.pool.acquire(blocking=False))
+
+        self.clock.now += proxy_pool.BASE_COOLDOWN
+        self.assertEqual(self.a.state(self.clock()), "probation")
+        self.assertIs(self.pool.acquire(blocking=False), self.a)
+        self.assertIsNone(self.pool.acquire(blocking=False)) # One slot while on probation
+        for _ in range(proxy_pool.PROBATION_SUCCESSES):
+            self.pool.record(self.a, "ok", 0.1)
+        self.assertEqual(self.a.state(self.clock()), "active")
+
+    def test_failure_on_probation_doubles_cooldown(self):
+        self.pool._eject(self.a, self.clock(), "test")
+        self.clock.now += proxy_pool.BASE_COOLDOWN
+        self.pool.record(self.a, "blocked", None)
+        self.assertEqual(self.a.ejected_until, self.clock() + 2 * proxy_pool.BASE_COOLDOWN)
+
+    def test_selection_favours_healthy_proxies(self):
+        for _ in range(5):
+            self.pool.record(self.a, "ok", 0.05)
+            self.pool.record(self.b, "ok", 1.0)
+        picks = Counter()
+        for _ in range(500):
+            proxy = self.pool.acquire(blocking=False)
+            picks[proxy.name] += 1
+            self.pool.release(proxy)
+        self.assertGreater(picks["a:1"], picks["b:1"] * 3)
+
+    def test_lease_records_exceptions_as_errors(self):
+        with self.assertRaises(ConnectionError):
+            with self.pool.lease() as lease:
+                raise ConnectionError("proxy refused")
+        proxy = lease.proxy
+        self.assertEqual((proxy.samples, proxy.in_flight), (1, 0))
+        self.assertLess(proxy.success_rate, 1.0)
+
+    def test_last_proxy_in_rotation_is_kept(self):
+        for _ in range(proxy_pool.MIN_SAMPLES * 2):
+            self.pool.record(self.a, "blocked", None) # Ejected, and keeps failing in-flight requests
+        for _ in range(proxy_pool.MIN_SAMPLES):
+            self.pool.record(self.b, "blocked", None)
+        self.assertEqual(self.a.state(self.clock()), "ejected")
+        self.assertEqual(self.b.state(self.clock()), "active") # Scores better than a, so it stays
+        self.assertEqual(self.b.samples, 0) # Judged again after MIN_SAMPLES more requests
+        self.assertIsNotNone(self.pool.acquire(blocking=False))
+
+    def test_better_scored_ejected_proxy_is_readmitted_instead(self):
+        self.pool._eject(self.a, self.clock(), "test") # Ejected with a clean record
+        for _ in range(proxy_pool.MIN_SAMPLES):
+            self.pool.record(self.b, "blocked", None)
+        self.assertEqual(self.b.state(self.clock()), "ejected")
+        self.assertEqual(self.a.state(self.clock()), "active")
+        self.assertIs(self.pool.acquire(blocking=False), self.a)
+
+    def test_direct_connections_are_never_ejected(self):
+        pool = ProxyPool(parse_proxy_config({}), clock=self.clock)
+        direct = pool.proxies[0]
+        for _ in range(proxy_pool.MIN_SAMPLES * 3):
+            pool.record(direct, "blocked", None)
+        self.assertEqual(direct.state(self.clock()), "active")
+        self.assertIs(pool.acquire(blocking=False), direct)
+
+    def test_leases_time_out(self):
+        pool = ProxyPool(parse_proxy_config({"max_concurrency": 1, "proxies": ["http://a:1"]}), clock=self.clock)
+        pool.acquire(blocking=False)
+        with self.assertRaises(TimeoutError):
+            with pool.lease(timeout=0):
+                pass
+
+        async def advance(seconds): # The pool's clock runs on while async_lease polls
+            self.clock.now += 10
+        with patch.object(proxy_pool.asyncio, 'sleep', side_effect=advance):
+            async def lease_with_default_timeout():
+                async with pool.async_lease():
+                    pass
+            with self.assertRaises(TimeoutError):
+                asyncio.run(lease_with_default_timeout())
+        self.assertLessEqual(self.clock.now - 1000.0, proxy_pool.LEASE_TIMEOUT + 10)
+
+    def test_rate_limit_spaces_requests(self):
+        with self.pool.rate_limit(2):
+            self.assertIsNotNone(self.pool.acquire(blocking=False))
+            self.assertIsNone(self.pool.acquire(blocking=False)) # Slots are free, but the next request is 0.5 s away
+            self.clock.now += 0.5
+            self.assertIsNotNone(self.pool.acquire(blocking=False))
+        self.assertIsNotNone(self.pool.acquire(blocking=False)) # Unlimited again after the block
+
+
+if __name__ == '__main__':
+    unittest.main()
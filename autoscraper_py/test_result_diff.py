@@ -0,0 +1,93 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from autoscraper_py import result_diff
+from autoscraper_py.result_diff import build_listing_index, canonical_listing_id, diff_against_index, summarize_diff
+
+
+def make_row(ad_id, price, km, city="ottawa", **extra):
+    return {"Link": f"https://www.autotrader.ca/a/honda/civic/{city}/ontario/{ad_id}/?showcpo=1",
+            "Make": "Honda", "Price": price, "Kilometres": km, "date_cached": "2026-01-01", **extra}
+
+
+class TestCanonicalListingId(unittest.TestCase):
+
+    def test_ignores_query_and_slug(self):
+        a = "https://www.autotrader.ca/a/honda/civic/ottawa/ontario/5_64023045_on20080422140418812/?showcpo=1"
+        b = "https://www.autotrader.ca/a/honda/civic/kanata/ontario/5_64023045_on20080422140418812"
+        self.assertEqual(canonical_listing_id(a), canonical_listing_id(b))
+        self.assertNotEqual(canonical_listing_id(a), canonical_listing_id(a.replace("64023045", "64023046")))
+
+
+class TestDiffAgainstIndex(unittest.TestCase):
+
+    def test_detects_added_removed_and_changes(self):
+        previous = [make_row("5_1_on1", "$20,000", "50,000 km"), make_row("5_2_on2", "$15,000", "80,000 km"),
+                    make_row("5_3_on3", "$9,000", "120,000 km")]
+        current = [make_row("5_1_on1", "$19,500", "50,000 km", city="kanata"), # Price drop, moved city
+                   make_row("5_2_on2", "$15,000", "80,000 km"),
+                   make_row("5_4_on4", "$30,000", "10,000 km")]
+        current[1]["date_cached"] = "2026-02-01" # Re-fetched, unchanged
+
+        diff = diff_against_index(build_listing_index(previous), current, "prev")
+        self.assertEqual([row["Link"] for row in diff["added"]], [current[2]["Link"]])
+        self.assertEqual([row["Link"] for row in diff["removed"]], [previous[2]["Link"]])
+        self.assertEqual(diff["price_changes"][0]["old"], 20000.0)
+        self.assertEqual(diff["price_changes"][0]["new"], 19500.0)
+        self.assertEqual(diff["mileage_changes"], [])
+        self.assertEqual(diff["unchanged_count"], 1)
+        self.assertEqual(summarize_diff(diff), {"previous_result_id": "prev", "added": 1, "removed": 1,
+                                                "price_changes": 1, "mileage_changes": 0})
+
+    def test_rows_without_a_link_are_skipped(self):
+        previous = [make_row("5_1_on1", "$20,000", "50,000 km"), {"Make": "Honda", "Price": "$1"}, {"Link": "", "Make": "Kia"}]
+        index = build_listing_index(previous)
+        self.assertEqual(list(index), [canonical_listing_id(previous[0]["Link"])])
+        diff = diff_against_index(index, [previous[0], {"Link": None, "Make": "Ford"}])
+        self.assertEqual((diff["added"], diff["removed"], diff["unchanged_count"]), ([], [], 1))
+
+
+class TestUpdateResultDiff(unittest.TestCase):
+
+    def setUp(self):
+        previous = [make_row(f"5_{i}_on{i}", f"${10000 + i}", f"{i} km") for i in range(200)]
+        patches = [
+            patch.object(result_diff, 'save_result_analytics'),
+            patch.object(result_diff, 'update_result_metadata'),
+            patch.object(result_diff, 'find_previous_result_for_payload', return_value="prev"),
+            patch.object(result_diff, 'get_result_analytics',
+                         return_value={"version": result_diff.DIFF_VERSION, "index": build_listing_index(previous)}),
+            patch.object(result_diff, 'MAX_INDEX_BYTES', 8 * 1024),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_oversized_diff_is_cut_to_the_limit(self):
+        # 100 listings gone, 100 repriced and 200 new ones: too large even with 'added' slimmed down
+        rows = ([make_row(f"5_{i}_on{i}", f"${9000 + i}", f"{i} km") for i in range(100)]
+                + [make_row(f"5_{i}_on{i}", f"${i}", f"{i} km", Trim="LX" * 50) for i in range(1000, 1200)])
+        diff = result_diff.update_result_diff("uid", "new", "key", rows)
+
+        self.assertLessEqual(len(json.dumps(diff)), result_diff.MAX_INDEX_BYTES)
+        self.assertTrue(diff["added_truncated"])
+        self.assertTrue(diff["removed_truncated"])
+        self.assertLess(len(diff["price_changes"]), 100)
+        self.assertEqual(set(diff["added"][0]), {"id", "Link", "Price", "Kilometres"})
+        result_diff.save_result_analytics.assert_any_call("uid", "new", "diff", diff)
+        summary = result_diff.update_result_metadata.call_args.args[2]["diff_summary"]
+        self.assertEqual(summary, {"previous_result_id": "prev", "added": 200, "removed": 100,
+                                   "price_changes": 100, "mileage_changes": 0})
+
+    def test_small_diff_is_stored_whole(self):
+        rows = [make_row(f"5_{i}_on{i}", f"${10000 + i}", f"{i} km") for i in range(200)]
+        rows.append(make_row("5_1000_on1000", "$1", "1 km"))
+        diff = result_diff.update_result_diff("uid", "new", "key", rows)
+        self.assertFalse([key for key in diff if key.endswith("_truncated")])
+        self.assertEqual(diff["added"][0]["Make"], "Honda") # Full row
+        self.assertEqual(diff["unchanged_count"], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import time
+import unittest
+
+import numpy as np
+
+from autoscraper_py.result_stats import MAX_STATS_BYTES, compute_result_stats, listings_to_arrays
+
+
+def make_listing(i, price, km, year):
+    return {"Link": f"https://www.autotrader.ca/a/test/{i}", "Price": price, "Kilometres": km, "Year": year}
+
+
+class TestListingsToArrays(unittest.TestCase):
+
+    def test_parses_formatted_strings(self):
+        """Prices/km stored as formatted strings (CSV cache rows) are parsed, junk becomes NaN."""
+        listings = [
+            make_listing(0, "$25,995", "109,403 km", "2018"),
+            make_listing(1, 19000, 80000, 2017),
+            make_listing(2, "", "N/A", None),
+            make_listing(3, "0", "12", "2019"), # 0 price = no price
+        ]
+        links, price, km, year = listings_to_arrays(listings)
+        self.assertEqual(len(links), 4)
+        self.assertEqual(price[0], 25995.0)
+        self.assertEqual(km[0], 109403.0)
+        self.assertEqual(year[1], 2017.0)
+        self.assertTrue(np.isnan(price[2]))
+        self.assertTrue(np.isnan(km[2]))
+        self.assertTrue(np.isnan(price[3]))
+
+
+class TestComputeResultStats(unittest.TestCase):
+
+    def test_empty_result(self):
+        stats = compute_result_stats([])
+        self.assertEqual(stats["listing_count"], 0)
+        self.assertEqual(stats["price_by_year"], [])
+        self.assertIsNone(stats["depreciation"])
+
+    def test_price_by_year_and_ranks(self):
+        listings = [
+            make_listing(0, "10000", "100000", "2015"),
+            make_listing(1, "20000", "50000", "2015"),
+            make_listing(2, "30000", "10000", "2018"),
+        ]
+        stats = compute_result_stats(listings)
+        by_year = {row["year"]: row for row in stats["price_by_year"]}
+        self.assertEqual(by_year[2015]["count"], 2)
+        self.assertEqual(by_year[2015]["median"], 15000.0)
+        self.assertEqual(by_year[2015]["min"], 10000.0)
+        self.assertEqual(by_year[2018]["max"], 30000.0)
+        # Ranks follow the listing order
+        self.assertEqual(stats["percentile_rank"], [0.0, 50.0, 100.0])
+        self.assertEqual(stats["year_percentile_rank"], [0.0, 100.0, 100.0])
+
+    def test_unpriced_listings_are_unranked(self):
+        stats = compute_result_stats([make_listing(0, "", "1000", "2015"), make_listing(1, "9000", "1000", "2015")])
+        self.assertEqual((stats["percentile_rank"], stats["year_percentile_rank"]), ([None, 100.0], [None, 100.0]))
+
+    def test_depreciation_slope_and_outlier(self):
+        # Exact line: price drops $0.10/km, plus one listing far below the line
+        listings = [make_listing(i, 30000 - 0.1 * km, km, 2016) for i, km in enumerate(range(0, 200000, 10000))]
+        noise = [200, -150, 100, -50, 0, 120, -80, 60, -40, 30, -20, 10, 90, -110, 70, -60, 40, -30, 20, -10]
+        for listing, delta in zip(listings, noise):
+            listing["Price"] += delta
+        listings.append(make_listing(99, 2000, 50000, 2016))
+        stats = compute_result_stats(listings)
+        self.assertAlmostEqual(stats["depreciation"]["slope_per_km"], -0.1, delta=0.02)
+        outlier_links = [o["Link"] for o in stats["outliers"]]
+        self.assertEqual(outlier_links, [listings[-1]["Link"]])
+        self.assertEqual(stats["outliers"][0]["direction"], "underpriced")
+
+    def test_large_result_is_fast(self):
+        """10k listings should be well under a second."""
+        rng = np.random.default_rng(0)
+        listings = [
+            make_listing(i, f"{int(p):,}", f"{int(k):,} km", str(y))
+            for i, (p, k, y) in enumerate(zip(rng.integers(5000, 60000, 10000),
+                                              rng.integers(0, 300000, 10000),
+                                              rng.integers(2005, 2024, 10000)))
+        ]
+        start = time.perf_counter()
+        stats = compute_result_stats(listings)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(len(stats["percentile_rank"]), 10000)
+        self.assertLess(len(json.dumps(stats)), MAX_STATS_BYTES) # Still fits one Firestore document
+
+
+if __name__ == '__main__':
+    unittest.main()
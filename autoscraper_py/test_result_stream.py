@@ -0,0 +1,36 @@
+import unittest
+from unittest.mock import patch
+
+from autoscraper_py import result_stream
+from autoscraper_py.result_stream import ResultStreamSink, assemble_results
+
+
+class TestResultStream(unittest.TestCase):
+
+    def test_sink_keeps_rows_without_redis(self):
+        with patch.object(result_stream, 'get_redis_client', return_value=None):
+            sink = ResultStreamSink("task-1")
+            for i in range(result_stream.RESULT_BATCH_SIZE + 3):
+                sink.add({"Link": f"https://x/{i}"})
+            sink.flush()
+        self.assertEqual(len(sink.unpublished), result_stream.RESULT_BATCH_SIZE + 3)
+        self.assertEqual(sink.published_batches, 0)
+
+    def test_assemble_dedupes_republished_rows(self):
+        """A resumed task republishes rows; the final result keeps one per link."""
+        streamed = [{"Link": "a", "Price": "1"}, {"Link": "b"}, {"Link": "a", "Price": "2"}]
+        with patch.object(result_stream, 'get_redis_client', return_value=object()), \
+             patch.object(result_stream, 'read_result_stream', return_value=(streamed, "5-0", True)):
+            rows = assemble_results("task-2", [{"Link": "c"}], published_batches=2)
+        self.assertEqual(sorted(row["Link"] for row in rows), ["a", "b", "c"])
+        self.assertEqual(next(row for row in rows if row["Link"] == "a")["Price"], "2")
+
+    def test_assemble_requires_stream_when_rows_were_published(self):
+        with patch.object(result_stream, 'get_redis_client', return_value=None):
+            with self.assertRaises(ConnectionError):
+                assemble_results("task-3", [], published_batches=1)
+            self.assertEqual(assemble_results("task-3", [{"Link": "a"}]), [{"Link": "a"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
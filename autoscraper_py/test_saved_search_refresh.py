@@ -0,0 +1,109 @@
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from autoscraper_py import tasks, ttl_cache
+from autoscraper_py.AutoScraperUtil import payload_key
+from autoscraper_py.ttl_cache import TTLCache
+
+
+class Clock:
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+def _saved(i, user_id="uid"):
+    return {'id': f"p{i}", 'user_id': user_id, 'payload': {"Make": "Honda", "Model": f"Model{i}", "Exclusions": []}}
+
+
+class TestScheduleSavedSearchRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = [_saved(i) for i in range(60)]
+        patches = [
+            patch.object(tasks, 'get_auto_refresh_payloads', side_effect=lambda: self.saved),
+            patch.object(tasks.refresh_saved_search_task, 'apply_async'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def schedule_at(self, now):
+        with patch.object(tasks, 'time', Clock(now)):
+            tasks.schedule_saved_search_refresh()
+        return [call.kwargs for call in tasks.refresh_saved_search_task.apply_async.call_args_list]
+
+    def test_each_search_is_scheduled_once_per_interval(self):
+        interval_start = 100 * tasks.SAVED_SEARCH_REFRESH_INTERVAL
+        for hour in range(tasks._refresh_slot_count()):
+            calls = self.schedule_at(interval_start + hour * tasks.SAVED_SEARCH_REFRESH_SLOT + 5)
+        scheduled = [call['args'][1][0]['payload_id'] for call in calls]
+        self.assertEqual(sorted(scheduled), sorted(saved['id'] for saved in self.saved))
+        self.assertEqual({call['args'][2] for call in calls}, {100}) # All in the same run
+        # Within a slot, runs are spread over the hour; nothing waits anywhere near the visibility timeout
+        self.assertLess(max(call['countdown'] for call in calls), tasks.SAVED_SEARCH_REFRESH_SLOT)
+        self.assertLess(tasks.SAVED_SEARCH_REFRESH_SLOT, tasks.BROKER_VISIBILITY_TIMEOUT)
+
+    def test_identical_searches_share_a_slot(self):
+        self.saved = [_saved(1, "a"), _saved(1, "b")]
+        slot = tasks._refresh_slot_for(payload_key(self.saved[0]['payload']))
+        calls = self.schedule_at(slot * tasks.SAVED_SEARCH_REFRESH_SLOT)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([subscriber['user_id'] for subscriber in calls[0]['args'][1]], ["a", "b"])
+
+
+class TestRefreshSavedSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patches = [
+            patch.object(tasks, 'refresh_runs', TTLCache('saved_search_refresh_runs', 3600, cache_dir=self.tmp.name)),
+            patch.object(ttl_cache, 'get_redis_client', return_value=None),
+            patch.object(tasks, 'fetch_autotrader_data', return_value={'estimated_count': 10, 'max_page': 1, 'initial_results_html': ["html"]}),
+            patch.object(tasks, 'process_links_and_update_cache', return_value=[{'Link': "/a/1"}]),
+            patch.object(tasks, 'get_user_settings', return_value={'search_tokens': 100}),
+            patch.object(tasks, 'save_results', return_value={'success': True, 'doc_id': "doc"}),
+            patch.object(tasks, 'deduct_search_tokens', return_value={'success': True, 'tokens_remaining': 90}),
+            patch.object(tasks, 'update_payload'),
+            patch.object(tasks, '_record_result_diff'),
+            patch.object(tasks.ProgressTask, 'update_progress'),
+            patch.object(tasks, 'publish_task_event'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.subscribers = [{'user_id': "a", 'payload_id': "p1", 'exclusions': [], 'custom_name': None},
+                            {'user_id': "b", 'payload_id': "p2", 'exclusions': [], 'custom_name': None}]
+
+    def refresh(self, run=7):
+        return tasks.refresh_saved_search_task.apply(args=({"Make": "Honda"}, self.subscribers, run)).get()
+
+    def test_redelivered_refresh_neither_saves_nor_charges_again(self):
+        self.assertEqual([outcome.get('doc_id') for outcome in self.refresh()['subscribers']], ["doc", "doc"])
+        outcomes = self.refresh()['subscribers']
+        self.assertEqual([outcome['skipped'] for outcome in outcomes], ['already refreshed'] * 2)
+        self.assertEqual(tasks.save_results.call_count, 2)
+        self.assertEqual(tasks.deduct_search_tokens.call_count, 2)
+        tasks.fetch_autotrader_data.assert_called_once() # Nobody left to serve, so no scrape either
+
+        self.refresh(run=8) # The next interval is a new run
+        self.assertEqual(tasks.deduct_search_tokens.call_count, 4)
+
+    def test_subscriber_claimed_by_another_delivery_is_skipped(self):
+        tasks.refresh_runs.add("p2:7", "other-task") # Claimed after this delivery checked, before it saved
+        with patch.object(tasks.refresh_runs, 'get', return_value=None):
+            outcomes = self.refresh()['subscribers']
+        self.assertEqual(outcomes[1], {'user_id': "b", 'payload_id': "p2", 'skipped': 'already refreshed'})
+        tasks.deduct_search_tokens.assert_called_once_with("a", tasks.required_tokens_for(10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import patch
+
+from autoscraper_py import tasks
+from autoscraper_py.scrape_batch import merge_search_links, split_batch_rows
+
+
+def _row(link, trim="LX"):
+    return {"Link": link, "Make": "Honda", "Trim": trim}
+
+
+class TestBatchHelpers(unittest.TestCase):
+
+    def test_shared_listings_are_merged_once(self):
+        unique, links = merge_search_links([
+            [{"link": "/a/1"}, {"link": "/a/2"}, {"link": "/a/1"}],
+            [{"link": "/a/2"}, {"link": "/a/3"}, {}],
+        ])
+        self.assertEqual([item["link"] for item in unique], ["/a/1", "/a/2", "/a/3"])
+        self.assertEqual(links, [["/a/1", "/a/2"], ["/a/2", "/a/3"]])
+
+    def test_rows_are_split_with_each_search_exclusions(self):
+        rows = [_row("/a/1"), _row("/a/2", trim="Sport"), _row("/a/3")] # /a/4 failed to fetch
+        split = split_batch_rows(rows, [["/a/2", "/a/1"], ["/a/2", "/a/3", "/a/4"]], [[], ["sport"]])
+        self.assertEqual([[row["Link"] for row in search] for search in split], [["/a/2", "/a/1"], ["/a/3"]])
+
+
+class TestScrapeBatchTask(unittest.TestCase):
+
+    def setUp(self):
+        self.process = patch.object(tasks, 'process_links_and_update_cache',
+                                    side_effect=lambda data, **kwargs: [_row(item["link"]) for item in data]).start()
+        self.save = patch.object(tasks, 'save_results', return_value={'success': True, 'doc_id': 'doc'}).start()
+        self.deduct = patch.object(tasks, 'deduct_search_tokens', return_value={'success': True, 'tokens_remaining': 7}).start()
+        self.fetch = patch.object(tasks, 'fetch_autotrader_data',
+                                  return_value=[{"link": "/a/1"}, {"link": "/a/2"}, {"link": "/a/3"}]).start()
+        patch.object(tasks, '_record_result_diff').start()
+        patch.object(tasks.ProgressTask, 'update_progress').start()
+        self.addCleanup(patch.stopall)
+
+    def test_each_listing_is_fetched_once_and_saved_per_search(self):
+        quotes = [
+            {'estimated_count': 3, 'max_page': 2, 'initial_results_html': [{"link": "/a/1"}]},
+            {'estimated_count': 2, 'max_page': 1, 'initial_results_html': [{"link": "/a/2"}, {"link": "/a/4"}]},
+        ]
+        result = tasks.scrape_batch_task([{"Make": "Honda"}, {"Make": "Honda", "Trim": "LX"}], "uid", [1.5, 1.0], quotes)
+
+        self.fetch.assert_called_once() # Only the multi-page search fetches more pages
+        self.process.assert_called_once()
+        self.assertEqual([item["link"] for item in self.process.call_args.kwargs['data']], ["/a/1", "/a/2", "/a/3", "/a/4"])
+        self.assertEqual([len(call.args[1]) for call in self.save.call_args_list], [3, 2])
+        self.deduct.assert_called_once_with("uid", 2.5)
+        self.assertEqual((result['unique_listings'], result['listings_across_searches']), (4, 5))
+
+    def test_search_that_fails_to_save_is_not_charged(self):
+        self.save.side_effect = [{'success': False, 'error': 'boom'}, {'success': True, 'doc_id': 'doc'}]
+        quotes = [{'estimated_count': 1, 'max_page': 1, 'initial_results_html': [{"link": "/a/1"}]}] * 2
+        result = tasks.scrape_batch_task([{"Make": "Honda"}, {"Make": "Acura"}], "uid", [1.0, 1.0], quotes)
+        self.deduct.assert_called_once_with("uid", 1.0)
+        self.assertEqual(result['searches'][0]['tokens_charged'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from autoscraper_py import AutoScraper
+from autoscraper_py import listing_cache, scrape_checkpoint, tasks
+from autoscraper_py.profiling import PhaseTimer
+from autoscraper_py.scrape_checkpoint import ScrapeCheckpoint
+
+
+class TestScrapeCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        cache = scrape_checkpoint.TTLCache('scrape_checkpoint', scrape_checkpoint.CHECKPOINT_TTL, cache_dir=self.tmp.name)
+        patches = [
+            patch.object(scrape_checkpoint, 'checkpoint_cache', cache),
+            patch('autoscraper_py.ttl_cache.get_redis_client', return_value=None), # Exercise the disk fallback
+            patch.object(AutoScraper, 'listing_cache', listing_cache.ListingCache(filepath=os.path.join(self.tmp.name, "cache.csv"))),
+            patch.object(listing_cache, 'get_redis_client', return_value=None),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_state_survives_reload(self):
+        checkpoint = ScrapeCheckpoint("task-1")
+        checkpoint.record_page(3, [{"link": "a"}])
+        checkpoint.record_row("a", {"Link": "a"}, True)
+        checkpoint.flush()
+
+        resumed = ScrapeCheckpoint("task-1")
+        self.assertEqual(resumed.completed_pages(), {3: [{"link": "a"}]})
+        self.assertEqual(resumed.fetched_row("a"), ({"Link": "a"}, True))
+        self.assertIsNone(resumed.fetched_row("b"))
+
+    def test_result_replaces_progress(self):
+        checkpoint = ScrapeCheckpoint("task-2")
+        checkpoint.record_row("a", {"Link": "a"}, True)
+        checkpoint.record_result({"status": "Complete"})
+
+        resumed = ScrapeCheckpoint("task-2")
+        self.assertEqual(resumed.result, {"status": "Complete"})
+        self.assertEqual(resumed.state["rows"], {})
+
+        resumed.clear()
+        self.assertIsNone(ScrapeCheckpoint("task-2").result)
+
+    def test_process_links_skips_checkpointed_rows(self):
+        """A resumed scrape only fetches detail pages missing from the checkpoint."""
+        checkpoint = ScrapeCheckpoint("task-3")
+        checkpoint.record_row("https://x/1", {"Link": "https://x/1", "Make": "Honda"}, True)
+        checkpoint.record_row("https://x/2", {"Link": "https://x/2", "Make": "Salvage"}, False)
+
+        links = [{"link": "https://x/1"}, {"link": "https://x/2"}, {"link": "https://x/3"}]
+        with patch.object(AutoScraper, 'extract_vehicle_info', return_value={"Make": "Honda"}) as extract, \
+             patch.object(AutoScraper, 'cls'):
+            rows = AutoScraper.process_links_and_update_cache(links, [], max_workers=2, checkpoint=checkpoint)
+
+        extract.assert_called_once_with("https://x/3")
+        self.assertEqual(sorted(row["Link"] for row in rows), ["https://x/1", "https://x/3"])
+        self.assertIsNotNone(ScrapeCheckpoint("task-3").fetched_row("https://x/3"))
+
+    def test_retry_after_a_failure_past_the_charge_does_not_save_or_charge_again(self):
+        class Task:
+            request = type('Request', (), {'id': "task-4"})
+            def update_progress(self, *args, **kwargs):
+                pass
+
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name) # Results/ is written to the working directory
+        try:
+            with patch.object(tasks, 'save_results', return_value={'success': True, 'doc_id': "doc-1"}) as save, \
+                 patch.object(tasks, 'deduct_search_tokens', return_value={'success': True, 'tokens_remaining': 3}) as deduct, \
+                 patch.object(tasks, '_record_result_diff'), patch.object(tasks, 'close_result_stream'), \
+                 patch.object(tasks, 'update_result_metadata', side_effect=[ConnectionError("Firestore down"), None]):
+                args = (Task(), {"Make": "Honda"}, "uid", 2.0, {}, [{"Link": "https://x/1"}])
+                with self.assertRaises(ConnectionError):
+                    tasks._finalize_scrape(*args, ScrapeCheckpoint("task-4"), PhaseTimer())
+                result = tasks._finalize_scrape(*args, ScrapeCheckpoint("task-4"), PhaseTimer()) # The retry
+        finally:
+            os.chdir(cwd)
+
+        save.assert_called_once()
+        deduct.assert_called_once_with("uid", 2.0)
+        self.assertEqual((result['doc_id'], result['tokens_remaining']), ("doc-1", 3))
+        self.assertEqual(ScrapeCheckpoint("task-4").result, result)
+
+
+if __name__ == '__main__':
+    unittest.main()
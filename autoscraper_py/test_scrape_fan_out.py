@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import patch
+
+from celery.exceptions import ChordError, Ignore
+
+from autoscraper_py import tasks
+
+
+class TestFanOutFailure(unittest.TestCase):
+
+    def setUp(self):
+        self.replaced = []
+        patches = [
+            patch.object(tasks.scrape_and_process_task, 'replace', side_effect=self.replace),
+            patch.object(tasks.fan_out_detail_fetch_task, 'replace', side_effect=self.replace),
+            patch.object(tasks.celery_app.backend, 'mark_as_failure'),
+            patch.object(tasks, 'close_result_stream'),
+            patch.object(tasks, 'release_scrape_slot'),
+            patch.object(tasks, 'publish_task_event'),
+            patch.object(tasks, 'open_result_stream'),
+            patch.object(tasks.ScrapeCheckpoint, 'result', None),
+            patch.object(tasks.ProgressTask, 'update_progress'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def replace(self, sig):
+        self.replaced.append(sig)
+        return Ignore()
+
+    def fail_chunk(self, fan_out):
+        """What the result backend does when a chord header task fails for good."""
+        fan_out.body.freeze("root-1") # replace() gives the callback the root task ID
+        try:
+            raise ChordError("process_link_chunk_task failed")
+        except ChordError as exc:
+            tasks.celery_app.backend.chord_error_from_stack(fan_out.body, exc)
+
+    def test_failed_chunk_fails_the_scrape(self):
+        pages = [{'results': [{'link': f"/a/{i}"} for i in range(700)], 'timings': {}}]
+        tasks.fan_out_detail_fetch_task.apply(args=(pages, {"Make": "Honda"}, "uid", 7.0, {}), task_id="root-1")
+        fan_out = self.replaced[-1]
+        self.assertEqual(len(fan_out.tasks), 3) # 700 links in chunks of SCRAPE_LINKS_PER_SUBTASK
+
+        self.fail_chunk(fan_out)
+        exc = tasks.celery_app.backend.mark_as_failure.call_args_list[0].args[1]
+        self.assertEqual(tasks.celery_app.backend.mark_as_failure.call_args_list[0].args[0], "root-1")
+        self.assertIsInstance(exc, ChordError)
+        tasks.close_result_stream.assert_any_call("root-1")
+        tasks.release_scrape_slot.assert_any_call("root-1")
+        tasks.publish_task_event.assert_any_call("root-1", {'state': 'FAILURE'})
+
+    def test_both_stages_link_the_errback_once(self):
+        tasks.scrape_and_process_task.apply(args=({"Make": "Honda"}, "uid", 7.0, {'max_page': 45}), task_id="root-1")
+        pages_stage = self.replaced[-1]
+        self.assertEqual([errback['task'] for errback in pages_stage.body.options['link_error']], ['tasks.scrape_failed_task'])
+
+        # The detail stage replaces the pages callback, whose request carries that errback
+        pages = [{'results': [{'link': "/a/1"}], 'timings': {}}]
+        tasks.fan_out_detail_fetch_task.apply(args=(pages, {"Make": "Honda"}, "uid", 7.0, {}), task_id="root-1",
+                                              link_error=pages_stage.body.options['link_error'])
+        self.assertNotIn('link_error', self.replaced[-1].body.options)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+from unittest.mock import patch
+
+from autoscraper_py import scrape_scheduling
+from autoscraper_py.scrape_scheduling import MAX_ACTIVE_SCRAPES_PER_USER, acquire_scrape_slot, release_scrape_slot
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class FakeRedis:
+    """The string and sorted-set commands the slot functions use (key expiry is not modelled)."""
+
+    def __init__(self):
+        self.values = {}
+        self.zsets = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        for member in [member for member, score in zset.items() if low <= score <= high]:
+            del zset[member]
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    def expire(self, key, seconds):
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class FakePipeline:
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.commands]
+
+
+class TestScrapeSlots(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.redis = FakeRedis()
+        patches = [
+            patch.object(scrape_scheduling, 'time', self.clock),
+            patch.object(scrape_scheduling, 'get_redis_client', side_effect=lambda: self.redis),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def active(self, user_id="uid"):
+        return sorted(self.redis.zsets.get(scrape_scheduling.ACTIVE_SCRAPES_KEY.format(user_id=user_id), {}))
+
+    def test_cap_per_user(self):
+        for i in range(MAX_ACTIVE_SCRAPES_PER_USER):
+            self.assertTrue(acquire_scrape_slot("uid", f"t{i}"))
+        self.assertFalse(acquire_scrape_slot("uid", "extra"))
+        self.assertNotIn("extra", self.active()) # A refused task doesn't keep a slot
+        self.assertTrue(acquire_scrape_slot("other", "t-other")) # Other users are unaffected
+
+    def test_release_frees_the_slot(self):
+        for i in range(MAX_ACTIVE_SCRAPES_PER_USER):
+            acquire_scrape_slot("uid", f"t{i}")
+        release_scrape_slot("t0")
+        release_scrape_slot("t0") # Errback and finalize may both release
+        release_scrape_slot("unknown")
+        self.assertEqual(self.active(), [f"t{i}" for i in range(1, MAX_ACTIVE_SCRAPES_PER_USER)])
+        self.assertTrue(acquire_scrape_slot("uid", "next"))
+
+    def test_stale_slots_expire(self):
+        for i in range(MAX_ACTIVE_SCRAPES_PER_USER):
+            acquire_scrape_slot("uid", f"lost{i}") # e.g. the worker was killed before releasing
+        self.clock.now += scrape_scheduling.ACTIVE_SCRAPE_MAX_AGE - 1
+        self.assertFalse(acquire_scrape_slot("uid", "t1"))
+        self.clock.now += 2
+        self.assertTrue(acquire_scrape_slot("uid", "t1"))
+        self.assertEqual(self.active(), ["t1"])
+
+    def test_cap_not_enforced_without_redis(self):
+        self.redis = None
+        for i in range(MAX_ACTIVE_SCRAPES_PER_USER + 1):
+            self.assertTrue(acquire_scrape_slot("uid", f"t{i}"))
+        release_scrape_slot("t0")
+
+
+if __name__ == '__main__':
+    unittest.main()
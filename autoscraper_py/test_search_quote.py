@@ -0,0 +1,72 @@
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from autoscraper_py import search_quote
+from autoscraper_py.routes import api_results
+
+QUOTE = {'estimated_count': 42, 'initial_results_html': [{'link': '/a/1'}], 'max_page': 3}
+
+
+class TestSearchQuote(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patches = [
+            patch.object(search_quote, 'quote_cache', search_quote.TTLCache('search_quote', 300, cache_dir=self.tmp.name)),
+            patch.object(search_quote, 'pending_quotes', search_quote.TTLCache('search_quote_pending', 60, cache_dir=self.tmp.name)),
+            patch('autoscraper_py.ttl_cache.get_redis_client', return_value=None), # Exercise the disk fallback
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.probe = patch.object(search_quote, 'fetch_autotrader_data', return_value=dict(QUOTE)).start()
+        self.addCleanup(patch.stopall)
+
+    def test_probe_is_small_and_cached_per_search(self):
+        search_quote.fetch_quote({"Make": "Honda", "Model": "Civic", "Exclusions": ["salvage"]})
+        kwargs = self.probe.call_args.kwargs
+        self.assertEqual((kwargs['initial_fetch_only'], kwargs['max_workers'], kwargs['max_retries']),
+                         (True, 1, search_quote.QUOTE_MAX_RETRIES))
+        # Equivalent searches (case, exclusions) share the quote
+        self.assertEqual(search_quote.get_cached_quote({"Make": "honda", "Model": "CIVIC"}), QUOTE)
+        self.assertIsNone(search_quote.get_cached_quote({"Make": "Honda", "Model": "Accord"}))
+
+    def test_failed_probe_is_not_cached(self):
+        self.probe.return_value = {'estimated_count': 15, 'initial_results_html': [], 'max_page': 1}
+        search_quote.fetch_quote({"Make": "Honda"})
+        self.assertIsNone(search_quote.get_cached_quote({"Make": "Honda"}))
+
+    def test_request_uses_cache_then_joins_running_probe(self):
+        task = MagicMock()
+        task.apply_async.return_value.get.return_value = dict(QUOTE)
+        with patch.object(api_results, 'fetch_quote_task', task), \
+             patch.object(api_results, 'get_cached_quote', search_quote.get_cached_quote), \
+             patch.object(api_results, 'pending_quotes', search_quote.pending_quotes):
+            self.assertEqual(api_results._search_quote({"Make": "Ford"}), (QUOTE, False))
+            task.apply_async.assert_called_once()
+            # The probe is still marked as running: a second request waits on it instead of starting another
+            api_results._search_quote({"Make": "ford"})
+            task.apply_async.assert_called_once()
+            task.AsyncResult.assert_called_once_with(task.apply_async.call_args.kwargs['task_id'])
+
+            search_quote.fetch_quote({"Make": "Ford"})
+            self.assertEqual(api_results._search_quote({"Make": "Ford"}), (QUOTE, True))
+
+    def test_failed_enqueue_is_not_joined(self):
+        task = MagicMock()
+        task.apply_async.side_effect = [ConnectionError("broker down"), MagicMock()]
+        with patch.object(api_results, 'fetch_quote_task', task), \
+             patch.object(api_results, 'get_cached_quote', search_quote.get_cached_quote), \
+             patch.object(api_results, 'pending_quotes', search_quote.pending_quotes):
+            with self.assertRaises(ConnectionError):
+                api_results._start_quote({"Make": "Ford"})
+            # The next request starts its own probe instead of waiting on one that was never sent
+            api_results._start_quote({"Make": "Ford"})
+        self.assertEqual(task.apply_async.call_count, 2)
+        task.AsyncResult.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
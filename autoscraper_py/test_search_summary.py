@@ -0,0 +1,110 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from autoscraper_py.routes import api_ai
+
+
+class StubSearchService:
+    """Stands in for the Custom Search client: service.cse().list(q=...).execute(http=...)."""
+
+    def __init__(self, respond):
+        self.respond = respond # query -> response dict, or raises
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def cse(self):
+        return self
+
+    def list(self, q, cx, num):
+        service = self
+
+        class Request:
+            def execute(self, http=None):
+                with service._lock:
+                    service.calls.append(q)
+                return service.respond(q)
+        return Request()
+
+
+def _http_error(status):
+    return HttpError(httplib2.Response({'status': status}), b'')
+
+
+class TestBuildSearchSummary(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.object(api_ai.time, 'sleep') # Retry backoff
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_results_keep_query_order(self):
+        def respond(query):
+            threading.Event().wait(0.002 * (len(query) % 5)) # Finish out of order
+            return {'items': [{'title': query, 'link': 'https://example.com', 'snippet': 'text'}]}
+
+        summary, found_any, failed = api_ai.build_search_summary(StubSearchService(respond), "cx", 2018, "Honda", "Civic")
+        self.assertTrue(found_any)
+        self.assertEqual(failed, 0)
+        headers = [line for line in summary.splitlines() if line.startswith("Search results for")]
+        self.assertEqual(len(headers), 25)
+        self.assertEqual(headers[0], "Search results for '\"2018 Honda Civic\" reliability rating':")
+        self.assertEqual(headers[-1], "Search results for '\"2018 Honda Civic\" things to know before buying':")
+
+    def test_retries_share_one_budget(self):
+        def respond(query):
+            raise _http_error(503)
+
+        service = StubSearchService(respond)
+        summary, found_any, failed = api_ai.build_search_summary(service, "cx", 2018, "Honda", "Civic")
+        self.assertFalse(found_any)
+        self.assertEqual(failed, 25)
+        # One attempt per query, plus the shared retries (not 3 attempts for each of the 25 queries)
+        self.assertEqual(len(service.calls), 25 + api_ai.SEARCH_RETRY_BUDGET)
+
+    def test_client_errors_are_not_retried(self):
+        def respond(query):
+            raise _http_error(403)
+
+        service = StubSearchService(respond)
+        api_ai.build_search_summary(service, "cx", 2018, "Honda", "Civic")
+        self.assertEqual(len(service.calls), 25)
+
+    def test_phase_timeout_cancels_queued_queries(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def respond(query):
+            release.wait(5)
+            return {'items': [{'title': 'late', 'link': 'https://example.com'}]}
+
+        service = StubSearchService(respond)
+        with patch.object(api_ai, 'SEARCH_PHASE_TIMEOUT', 0.2):
+            start = time.monotonic()
+            summary, found_any, failed = api_ai.build_search_summary(service, "cx", 2018, "Honda", "Civic")
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertFalse(found_any)
+        self.assertEqual(failed, 25)
+        self.assertEqual(summary.count("Search failed for"), 25)
+        release.set()
+        threading.Event().wait(0.1) # time.sleep is patched
+        # Only the queries already running when the deadline hit were sent; the queued ones were cancelled
+        self.assertEqual(len(service.calls), api_ai.SEARCH_MAX_WORKERS)
+
+    def test_empty_results_are_not_failures(self):
+        def respond(query):
+            if "reliability rating" in query:
+                raise _http_error(403)
+            return {} # Completed, nothing found
+
+        summary, found_any, failed = api_ai.build_search_summary(StubSearchService(respond), "cx", 2018, "Honda", "Civic")
+        self.assertEqual((found_any, failed), (False, 1))
+        self.assertEqual(summary.count("No significant results found"), 24)
+
+
+if __name__ == '__main__':
+    unittest.main()
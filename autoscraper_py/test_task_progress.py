@@ -0,0 +1,177 @@
+import json
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from flask import Flask
+
+from autoscraper_py import tasks
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakePubSub:
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.channels = []
+        self.closed = False
+
+    def subscribe(self, channel):
+        self.channels.append(channel)
+
+    def get_message(self, timeout=None):
+        return self.messages.pop(0) if self.messages else None
+
+    def close(self):
+        self.closed = True
+
+
+class FakeRedis:
+
+    def __init__(self, events):
+        self.pubsubs = []
+        self.events = events
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        self.pubsubs.append(FakePubSub([None if event is None else {'data': json.dumps(event)} for event in self.events]))
+        return self.pubsubs[-1]
+
+
+class TestProgressThrottling(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patches = [
+            patch.object(tasks, 'time', self.clock),
+            patch.object(tasks.ProgressTask, 'update_state'),
+            patch.object(tasks, 'publish_task_event'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.task = tasks.ProgressTask()
+        self.addCleanup(tasks.ProgressTask._progress_sent_at.clear)
+
+    def sent(self):
+        return [call.args[1]['progress'] for call in tasks.publish_task_event.call_args_list]
+
+    def test_updates_are_coalesced_per_interval(self):
+        for current in range(0, 11):
+            self.task.update_progress(current, 10, task_id="t1")
+            self.clock.now += tasks.PROGRESS_MIN_INTERVAL / 4
+        # Step start and end always go out; in between, one update per PROGRESS_MIN_INTERVAL
+        self.assertEqual(self.sent(), [0, 4, 8, 10])
+        self.assertEqual(tasks.ProgressTask.update_state.call_count, 4)
+        self.assertEqual(tasks.ProgressTask.update_state.call_args.kwargs['meta'], {'current': 10, 'total': 10, 'step': "Processing"})
+
+    def test_tasks_are_throttled_separately(self):
+        self.task.update_progress(1, 10, task_id="t1")
+        self.task.update_progress(1, 10, task_id="t2")
+        self.task.update_progress(2, 10, task_id="t1")
+        self.assertEqual(self.sent(), [1, 1])
+
+
+class TestTaskStream(unittest.TestCase):
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(tasks.tasks_bp)
+        self.client = app.test_client()
+        self.states = []
+        patches = [
+            patch.object(tasks, '_task_status_payload', side_effect=lambda task_id: self.states.pop(0)),
+            patch.object(tasks, 'STREAM_POLL_INTERVAL', 0),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def stream(self, events):
+        self.redis = FakeRedis(events)
+        with patch.object(tasks, 'get_redis_client', return_value=self.redis):
+            response = self.client.get('/api/tasks/stream/t1')
+            body = response.get_data(as_text=True)
+        return response, body
+
+    def test_events_until_the_final_state(self):
+        self.states = [{'task_id': 't1', 'state': 'PENDING'}, {'task_id': 't1', 'state': 'PENDING'},
+                       {'task_id': 't1', 'state': 'SUCCESS', 'result': {'status': 'Complete'}}]
+        response, body = self.stream([{'task_id': 't1', 'state': 'PROGRESS', 'progress': 3, 'total': 10, 'step': "Fetching"}, None,
+                                      {'state': 'SUCCESS'}])
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        chunks = body.split("\n\n")
+        self.assertEqual(chunks[0], f"retry: {tasks.STREAM_RETRY_MS}\ndata: " + json.dumps({'task_id': 't1', 'state': 'PENDING'}))
+        self.assertEqual(json.loads(chunks[1][len("data: "):]),
+                         {'task_id': 't1', 'state': 'PROGRESS', 'progress': 3, 'total': 10, 'step': "Fetching"})
+        self.assertEqual(chunks[2], ": keepalive") # Quiet period, task still running
+        self.assertEqual(json.loads(chunks[3][len("data: "):])['result'], {'status': 'Complete'}) # Final state read from the backend
+        self.assertEqual(chunks[4:], [""])
+        self.assertEqual(self.redis.pubsubs[0].channels, ["task_progress:t1"])
+        self.assertTrue(self.redis.pubsubs[0].closed)
+
+    def test_finished_task_sends_one_event(self):
+        self.states = [{'task_id': 't1', 'state': 'FAILURE', 'error': "boom"}]
+        _, body = self.stream([])
+        self.assertEqual(body.count("data: "), 1)
+
+    def test_stream_ends_after_max_duration(self):
+        self.states = [{'task_id': 't1', 'state': 'PENDING'}]
+        with patch.object(tasks, 'STREAM_MAX_DURATION', 0):
+            _, body = self.stream([])
+        self.assertEqual(body.count("data: "), 1) # The client reconnects and gets the current state again
+
+    def test_unavailable_without_redis(self):
+        with patch.object(tasks, 'get_redis_client', return_value=None):
+            self.assertEqual(self.client.get('/api/tasks/stream/t1').status_code, 503)
+
+
+class TestPartialResults(unittest.TestCase):
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.secret_key = "test"
+        app.register_blueprint(tasks.tasks_bp)
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session['user_id'] = "uid"
+            session['last_validated'] = time.time()
+        self.state = 'PROGRESS'
+        self.reads = []
+        patches = [
+            patch('autoscraper_py.auth_decorator.get_user_settings', return_value={}),
+            patch.object(tasks, 'get_result_stream_owner', return_value="uid"),
+            patch.object(tasks, 'read_result_stream', side_effect=self.read),
+            patch.object(tasks, 'AsyncResult', side_effect=lambda task_id, app: MagicMock(state=self.state)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def read(self, task_id, after='0-0', block_ms=None):
+        self.reads.append((after, block_ms))
+        return [], after, False
+
+    def results(self):
+        return self.client.get('/api/tasks/results/t1?after=5-0&wait=4000').get_json()
+
+    def test_running_task_is_not_done(self):
+        self.assertEqual(self.results(), {'success': True, 'rows': [], 'last_id': "5-0", 'done': False})
+        self.assertEqual(self.reads, [("5-0", tasks.RESULTS_MAX_WAIT_MS)])
+
+    def test_failed_task_without_end_marker_is_done(self):
+        self.state = 'FAILURE'
+        self.assertTrue(self.results()['done'])
+        self.assertEqual(self.reads[-1], ("5-0", None)) # Rows published just before it finished are still returned
+
+
+if __name__ == '__main__':
+    unittest.main()
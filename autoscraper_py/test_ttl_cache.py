@@ -0,0 +1,227 @@
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from flask import Flask
+
+from autoscraper_py import ttl_cache
+from autoscraper_py.routes import api_ai
+from autoscraper_py.ttl_cache import TTLCache
+
+
+class FakeRedis:
+    """The string commands TTLCache uses; expiry is driven by the same clock as the disk tier."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.values = {}
+
+    def get(self, key):
+        value, expires_at = self.values.get(key, (None, 0))
+        return value if expires_at > self.clock.time() else None
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and self.get(key) is not None:
+            return None
+        self.values[key] = (value, self.clock.time() + ex)
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.clock = Clock()
+        self.redis = None
+        patches = [
+            patch.object(ttl_cache, 'time', self.clock),
+            patch.object(ttl_cache, 'get_redis_client', side_effect=lambda: self.redis),
+            patch.object(ttl_cache, 'reset_redis_client'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.cache = TTLCache('test', 60, cache_dir=self.tmp.name)
+
+    def check_expiry_and_add(self):
+        self.cache.set('a', {'rates': [1, 2]})
+        self.clock.now += 59
+        self.assertEqual(self.cache.get('a'), {'rates': [1, 2]})
+        self.clock.now += 2
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('a', 'missing'), 'missing')
+
+        # add() only stores absent keys, so it works as a lock that expires on its own
+        self.assertTrue(self.cache.add('lock', True, ttl=10))
+        self.assertFalse(self.cache.add('lock', True, ttl=10))
+        self.clock.now += 11
+        self.assertTrue(self.cache.add('lock', True, ttl=10))
+        self.cache.delete('lock')
+        self.assertTrue(self.cache.add('lock', True, ttl=10))
+
+    def test_disk_tier_without_redis(self):
+        self.check_expiry_and_add()
+        self.cache.set('never', 1, ttl=0) # A ttl of 0 disables caching
+        self.assertIsNone(self.cache.get('never'))
+
+    def test_redis_tier(self):
+        self.redis = FakeRedis(self.clock)
+        self.check_expiry_and_add()
+
+    def test_falls_back_to_disk_when_redis_fails(self):
+        self.redis = FakeRedis(self.clock)
+        self.redis.get = self.redis.set = lambda *args, **kwargs: (_ for _ in ()).throw(ConnectionError("down"))
+        self.cache.set('a', 'value')
+        self.redis = None # As after reset_redis_client(), until the reconnect interval passes
+        self.assertEqual(self.cache.get('a'), 'value')
+        self.assertTrue(ttl_cache.reset_redis_client.called)
+
+
+class TestSearchContextCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patches = [
+            patch.object(api_ai, 'search_context_cache', TTLCache('search_context', 60, cache_dir=self.tmp.name)),
+            patch.object(ttl_cache, 'get_redis_client', return_value=None),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_found_context_is_cached_per_car(self):
+        with patch.object(api_ai, 'build_search_summary', return_value=("context", True, 0)) as build:
+            self.assertEqual(api_ai.get_search_summary("service", "cx", 2018, "Honda", "Civic"), "context")
+            self.assertEqual(api_ai.get_search_summary("service", "cx", " 2018", "honda ", "CIVIC"), "context")
+        build.assert_called_once()
+
+    def test_failed_search_is_not_cached(self):
+        with patch.object(api_ai, 'build_search_summary', return_value=("nothing", False, 25)) as build:
+            api_ai.get_search_summary("service", "cx", 2018, "Honda", "Civic")
+            api_ai.get_search_summary("service", "cx", 2018, "Honda", "Civic")
+        self.assertEqual(build.call_count, 2)
+
+    def test_partly_failed_search_is_cached_briefly(self):
+        clock = Clock()
+        with patch.object(api_ai, 'build_search_summary', return_value=("partial", True, 3)) as build, \
+             patch.object(ttl_cache, 'time', clock):
+            api_ai.get_search_summary("service", "cx", 2018, "Honda", "Civic")
+            clock.now += api_ai.SEARCH_CONTEXT_PARTIAL_TTL - 1
+            api_ai.get_search_summary("service", "cx", 2018, "Honda", "Civic")
+            self.assertEqual(build.call_count, 1)
+            clock.now += 2 # Retried well before SEARCH_CONTEXT_CACHE_TTL
+            api_ai.get_search_summary("service", "cx", 2018, "Honda", "Civic")
+        self.assertEqual(build.call_count, 2)
+
+
+class TestExchangeRateRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.fetches = []
+        patches = [
+            patch.object(api_ai, 'exchange_rate_cache', TTLCache('exchange_rates', 3600, cache_dir=self.tmp.name)),
+            patch.object(ttl_cache, 'get_redis_client', return_value=None),
+            patch.object(api_ai, '_fetch_exchange_rates', side_effect=self.fetch),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def fetch(self, api_key):
+        self.fetches.append(api_key)
+        self.release.wait(5) # A slow upstream
+        return {'USD_per_CAD': 0.75}
+
+    def test_stale_rates_are_served_while_one_refresh_runs(self):
+        stale_at = time.time() - api_ai.EXCHANGE_RATE_REFRESH_AFTER - 1
+        api_ai.exchange_rate_cache.set('CAD', {'rates': {'USD_per_CAD': 0.7}, 'fetched_at': stale_at})
+
+        results = []
+        callers = [threading.Thread(target=lambda: results.append(api_ai.get_exchange_rates("key"))) for _ in range(5)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join(2)
+        self.assertEqual(results, [{'USD_per_CAD': 0.7}] * 5) # Nobody waited for the slow fetch
+        self.assertEqual(self.fetches, ["key"])
+
+        self.release.set()
+        for thread in threading.enumerate():
+            if thread.name == 'exchange-rate-refresh':
+                thread.join(2)
+        self.assertEqual(api_ai.get_exchange_rates("key"), {'USD_per_CAD': 0.75})
+        self.assertIsNone(api_ai.exchange_rate_cache.get('CAD:refreshing')) # Lock released for the next refresh
+        self.assertEqual(len(self.fetches), 1)
+
+    def test_empty_cache_fetches_synchronously(self):
+        self.release.set()
+        self.assertEqual(api_ai.get_exchange_rates("key"), {'USD_per_CAD': 0.75})
+        self.assertEqual(api_ai.exchange_rate_cache.get('CAD')['rates'], {'USD_per_CAD': 0.75})
+
+
+class TestAIResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.model = MagicMock()
+        self.model.generate_content.return_value.text = "analysis"
+        self.cache_ttl = 3600
+        patches = [
+            patch.object(api_ai, 'ai_response_cache', TTLCache('ai_response', 0, cache_dir=self.tmp.name)),
+            patch.object(ttl_cache, 'get_redis_client', return_value=None),
+            patch.object(api_ai, 'get_gemini_model', return_value=self.model),
+            patch.object(api_ai, 'get_search_service', return_value=None),
+            patch.object(api_ai, 'get_search_engine_id', return_value=None),
+            patch.object(api_ai, 'get_exchange_rate_api_key', return_value=None),
+            patch.object(api_ai, 'get_ai_response_cache_ttl', side_effect=lambda: self.cache_ttl),
+            patch('autoscraper_py.auth_decorator.get_user_settings', return_value={'can_use_ai': True}),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        app = Flask(__name__)
+        app.secret_key = "test"
+        app.register_blueprint(api_ai.api_ai_bp)
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session['user_id'] = "uid"
+            session['last_validated'] = time.time()
+
+    def analyze(self):
+        return self.client.post('/api/analyze_car', json={"Make": "Honda", "Model": "Civic", "Year": "2018"}).get_json()
+
+    def test_identical_prompts_reuse_the_answer(self):
+        self.assertNotIn("cached", self.analyze())
+        self.assertEqual(self.analyze(), {"success": True, "summary": "analysis", "cached": True})
+        self.model.generate_content.assert_called_once()
+
+    def test_disabled_by_default(self):
+        self.cache_ttl = 0
+        self.analyze()
+        self.analyze()
+        self.assertEqual(self.model.generate_content.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+
+from .redis_client import get_redis_client, reset_redis_client
+
+# Disk fallback location, anchored to the package so every working directory shares it
+CACHE_DIR = os.environ.get("AUTOSCRAPER_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+class TTLCache:
+    """
+    Small JSON key/value cache with per-entry expiry.
+
+    Entries are stored in Redis (shared by every Flask/Celery process) when it is
+    reachable, otherwise in one file per key under CACHE_DIR/<namespace>.
+    Values must be JSON serializable.
+    """
+
+    def __init__(self, namespace, ttl, cache_dir=CACHE_DIR):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.cache_dir = os.path.join(cache_dir, namespace)
+
+    def _key_hash(self, key):
+        return hashlib.sha256(str(key).encode("utf-8")).hexdigest()
+
+    def _redis_key(self, key):
+        return f"autoscraper:{self.namespace}:{self._key_hash(key)}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{self._key_hash(key)}.json")
+
+    def get(self, key, default=None):
+        """Returns the cached value for key, or default if missing/expired."""
+        client = get_redis_client()
+        if client is not None:
+            try:
+                raw = client.get(self._redis_key(key))
+                return json.loads(raw) if raw is not None else default
+            except Exception as e:
+                logging.warning(f"Redis read failed for cache '{self.namespace}': {e}")
+                reset_redis_client()
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return default
+        except Exception as e:
+            logging.warning(f"Unreadable cache file {path}: {e}")
+            return default
+        if entry.get("expires_at", 0) < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return default
+        return entry.get("value", default)
+
+    def set(self, key, value, ttl=None):
+        """Stores value under key for ttl seconds (defaults to the cache's ttl)."""
+        ttl = int(ttl if ttl is not None else self.ttl)
+        if ttl <= 0:
+            return
+        client = get_redis_client()
+        if client is not None:
+            try:
+                client.set(self._redis_key(key), json.dumps(value), ex=ttl)
+                return
+            except Exception as e:
+                logging.warning(f"Redis write failed for cache '{self.namespace}': {e}")
+                reset_redis_client()
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to a temp file and rename so concurrent readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": time.time() + ttl, "value": value}, f)
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            logging.error(f"Error writing cache '{self.namespace}' to disk: {e}")
+
+    def add(self, key, value, ttl=None):
+        """
+        Stores value only if key is not already present (Redis SET NX, or an exclusive
+        file create on disk). Returns True if this call stored it; usable as a
+        short-lived cross-process lock.
+        """
+        ttl = int(ttl if ttl is not None else self.ttl)
+        client = get_redis_client()
+        if client is not None:
+            try:
+                return bool(client.set(self._redis_key(key), json.dumps(value), ex=ttl, nx=True))
+            except Exception as e:
+                logging.warning(f"Redis write failed for cache '{self.namespace}': {e}")
+                reset_redis_client()
+
+        path = self._path(key)
+        self.get(key) # Removes the file if the previous entry has expired
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except FileExistsError:
+            return False
+        except OSError as e:
+            logging.error(f"Error writing cache '{self.namespace}' to disk: {e}")
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": time.time() + ttl, "value": value}, f)
+        return True
+
+    def delete(self, key):
+        """Removes key from both tiers."""
+        client = get_redis_client()
+        if client is not None:
+            try:
+                client.delete(self._redis_key(key))
+            except Exception as e:
+                logging.warning(f"Redis delete failed for cache '{self.namespace}': {e}")
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
@@ -1,6 +1,18 @@
 @echo off
-echo Starting Celery Worker...
-start "Celery Worker" cmd /c "python -m celery -A autoscraper_py.tasks:celery_app worker --loglevel=info -P solo"
+echo Starting Celery Workers...
+rem Small searches get their own worker so they never queue behind a large scan (see autoscraper_py/scrape_scheduling.py)
+rem Each worker exports Prometheus metrics on its own WORKER_METRICS_PORT; the web app serves /metrics
+start "Celery Worker (small)" cmd /c "set WORKER_METRICS_PORT=9808&& python -m celery -A autoscraper_py.tasks:celery_app worker --loglevel=info -P solo -Q scrape_small -n small@%%h"
+start "Celery Worker (large)" cmd /c "set WORKER_METRICS_PORT=9809&& python -m celery -A autoscraper_py.tasks:celery_app worker --loglevel=info -P solo -Q scrape_large -n large@%%h"
+rem The nightly cache warming crawl runs for hours with every request of its process rate limited, so it has its own worker
+start "Celery Worker (cache warming)" cmd /c "set WORKER_METRICS_PORT=9811&& python -m celery -A autoscraper_py.tasks:celery_app worker --loglevel=info -P solo -Q cache_warm -n warm@%%h"
+rem Quote probes for /api/fetch_data are short and I/O-bound; a thread pool answers several users at once
+rem It also takes the default celery queue (failure callbacks, beat scheduling, cache maintenance), so those never wait behind a scrape
+start "Celery Worker (quote)" cmd /c "set WORKER_METRICS_PORT=9810&& python -m celery -A autoscraper_py.tasks:celery_app worker --loglevel=info -P threads -c 8 -Q quote,celery -n quote@%%h"
+
+echo Starting Celery Beat (saved-search refresh, listing cache warming and maintenance)...
+start "Celery Beat" cmd /c "python -m celery -A autoscraper_py.tasks:celery_app beat --loglevel=info"
 
 echo Starting Flask App with Waitress...
-start "Flask App" cmd /c "python -m waitress --host=127.0.0.1 --port=5000 autoscraper_py.wsgi:app & pause"
+rem Each watched search holds up to two threads (progress stream + partial results long-poll), so run well above Waitress' default of 4
+start "Flask App" cmd /c "python -m waitress --host=127.0.0.1 --port=5000 --threads=32 autoscraper_py.wsgi:app & pause"
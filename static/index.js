@@ -8,6 +8,9 @@ let currentResultId = null;
 let currentUserSettings = { search_tokens: 0, can_use_ai: false }; // Store current settings
 let currentFetchTaskId = null; // To store the ID of the running fetch task
 let taskCheckInterval = null; // To store the interval timer for checking task status
+let taskEventSource = null; // SSE connection pushing task progress (falls back to polling)
+let partialResultRows = new Map(); // Link -> row, listings accepted so far by the running task
+let partialResultsAbort = null; // Cancels the in-flight partial results long-poll
 
 // Firebase configuration
 const firebaseConfig = {
@@ -587,9 +590,8 @@ document.addEventListener('DOMContentLoaded', function () {
                     progressBar.setAttribute('aria-valuenow', '0');
                     progressContainer.style.display = 'block';
 
-                    // Clear any previous interval and start polling
-                    if (taskCheckInterval) clearInterval(taskCheckInterval);
-                    taskCheckInterval = setInterval(checkTaskStatus, 2000); // Check every 2 seconds
+                    // Stop any previous monitor and start streaming progress (polls if streaming is unavailable)
+                    monitorTask(currentFetchTaskId);
 
                     // Keep button disabled while task runs
                     fetchDataBtn.disabled = true;
@@ -2381,11 +2383,100 @@ function handleAnalyzeClick(event) {
 
 
 // --- Task Status Checking Function ---
+function stopTaskMonitor() {
+    if (taskCheckInterval) clearInterval(taskCheckInterval);
+    taskCheckInterval = null;
+    if (taskEventSource) taskEventSource.close();
+    taskEventSource = null;
+}
+
+function startTaskPolling() {
+    stopTaskMonitor();
+    taskCheckInterval = setInterval(checkTaskStatus, 2000); // Check every 2 seconds
+}
+
+// Long-polls the rows the running task has accepted so far and shows them before it finishes
+function tailPartialResults(taskId, after = '0-0') {
+    if (taskId !== currentFetchTaskId) return;
+    partialResultsAbort = new AbortController();
+    fetch(`/api/tasks/results/${taskId}?after=${encodeURIComponent(after)}&wait=4000`, { signal: partialResultsAbort.signal })
+        .then(response => {
+            if (response.status === 404) { // Task hasn't started streaming yet (or streaming is unavailable)
+                setTimeout(() => tailPartialResults(taskId, after), 2000);
+                return null;
+            }
+            if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
+            return response.json();
+        })
+        .then(data => {
+            if (!data || !data.success || taskId !== currentFetchTaskId) return;
+            data.rows.forEach(row => partialResultRows.set(row.Link, row));
+            if (data.rows.length) renderPartialResults();
+            if (!data.done) tailPartialResults(taskId, data.last_id);
+        })
+        .catch(error => {
+            if (error.name !== 'AbortError') console.warn('Partial results unavailable, waiting for the final result:', error);
+        });
+}
+
+// Stops tailing once the task has finished; the final status replaces the partial results
+function stopPartialResults() {
+    if (partialResultsAbort) partialResultsAbort.abort();
+    partialResultsAbort = null;
+}
+
+function renderPartialResults() {
+    const resultsInfo = document.getElementById('resultsInfo');
+    const rows = Array.from(partialResultRows.values());
+    const container = document.createElement('div');
+    container.className = 'alert alert-info';
+    const summary = document.createElement('p');
+    summary.innerHTML = `<strong><i class="bi bi-hourglass-split"></i> Found so far:</strong> ${rows.length} listings`;
+    container.appendChild(summary);
+    const list = document.createElement('ul');
+    list.className = 'mb-0 small';
+    rows.slice(-10).reverse().forEach(row => { // Latest 10
+        const item = document.createElement('li');
+        const link = document.createElement('a');
+        link.href = row.Link;
+        link.target = '_blank';
+        link.textContent = [row.Year, row.Make, row.Model, row.Trim].filter(Boolean).join(' ') || row.Link;
+        item.appendChild(link);
+        if (row.Price) item.appendChild(document.createTextNode(` - ${row.Price}`));
+        list.appendChild(item);
+    });
+    container.appendChild(list);
+    resultsInfo.replaceChildren(container);
+}
+
+function monitorTask(taskId) {
+    stopTaskMonitor();
+    partialResultRows = new Map();
+    tailPartialResults(taskId);
+    if (!window.EventSource) {
+        startTaskPolling();
+        return;
+    }
+    // Progress is pushed by the server. The server ends each stream after a couple of minutes and the
+    // browser reconnects on its own; a stream that can't be opened (e.g. 503 without Redis) switches to polling
+    const eventSource = new EventSource(`/api/tasks/stream/${taskId}`);
+    taskEventSource = eventSource;
+    eventSource.onmessage = event => {
+        if (taskId !== currentFetchTaskId) return stopTaskMonitor();
+        handleTaskStatus(JSON.parse(event.data));
+    };
+    eventSource.onerror = () => {
+        if (taskId !== currentFetchTaskId) return stopTaskMonitor();
+        if (eventSource.readyState === EventSource.CONNECTING) return; // Reconnecting after the server ended the stream
+        console.warn('Task progress stream unavailable, falling back to polling.');
+        startTaskPolling();
+    };
+}
+
 function checkTaskStatus() {
     if (!currentFetchTaskId) {
         console.log("No active task ID to check.");
-        if (taskCheckInterval) clearInterval(taskCheckInterval);
-        taskCheckInterval = null;
+        stopTaskMonitor();
         return;
     }
 
@@ -2397,98 +2488,12 @@ function checkTaskStatus() {
             }
             return response.json();
         })
-        .then(data => {
-            console.log("Task status response:", data);
-            const progressContainer = document.getElementById('fetchProgressContainer');
-            const progressBar = document.getElementById('fetchProgressBar');
-            const progressStatus = document.getElementById('fetchProgressStatus');
-            const fetchDataBtn = document.getElementById('fetchDataBtn'); // Get button to re-enable
-
-            switch (data.state) {
-                case 'PENDING':
-                    progressStatus.textContent = 'Task is pending...';
-                    break;
-                case 'STARTED':
-                    progressStatus.textContent = 'Task started... Waiting for progress...';
-                    break;
-                case 'PROGRESS':
-                    const progress = data.progress || 0;
-                    const total = data.total || 100;
-                    const step = data.step || 'Processing...';
-                    const percentage = total > 0 ? Math.round((progress / total) * 100) : 0;
-
-                    progressStatus.textContent = `${step} (${percentage}%)`;
-                    progressBar.style.width = `${percentage}%`;
-                    progressBar.textContent = `${percentage}%`;
-                    progressBar.setAttribute('aria-valuenow', percentage);
-                    break;
-                case 'SUCCESS':
-                    clearInterval(taskCheckInterval);
-                    taskCheckInterval = null;
-                    currentFetchTaskId = null;
-                    progressContainer.style.display = 'none'; // Hide progress bar
-                    fetchDataBtn.disabled = false; // Re-enable button
-
-                    const result = data.result; // The dictionary returned by the Celery task
-                    if (result && result.status === 'Complete') {
-                        resultsFilePath = result.file_path;
-                        currentResultId = result.doc_id || null;
-
-                        // Update results info
-                        document.getElementById('resultsInfo').innerHTML = `
-                            <div class="alert alert-success">
-                                <p><strong><i class="bi bi-check-circle"></i> Found:</strong> ${result.result_count} listings</p>
-                                <p><strong><i class="bi bi-file-earmark-text"></i> Saved to:</strong> ${result.file_path || 'Firebase Only'}</p>
-                                <p><strong><i class="bi bi-coin"></i> Tokens Charged:</strong> ${result.tokens_charged}</p>
-                                <p><strong><i class="bi bi-wallet2"></i> Tokens Remaining:</strong> ${result.tokens_remaining}</p>
-                            </div>`;
-                        updateTokenDisplay(result.tokens_remaining); // Update navbar display
-
-                        // Enable/disable buttons
-                        document.getElementById('openLinksBtn').disabled = !result.file_path;
-                        document.getElementById('downloadCsvBtn').disabled = !result.file_path;
-
-                        showNotification(`Search complete! Found ${result.result_count} listings. Cost: ${result.tokens_charged} tokens.`, 'success');
-
-                        // Refresh the results list
-                        setTimeout(() => {
-                            refreshResultsList();
-                        }, 1000); // Short delay after success
-                    } else {
-                        // Handle cases where task succeeded but returned unexpected data
-                        document.getElementById('resultsInfo').innerHTML = `
-                            <div class="alert alert-warning">
-                                <p><i class="bi bi-question-circle"></i> Task completed but returned unexpected data.</p>
-                            </div>`;
-                        showNotification('Task finished with unexpected result.', 'warning');
-                    }
-                    break;
-                case 'FAILURE':
-                    clearInterval(taskCheckInterval);
-                    taskCheckInterval = null;
-                    currentFetchTaskId = null;
-                    progressContainer.style.display = 'none'; // Hide progress bar
-                    fetchDataBtn.disabled = false; // Re-enable button
-
-                    const errorMsg = data.error || 'Unknown error occurred during task execution.';
-                    document.getElementById('resultsInfo').innerHTML = `
-                        <div class="alert alert-danger">
-                            <p><i class="bi bi-exclamation-triangle"></i> Search Failed: ${errorMsg}</p>
-                        </div>`;
-                    showNotification(`Search failed: ${errorMsg}`, 'danger');
-                    break;
-                case 'RETRY':
-                    progressStatus.textContent = 'Task is retrying...';
-                    break;
-                default:
-                    progressStatus.textContent = `Task state: ${data.state}`;
-            }
-        })
+        .then(handleTaskStatus)
         .catch(error => {
             console.error('Error checking task status:', error);
             showNotification('Error checking search status. Stopping monitor.', 'danger');
-            clearInterval(taskCheckInterval);
-            taskCheckInterval = null;
+            stopTaskMonitor();
+            stopPartialResults();
             currentFetchTaskId = null;
             document.getElementById('fetchProgressContainer').style.display = 'none'; // Hide progress bar
             document.getElementById('fetchDataBtn').disabled = false; // Re-enable button
@@ -2499,4 +2504,93 @@ function checkTaskStatus() {
                 </div>`;
         });
 }
+
+// Updates the progress bar/results from a task status (same shape from /status and /stream)
+function handleTaskStatus(data) {
+    console.log("Task status response:", data);
+    const progressContainer = document.getElementById('fetchProgressContainer');
+    const progressBar = document.getElementById('fetchProgressBar');
+    const progressStatus = document.getElementById('fetchProgressStatus');
+    const fetchDataBtn = document.getElementById('fetchDataBtn'); // Get button to re-enable
+
+    switch (data.state) {
+        case 'PENDING':
+            progressStatus.textContent = 'Task is pending...';
+            break;
+        case 'STARTED':
+            progressStatus.textContent = 'Task started... Waiting for progress...';
+            break;
+        case 'PROGRESS':
+            const progress = data.progress || 0;
+            const total = data.total || 100;
+            const step = data.step || 'Processing...';
+            const percentage = total > 0 ? Math.round((progress / total) * 100) : 0;
+
+            progressStatus.textContent = `${step} (${percentage}%)`;
+            progressBar.style.width = `${percentage}%`;
+            progressBar.textContent = `${percentage}%`;
+            progressBar.setAttribute('aria-valuenow', percentage);
+            break;
+        case 'SUCCESS':
+            stopTaskMonitor();
+            stopPartialResults();
+            currentFetchTaskId = null;
+            progressContainer.style.display = 'none'; // Hide progress bar
+            fetchDataBtn.disabled = false; // Re-enable button
+
+            const result = data.result; // The dictionary returned by the Celery task
+            if (result && result.status === 'Complete') {
+                resultsFilePath = result.file_path;
+                currentResultId = result.doc_id || null;
+
+                // Update results info
+                document.getElementById('resultsInfo').innerHTML = `
+                    <div class="alert alert-success">
+                        <p><strong><i class="bi bi-check-circle"></i> Found:</strong> ${result.result_count} listings</p>
+                        <p><strong><i class="bi bi-file-earmark-text"></i> Saved to:</strong> ${result.file_path || 'Firebase Only'}</p>
+                        <p><strong><i class="bi bi-coin"></i> Tokens Charged:</strong> ${result.tokens_charged}</p>
+                        <p><strong><i class="bi bi-wallet2"></i> Tokens Remaining:</strong> ${result.tokens_remaining}</p>
+                    </div>`;
+                updateTokenDisplay(result.tokens_remaining); // Update navbar display
+
+                // Enable/disable buttons
+                document.getElementById('openLinksBtn').disabled = !result.file_path;
+                document.getElementById('downloadCsvBtn').disabled = !result.file_path;
+
+                showNotification(`Search complete! Found ${result.result_count} listings. Cost: ${result.tokens_charged} tokens.`, 'success');
+
+                // Refresh the results list
+                setTimeout(() => {
+                    refreshResultsList();
+                }, 1000); // Short delay after success
+            } else {
+                // Handle cases where task succeeded but returned unexpected data
+                document.getElementById('resultsInfo').innerHTML = `
+                    <div class="alert alert-warning">
+                        <p><i class="bi bi-question-circle"></i> Task completed but returned unexpected data.</p>
+                    </div>`;
+                showNotification('Task finished with unexpected result.', 'warning');
+            }
+            break;
+        case 'FAILURE':
+            stopTaskMonitor();
+            stopPartialResults();
+            currentFetchTaskId = null;
+            progressContainer.style.display = 'none'; // Hide progress bar
+            fetchDataBtn.disabled = false; // Re-enable button
+
+            const errorMsg = data.error || 'Unknown error occurred during task execution.';
+            document.getElementById('resultsInfo').innerHTML = `
+                <div class="alert alert-danger">
+                    <p><i class="bi bi-exclamation-triangle"></i> Search Failed: ${errorMsg}</p>
+                </div>`;
+            showNotification(`Search failed: ${errorMsg}`, 'danger');
+            break;
+        case 'RETRY':
+            progressStatus.textContent = 'Task is retrying...';
+            break;
+        default:
+            progressStatus.textContent = `Task state: ${data.state}`;
+    }
+}
 // --- End Task Status Checking ---